@@ -1,13 +1,34 @@
 import logging
+import urllib3
 from minio import Minio
 from minio.error import S3Error, InvalidResponseError
+from datetime import timedelta
 from io import BytesIO
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterator
+from app.api.client.storage import STREAM_CHUNK_SIZE, Storage
 from app.core.config import settings
 from app.core.logging import get_logger
 
 logger = get_logger("minio")
 
-class MinioClient:
+def _http_client() -> urllib3.PoolManager:
+    """Connection pool sized for every thread that may talk to MinIO at once.
+
+    The minio default keeps only 10 connections per host; API threadpool
+    threads or batch uploads beyond that would otherwise open and discard a
+    fresh connection per request.
+    """
+    return urllib3.PoolManager(
+        maxsize=settings.MINIO_POOL_MAXSIZE,
+        block=False,
+        timeout=urllib3.Timeout(connect=settings.MINIO_CONNECT_TIMEOUT, read=settings.MINIO_READ_TIMEOUT),
+        retries=urllib3.Retry(total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+    )
+
+class MinioClient(Storage):
+    name = "minio"
+    supports_presign = True
+
     def __init__(self):
         """Initialize MinIO client"""
         try:
@@ -15,7 +36,16 @@ class MinioClient:
                 endpoint=settings.MINIO_ENDPOINT,
                 access_key=settings.MINIO_ACCESS_KEY,
                 secret_key=settings.MINIO_SECRET_KEY,
-                secure=False
+                secure=False,
+                http_client=_http_client()
+            )
+            # Signing needs no network round-trip as long as the region is known
+            self.presign_client = Minio(
+                endpoint=settings.MINIO_PUBLIC_ENDPOINT or settings.MINIO_ENDPOINT,
+                access_key=settings.MINIO_ACCESS_KEY,
+                secret_key=settings.MINIO_SECRET_KEY,
+                secure=settings.MINIO_PUBLIC_SECURE if settings.MINIO_PUBLIC_ENDPOINT else False,
+                region=settings.MINIO_REGION
             )
             logger.info(f"MinIO client initialized: {settings.MINIO_ENDPOINT}")
             self.init_buckets()
@@ -37,7 +67,13 @@ class MinioClient:
                 logger.error(f"Error with bucket {bucket_name}: {e}")
                 raise
 
-    def save_file(self, bucket_name: str, file_name: str, data: bytes):
+    def save_file(
+        self,
+        bucket_name: str,
+        file_name: str,
+        data: bytes,
+        content_type: str = 'application/octet-stream',
+    ):
         """Save file to MinIO bucket"""
         logger.info(f"Saving {file_name} to {bucket_name} ({len(data)} bytes)")
         
@@ -47,7 +83,7 @@ class MinioClient:
                 object_name=file_name,
                 data=BytesIO(data),
                 length=len(data),
-                content_type='application/octet-stream'
+                content_type=content_type
             )
             logger.info(f"Saved {file_name} to {bucket_name}")
             
@@ -56,39 +92,228 @@ class MinioClient:
             logger.error(error_msg)
             raise Exception(error_msg)
 
+    def save_stream(
+        self,
+        bucket_name: str,
+        file_name: str,
+        stream: BinaryIO,
+        length: int = -1,
+        content_type: str = 'application/octet-stream',
+    ):
+        """Stream a file object to MinIO bucket without buffering it whole.
+
+        With an unknown length (-1) the object is sent as a multipart upload,
+        holding at most one MINIO_PART_SIZE part in memory at a time.
+        """
+        logger.info(f"Streaming {file_name} to {bucket_name}")
+        
+        try:
+            self.client.put_object(
+                bucket_name=bucket_name,
+                object_name=file_name,
+                data=stream,
+                length=length,
+                part_size=settings.MINIO_PART_SIZE,
+                content_type=content_type
+            )
+            logger.info(f"Saved {file_name} to {bucket_name}")
+            
+        except Exception as e:
+            error_msg = f"Failed to save {file_name}: {e}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+    def _get_object(self, bucket_name: str, file_name: str):
+        """GET an object, mapping NoSuchKey to FileNotFoundError.
+
+        Existence is learned from the GET itself rather than a prior
+        stat_object, which would cost a second round-trip per read.
+        """
+        try:
+            return self.client.get_object(bucket_name, file_name)
+        except S3Error as e:
+            if e.code == 'NoSuchKey':
+                raise FileNotFoundError(f"File {file_name} not found")
+            error_msg = f"Failed to get {file_name}: {e}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+        except Exception as e:
+            error_msg = f"Failed to get {file_name}: {e}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
     def get_file(self, bucket_name: str, file_name: str) -> bytes:
         """Get file from MinIO bucket"""
         logger.info(f"Getting {file_name} from {bucket_name}")
-        response = None
+        response = self._get_object(bucket_name, file_name)
         
         try:
-            # Check if file exists
-            try:
-                self.client.stat_object(bucket_name, file_name)
-            except S3Error as e:
-                if e.code == 'NoSuchKey':
-                    raise FileNotFoundError(f"File {file_name} not found")
-                raise
-            
-            response = self.client.get_object(bucket_name, file_name)
             data = response.read()
             
             logger.info(f"Retrieved {file_name} ({len(data)} bytes)")
             return data
             
-        except FileNotFoundError:
-            raise
         except Exception as e:
             error_msg = f"Failed to get {file_name}: {e}"
             logger.error(error_msg)
             raise Exception(error_msg)
         finally:
-            if response:
+            response.close()
+            response.release_conn()
+
+    def iter_file(self, bucket_name: str, file_name: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        """Stream file from MinIO bucket in chunks.
+
+        The GET is issued before returning, so a missing object raises
+        FileNotFoundError here rather than halfway through a response.
+        """
+        logger.info(f"Streaming {file_name} from {bucket_name}")
+        response = self._get_object(bucket_name, file_name)
+
+        def chunks():
+            try:
+                yield from response.stream(chunk_size)
+            finally:
                 response.close()
                 response.release_conn()
 
-try:
-    minio_client = MinioClient()
-except Exception as e:
-    logger.error(f"Failed to create MinIO client: {e}")
-    raise
\ No newline at end of file
+        return chunks()
+
+    def presigned_url(self, bucket_name: str, file_name: str, expires: int) -> str:
+        """Short-lived GET URL for an object, signed for MINIO_PUBLIC_ENDPOINT"""
+        try:
+            return self.presign_client.presigned_get_object(
+                bucket_name, file_name, expires=timedelta(seconds=expires)
+            )
+        except Exception as e:
+            error_msg = f"Failed to presign {file_name}: {e}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+    def delete_file(self, bucket_name: str, file_name: str):
+        """Delete file from MinIO bucket (no error if it is already gone)"""
+        logger.info(f"Deleting {file_name} from {bucket_name}")
+        
+        try:
+            self.client.remove_object(bucket_name, file_name)
+        except Exception as e:
+            error_msg = f"Failed to delete {file_name}: {e}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+    def exists(self, bucket_name: str, file_name: str) -> bool:
+        try:
+            self.client.stat_object(bucket_name, file_name)
+            return True
+        except S3Error as e:
+            if e.code == 'NoSuchKey':
+                return False
+            raise
+
+    def check(self) -> Dict[str, Any]:
+        buckets = self.client.list_buckets()
+        return {"message": "MinIO connection successful", "buckets": [bucket.name for bucket in buckets]}
+
+def _http_session():
+    """aiohttp session for the async client, with the sync pool's timeouts and retries.
+
+    miniopy-async caps its own session at 10 connections, and aiohttp makes
+    every read past that wait for one, however long the MinIO round-trip.
+    """
+    from aiohttp import ClientSession, ClientTimeout, TCPConnector
+    from aiohttp_retry import ExponentialRetry, RetryClient
+
+    return RetryClient(
+        ClientSession(
+            connector=TCPConnector(limit=settings.MINIO_ASYNC_MAX_CONNECTIONS),
+            timeout=ClientTimeout(connect=settings.MINIO_CONNECT_TIMEOUT, sock_read=settings.MINIO_READ_TIMEOUT),
+        ),
+        retry_options=ExponentialRetry(attempts=3, factor=0.2, statuses={500, 502, 503, 504}),
+    )
+
+class AsyncMinioClient:
+    """Async counterpart of MinioClient for the read paths in ASYNC_API mode.
+
+    Buckets are created by the sync client at startup, so this one only reads.
+    """
+
+    def __init__(self):
+        from miniopy_async import Minio as AsyncMinio
+
+        self.client = AsyncMinio(
+            endpoint=settings.MINIO_ENDPOINT,
+            access_key=settings.MINIO_ACCESS_KEY,
+            secret_key=settings.MINIO_SECRET_KEY,
+            secure=False,
+            session=_http_session(),
+        )
+        logger.info(f"Async MinIO client initialized: {settings.MINIO_ENDPOINT}")
+
+    async def get_file(self, bucket_name: str, file_name: str) -> bytes:
+        """Get file from MinIO bucket"""
+        from miniopy_async.error import S3Error as AsyncS3Error
+
+        logger.info(f"Getting {file_name} from {bucket_name}")
+        response = None
+        
+        try:
+            response = await self.client.get_object(bucket_name, file_name)
+            data = await response.read()
+            
+            logger.info(f"Retrieved {file_name} ({len(data)} bytes)")
+            return data
+            
+        except AsyncS3Error as e:
+            if e.code == 'NoSuchKey':
+                raise FileNotFoundError(f"File {file_name} not found")
+            error_msg = f"Failed to get {file_name}: {e}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+        except Exception as e:
+            error_msg = f"Failed to get {file_name}: {e}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+        finally:
+            if response:
+                response.release()
+
+    async def iter_file(self, bucket_name: str, file_name: str, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Stream file from MinIO bucket in chunks, raising FileNotFoundError up front"""
+        from miniopy_async.error import S3Error as AsyncS3Error
+
+        logger.info(f"Streaming {file_name} from {bucket_name}")
+        try:
+            response = await self.client.get_object(bucket_name, file_name)
+        except AsyncS3Error as e:
+            if e.code == 'NoSuchKey':
+                raise FileNotFoundError(f"File {file_name} not found")
+            error_msg = f"Failed to get {file_name}: {e}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+        async def chunks():
+            try:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    yield chunk
+            finally:
+                response.release()
+
+        return chunks()
+
+    async def close(self):
+        await self.client.close_session()
+
+# Created on first use so its HTTP session binds to the running event loop
+_async_minio_client = None
+
+def get_async_minio_client() -> AsyncMinioClient:
+    global _async_minio_client
+    if _async_minio_client is None:
+        _async_minio_client = AsyncMinioClient()
+    return _async_minio_client
+
+async def close_async_minio_client():
+    global _async_minio_client
+    if _async_minio_client is not None:
+        await _async_minio_client.close()
+        _async_minio_client = None
\ No newline at end of file
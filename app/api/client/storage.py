@@ -0,0 +1,228 @@
+import abc
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+from io import BytesIO
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Union
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("storage")
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+STORAGE_BACKENDS = {"minio", "filesystem"}
+
+
+class Storage(abc.ABC):
+    """Object storage used for originals and renditions.
+
+    Backends implement every abstract method. Missing objects raise
+    FileNotFoundError from every read. Backends that cannot hand out direct
+    download URLs leave ``supports_presign`` False and ``presigned_url``
+    raising NotImplementedError.
+    """
+
+    name = "storage"
+    supports_presign = False
+
+    @abc.abstractmethod
+    def save_file(self, bucket_name: str, file_name: str, data: bytes,
+                  content_type: str = 'application/octet-stream'):
+        ...
+
+    @abc.abstractmethod
+    def save_stream(self, bucket_name: str, file_name: str, stream: BinaryIO, length: int = -1,
+                    content_type: str = 'application/octet-stream'):
+        ...
+
+    @abc.abstractmethod
+    def get_file(self, bucket_name: str, file_name: str) -> bytes:
+        ...
+
+    def get_buffer(self, bucket_name: str, file_name: str) -> Union[bytes, mmap.mmap]:
+        """Object contents for decoding; may be a read-only map instead of a copy"""
+        return self.get_file(bucket_name, file_name)
+
+    @abc.abstractmethod
+    def iter_file(self, bucket_name: str, file_name: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        ...
+
+    def local_path(self, bucket_name: str, file_name: str) -> Optional[str]:
+        """Path of the object on a local filesystem, if it lives on one"""
+        return None
+
+    def presigned_url(self, bucket_name: str, file_name: str, expires: int) -> str:
+        raise NotImplementedError(f"{self.name} storage cannot presign URLs")
+
+    @abc.abstractmethod
+    def delete_file(self, bucket_name: str, file_name: str):
+        ...
+
+    @abc.abstractmethod
+    def exists(self, bucket_name: str, file_name: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def check(self) -> Dict[str, Any]:
+        """Connectivity check for health endpoints; raises when unusable"""
+
+
+class FilesystemStorage(Storage):
+    """Objects as files under STORAGE_ROOT/<bucket>/<key>, for one node or a shared volume.
+
+    Writes go to a temporary file in the target directory and are renamed
+    into place, so readers never see a partial object. Originals are read
+    through a memory map and large renditions are served straight from the
+    file, so neither is copied through a socket or buffered whole.
+    """
+
+    name = "filesystem"
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.init_buckets()
+        logger.info(f"Filesystem storage initialized: {self.root}")
+
+    def init_buckets(self):
+        """Create bucket directories if they don't exist"""
+        for bucket_name in (settings.MINIO_ORIGINALS_BUCKET, settings.MINIO_THUMBNAILS_BUCKET):
+            os.makedirs(os.path.join(self.root, bucket_name), exist_ok=True)
+
+    def _path(self, bucket_name: str, file_name: str) -> str:
+        bucket_dir = os.path.join(self.root, bucket_name)
+        path = os.path.normpath(os.path.join(bucket_dir, file_name))
+        # Keys come from job ids, but never let one escape its bucket
+        if not path.startswith(bucket_dir + os.sep):
+            raise ValueError(f"Invalid object name: {file_name}")
+        return path
+
+    def save_file(self, bucket_name: str, file_name: str, data: bytes,
+                  content_type: str = 'application/octet-stream'):
+        """Save file atomically"""
+        self.save_stream(bucket_name, file_name, BytesIO(data), len(data), content_type)
+
+    def save_stream(self, bucket_name: str, file_name: str, stream: BinaryIO, length: int = -1,
+                    content_type: str = 'application/octet-stream'):
+        """Copy a file object to storage atomically, in chunks"""
+        path = self._path(bucket_name, file_name)
+        directory = os.path.dirname(path)
+        logger.info(f"Saving {file_name} to {bucket_name}")
+
+        tmp = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                if length < 0:
+                    shutil.copyfileobj(stream, f, STREAM_CHUNK_SIZE)
+                else:
+                    remaining = length
+                    while remaining:
+                        chunk = stream.read(min(remaining, STREAM_CHUNK_SIZE))
+                        if not chunk:
+                            raise ValueError(f"Stream ended {remaining} bytes short")
+                        f.write(chunk)
+                        remaining -= len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+            tmp = None
+            logger.info(f"Saved {file_name} to {bucket_name}")
+        except Exception as e:
+            error_msg = f"Failed to save {file_name}: {e}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+        finally:
+            if tmp:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+
+    def get_file(self, bucket_name: str, file_name: str) -> bytes:
+        """Get file contents"""
+        with open(self._path(bucket_name, file_name), "rb") as f:
+            data = f.read()
+        logger.info(f"Retrieved {file_name} ({len(data)} bytes)")
+        return data
+
+    def get_buffer(self, bucket_name: str, file_name: str) -> Union[bytes, mmap.mmap]:
+        """Read-only memory map of the file; pages come straight from the page cache"""
+        with open(self._path(bucket_name, file_name), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            # The map stays valid after the descriptor is closed
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def iter_file(self, bucket_name: str, file_name: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        """Stream file in chunks, raising FileNotFoundError up front"""
+        f = open(self._path(bucket_name, file_name), "rb")
+
+        def chunks():
+            with f:
+                while chunk := f.read(chunk_size):
+                    yield chunk
+
+        return chunks()
+
+    def local_path(self, bucket_name: str, file_name: str) -> Optional[str]:
+        path = self._path(bucket_name, file_name)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"File {file_name} not found")
+        return path
+
+    def delete_file(self, bucket_name: str, file_name: str):
+        """Delete file (no error if it is already gone)"""
+        logger.info(f"Deleting {file_name} from {bucket_name}")
+        path = self._path(bucket_name, file_name)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        # Renditions live in a directory per job; drop it once empty
+        directory = os.path.dirname(path)
+        if directory != os.path.join(self.root, bucket_name):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+
+    def exists(self, bucket_name: str, file_name: str) -> bool:
+        return os.path.isfile(self._path(bucket_name, file_name))
+
+    def check(self) -> Dict[str, Any]:
+        buckets = sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+        if not os.access(self.root, os.W_OK):
+            raise PermissionError(f"{self.root} is not writable")
+        return {"message": f"Filesystem storage at {self.root} is writable", "buckets": buckets}
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> Storage:
+    """Backend selected by STORAGE_BACKEND, created on first use.
+
+    Built lazily so importing the app opens no connections, and each forked
+    worker process gets its own client.
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                backend = settings.STORAGE_BACKEND.lower()
+                if backend == "filesystem":
+                    _storage = FilesystemStorage(settings.STORAGE_ROOT)
+                elif backend == "minio":
+                    from app.api.client.minio import MinioClient
+                    _storage = MinioClient()
+                else:
+                    raise ValueError(
+                        f"Unknown STORAGE_BACKEND {settings.STORAGE_BACKEND!r}. "
+                        f"Allowed: {', '.join(sorted(STORAGE_BACKENDS))}"
+                    )
+    return _storage
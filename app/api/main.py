@@ -1,9 +1,16 @@
+import time
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 
-from app.api.routes import jobs, thumbnails, health, debug
+from app.api.routes import jobs, batches, thumbnails, health, debug, stats
 from app.core.logging import setup_logging, get_logger
-from app.db.session import init_db
+from app.api.client.minio import close_async_minio_client
+from app.api.client.storage import get_storage
+from app.core.events import job_events
+from app.core.metrics import REQUEST_SECONDS
+from app.db.session import async_engine, init_db
+from app.worker import inline
+from app.worker.dispatch import dispatcher
 
 setup_logging()
 logger = get_logger("main")
@@ -17,9 +24,28 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"DB init failed: {e}")
         raise
+
+    try:
+        get_storage()
+        logger.info("Storage ready")
+    except Exception as e:
+        logger.error(f"Storage init failed: {e}")
+        raise
+
+    try:
+        inline.start()
+    except Exception as e:
+        # Not fatal: ?wait=true requests just get queued
+        logger.error(f"Inline render pool failed to start: {e}")
     
     yield
     logger.info("Shutting down...")
+    dispatcher.flush()
+    inline.shutdown()
+    await job_events.close()
+    if async_engine is not None:
+        await async_engine.dispose()
+    await close_async_minio_client()
 
 app = FastAPI(
     title="Thumbnail Service",
@@ -28,7 +54,24 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, to keep cardinality bounded
+        route = request.scope.get("route")
+        REQUEST_SECONDS.labels(
+            request.method, route.path if route else "unmatched", str(status)
+        ).observe(time.perf_counter() - start)
+
 app.include_router(health.router)
 app.include_router(jobs.router)
+app.include_router(batches.router)
 app.include_router(thumbnails.router)
+app.include_router(stats.router)
 app.include_router(debug.router)
\ No newline at end of file
@@ -0,0 +1,302 @@
+import asyncio
+import mimetypes
+import os
+import shutil
+import uuid
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from typing import List, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+
+from app.api.client.storage import get_storage
+from app.api.schemas import batch as batch_schemas
+from app.core.config import settings
+from app.core.events import SSE_HEADERS, TERMINAL_STATUSES, format_sse, job_events
+from app.core.hashing import hash_stream
+from app.core.metrics import JOBS_SUBMITTED
+from app.core.logging import get_logger
+from app.core.renditions import format_spec
+from app.core.validation import ALLOWED_EXTENSIONS, MAX_FILE_SIZE, validate_image_file, validate_renditions
+from app.db import models as db_models
+from app.db.session import get_db
+from app.worker.dispatch import publish, queue_for
+
+logger = get_logger("batches")
+router = APIRouter(tags=["Batches"])
+
+# Archive members are spooled to disk past this size, like Starlette uploads
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def _expand_archive(archive: UploadFile) -> List[UploadFile]:
+    """Extract image members of a zip archive into spooled UploadFiles"""
+    try:
+        zf = zipfile.ZipFile(archive.file)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Invalid zip archive")
+
+    uploads = []
+    with zf:
+        for member in zf.infolist():
+            name = os.path.basename(member.filename)
+            if member.is_dir() or not name or name.startswith("."):
+                continue
+            if not any(name.lower().endswith(ext) for ext in ALLOWED_EXTENSIONS):
+                continue
+            if member.file_size > MAX_FILE_SIZE:
+                raise HTTPException(status_code=400, detail=f"Archive member too large: {name}")
+            if len(uploads) >= settings.MAX_BATCH_FILES:
+                raise HTTPException(status_code=400, detail=f"Too many files. Maximum: {settings.MAX_BATCH_FILES}")
+
+            spool = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            with zf.open(member) as src:
+                shutil.copyfileobj(src, spool)
+            spool.seek(0)
+
+            content_type = mimetypes.guess_type(name)[0]
+            headers = Headers({"content-type": content_type}) if content_type else None
+            uploads.append(UploadFile(file=spool, filename=name, headers=headers))
+
+    return uploads
+
+
+def _save_original(job_id: UUID, upload: UploadFile) -> Optional[str]:
+    """Upload one original, returning an error message instead of raising"""
+    try:
+        get_storage().save_stream(
+            bucket_name=settings.MINIO_ORIGINALS_BUCKET,
+            file_name=str(job_id),
+            stream=upload.file,
+            content_type=upload.content_type or "application/octet-stream",
+        )
+        return None
+    except Exception as e:
+        return str(e)
+
+
+@router.post("/jobs/batch", response_model=batch_schemas.BatchCreateResponse, status_code=202)
+def submit_batch(
+    images: List[UploadFile] = File([]),
+    archive: Optional[UploadFile] = File(None, description="Zip archive of images"),
+    renditions: Optional[str] = Form(None, description='Comma separated "size:format" list, e.g. "100:png,64:webp"; a format may be an encoder profile such as "png-palette"'),
+    db: Session = Depends(get_db),
+):
+    """Submit many images as one batch, from multipart files and/or a zip archive"""
+    uploads = list(images)
+    if archive and archive.filename:
+        uploads.extend(_expand_archive(archive))
+
+    if not uploads:
+        raise HTTPException(status_code=400, detail="No files provided")
+    if len(uploads) > settings.MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files. Maximum: {settings.MAX_BATCH_FILES}")
+
+    spec = format_spec(validate_renditions(renditions))
+    batch_id = uuid.uuid4()
+    logger.info(f"Got batch {batch_id} with {len(uploads)} file(s)")
+
+    # Validate and hash every file, rejecting bad ones individually
+    accepted, rejected = [], []
+    for upload in uploads:
+        try:
+            info = validate_image_file(upload)
+        except HTTPException as e:
+            rejected.append(batch_schemas.BatchRejectedFile(filename=upload.filename or "", error=e.detail))
+            continue
+        accepted.append((upload, hash_stream(upload.file), info))
+
+    # Without a single job there is no batch to look up later
+    if not accepted:
+        raise HTTPException(
+            status_code=422,
+            detail={"message": "No valid images in batch", "rejected": [r.model_dump() for r in rejected]},
+        )
+
+    # One query finds every already-processed duplicate in the batch
+    digests = {digest for _, digest, _ in accepted}
+    existing = {}
+    if digests:
+        for job in db.query(db_models.Job).filter(
+            db_models.Job.content_hash.in_(digests),
+            db_models.Job.rendition_spec == spec,
+            db_models.Job.status == "succeeded",
+        ):
+            existing.setdefault(job.content_hash, job)
+
+    # Bulk insert all rows in one transaction; ids are assigned up front so
+    # nothing has to be re-read after the commit
+    jobs, job_ids, pending, queues = [], [], [], {}
+    hits = Counter()
+    for upload, digest, info in accepted:
+        job_id = uuid.uuid4()
+        source = existing.get(digest)
+        if source:
+            job = db_models.Job(
+                id=job_id,
+                status="succeeded",
+                original_filename=upload.filename,
+                rendition_spec=spec,
+                content_hash=digest,
+                storage_job_id=source.storage_job_id or source.id,
+                thumbnail_filename=source.thumbnail_filename,
+                renditions=source.renditions,
+                batch_id=batch_id,
+                **info.job_columns(),
+            )
+            hits[source.id] += 1
+        else:
+            job = db_models.Job(
+                id=job_id,
+                status="queued",
+                original_filename=upload.filename,
+                rendition_spec=spec,
+                content_hash=digest,
+                storage_job_id=job_id,
+                batch_id=batch_id,
+                queue=queue_for(info, batch=True),
+                **info.job_columns(),
+            )
+            pending.append((job_id, upload))
+            queues[job_id] = job.queue
+        jobs.append(job)
+        job_ids.append(job_id)
+
+    db.add_all(jobs)
+    for source_id, count in hits.items():
+        db.execute(
+            update(db_models.Job)
+            .where(db_models.Job.id == source_id)
+            .values(dedup_hits=db_models.Job.dedup_hits + count)
+        )
+    db.commit()
+    logger.info(f"Created {len(jobs)} job(s) for batch {batch_id}, {sum(hits.values())} deduplicated")
+    JOBS_SUBMITTED.labels("deduplicated").inc(sum(hits.values()))
+
+    # Upload originals concurrently
+    with ThreadPoolExecutor(max_workers=settings.BATCH_UPLOAD_CONCURRENCY) as pool:
+        errors = list(pool.map(lambda item: _save_original(*item), pending))
+
+    queued, failed = [], []
+    for (job_id, upload), error in zip(pending, errors):
+        if error:
+            logger.error(f"Failed to save {upload.filename} for job {job_id}: {error}")
+            failed.append(job_id)
+            rejected.append(batch_schemas.BatchRejectedFile(filename=upload.filename or "", error="Upload failed"))
+        else:
+            queued.append(job_id)
+
+    if failed:
+        db.execute(
+            update(db_models.Job).where(db_models.Job.id.in_(failed)).values(status="failed")
+        )
+        db.commit()
+
+    # Publish all tasks at once, WORKER_BATCH_SIZE jobs per message; large
+    # files go to their own queue
+    if queued:
+        try:
+            by_queue = {}
+            for job_id in queued:
+                by_queue.setdefault(queues[job_id], []).append(str(job_id))
+            for queue, queue_job_ids in by_queue.items():
+                publish(queue_job_ids, queue)
+            logger.info(f"Queued {len(queued)} job(s) for batch {batch_id} on {', '.join(sorted(by_queue))}")
+            JOBS_SUBMITTED.labels("queued").inc(len(queued))
+        except Exception as e:
+            logger.error(f"Queue failed for batch {batch_id}: {e}")
+            db.execute(
+                update(db_models.Job).where(db_models.Job.id.in_(queued)).values(status="failed")
+            )
+            db.commit()
+            raise HTTPException(status_code=500, detail="Task queue failed")
+
+    return batch_schemas.BatchCreateResponse(
+        batch_id=batch_id,
+        job_ids=[job_id for job_id in job_ids if job_id not in failed],
+        rejected=rejected,
+    )
+
+
+@router.get("/batches/{batch_id}", response_model=batch_schemas.BatchStatusResponse)
+def get_batch_status(batch_id: UUID, db: Session = Depends(get_db)):
+    """Aggregate status of the jobs in a batch"""
+    rows = db.query(db_models.Job.status, func.count(db_models.Job.id))\
+            .filter(db_models.Job.batch_id == batch_id)\
+            .group_by(db_models.Job.status)\
+            .all()
+
+    if not rows:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    statuses = {status: count for status, count in rows}
+    return batch_schemas.BatchStatusResponse(
+        batch_id=batch_id,
+        total=sum(statuses.values()),
+        statuses=statuses,
+        done=all(status in TERMINAL_STATUSES for status in statuses),
+    )
+
+
+@router.get("/batches/{batch_id}/events")
+async def stream_batch_events(batch_id: UUID, db: Session = Depends(get_db)):
+    """Server-sent events for every job transition in a batch, ending when all are done"""
+    def read():
+        rows = db.query(db_models.Job.id, db_models.Job.status)\
+                .filter(db_models.Job.batch_id == batch_id)\
+                .all()
+        db.close()
+        return {str(job_id): status for job_id, status in rows}
+
+    # Subscribe before the snapshot so nothing falls in between; from then on
+    # the batch is tracked from events alone
+    try:
+        events = await job_events.open(batch_id)
+    except Exception as e:
+        logger.error(f"Job events unavailable: {e}")
+        raise HTTPException(status_code=503, detail="Event stream unavailable")
+
+    statuses = await run_in_threadpool(read)
+    if not statuses:
+        job_events.discard(batch_id, events)
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    def summary():
+        counts = Counter(statuses.values())
+        return {
+            "batch_id": str(batch_id),
+            "total": len(statuses),
+            "statuses": dict(counts),
+            "done": all(status in TERMINAL_STATUSES for status in counts),
+        }
+
+    async def stream():
+        try:
+            snapshot = summary()
+            yield format_sse("batch", snapshot)
+            while not snapshot["done"]:
+                try:
+                    event = await asyncio.wait_for(events.get(), settings.SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event["job_id"] not in statuses:
+                    continue
+                statuses[event["job_id"]] = event["status"]
+                yield format_sse("status", {"job_id": event["job_id"], "status": event["status"]})
+
+                snapshot = summary()
+                if snapshot["done"]:
+                    yield format_sse("batch", snapshot)
+        finally:
+            job_events.discard(batch_id, events)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -64,38 +64,38 @@ async def debug_redis():
     """Check Redis status"""
     try:
         import redis
-        r = redis.from_url(settings.REDIS_URL)
+        from app.worker.celery_app import redis_url
+        r = redis.from_url(redis_url)
         r.ping()
         
         return {
             "connection": "ok",
-            "queue_length": r.llen("celery"),
+            "queue_lengths": {
+                name: r.llen(name)
+                for name in (settings.QUEUE_SMALL, settings.QUEUE_LARGE, settings.QUEUE_BATCH, settings.QUEUE_LEGACY)
+                if name
+            },
             "info": {k: v for k, v in r.info().items() if k in ["redis_version", "connected_clients", "used_memory_human"]},
         }
     except Exception as e:
         return {"connection": "failed", "error": str(e)}
 
-@router.get("/minio")
-async def debug_minio():
-    """Check MinIO status"""
+@router.get("/storage")
+async def debug_storage():
+    """Check storage status"""
     try:
-        from app.api.client.minio import get_minio_client
-        client = get_minio_client()
-        
-        buckets = []
-        for bucket in client.list_buckets():
-            if bucket.name in ["originals", "thumbnails"]:
-                objects = list(client.list_objects(bucket.name, recursive=True))
-                buckets.append({
-                    "name": bucket.name,
-                    "objects": len(objects),
-                    "size_mb": round(sum(obj.size or 0 for obj in objects) / 1024 / 1024, 1),
-                })
-        
-        return {"connection": "ok", "buckets": buckets}
+        from app.api.client.storage import get_storage
+        storage = get_storage()
+        return {"connection": "ok", "backend": storage.name, **storage.check()}
     except Exception as e:
         return {"connection": "failed", "error": str(e)}
 
+@router.get("/cache")
+async def debug_cache():
+    """Thumbnail cache counters of this process"""
+    from app.core.cache import thumbnail_cache
+    return thumbnail_cache.stats()
+
 @router.get("/config")
 async def debug_config():
     """Get config (sanitized)"""
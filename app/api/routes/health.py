@@ -1,11 +1,12 @@
 import time
 from typing import Dict, Any
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from sqlalchemy import text
 from app.db.session import engine
-from app.api.client.minio import minio_client
+from app.api.client.storage import get_storage
 from app.core.config import settings
 from app.core.logging import get_logger
+from app.core.metrics import render_metrics
 
 logger = get_logger("health")
 router = APIRouter()
@@ -37,20 +38,15 @@ def detailed_health_check():
         health_status["status"] = "degraded"
         logger.error(f"Database health check failed: {e}")
     
-    # Check MinIO connectivity
+    # Check storage connectivity
     try:
-        buckets = minio_client.client.list_buckets()
-        bucket_names = [bucket.name for bucket in buckets]
-        health_status["checks"]["storage"] = {
-            "status": "healthy", 
-            "message": "MinIO connection successful",
-            "buckets": bucket_names
-        }
-        logger.debug("MinIO health check passed")
+        storage = get_storage()
+        health_status["checks"]["storage"] = {"status": "healthy", "backend": storage.name, **storage.check()}
+        logger.debug("Storage health check passed")
     except Exception as e:
         health_status["checks"]["storage"] = {"status": "unhealthy", "error": str(e)}
         health_status["status"] = "degraded"
-        logger.error(f"MinIO health check failed: {e}")
+        logger.error(f"Storage health check failed: {e}")
     
     # Check Redis connectivity (for Celery)
     try:
@@ -75,30 +71,6 @@ def detailed_health_check():
 
 @router.get("/metrics", tags=["Monitoring"])
 def get_metrics():
-    """Basic application metrics"""
-    try:
-        from app.db import models
-        from app.db.session import SessionLocal
-        
-        db = SessionLocal()
-        try:
-            # Get job statistics
-            total_jobs = db.query(models.Job).count()
-            processing_jobs = db.query(models.Job).filter(models.Job.status == "processing").count()
-            succeeded_jobs = db.query(models.Job).filter(models.Job.status == "succeeded").count()
-            failed_jobs = db.query(models.Job).filter(models.Job.status == "failed").count()
-            
-            return {
-                "jobs": {
-                    "total": total_jobs,
-                    "processing": processing_jobs,
-                    "succeeded": succeeded_jobs,
-                    "failed": failed_jobs
-                },
-                "timestamp": time.time()
-            }
-        finally:
-            db.close()
-    except Exception as e:
-        logger.error(f"Failed to get metrics: {e}")
-        raise HTTPException(status_code=500, detail="Failed to retrieve metrics")
+    """Prometheus metrics, from in-process counters only (never the database)"""
+    body, content_type = render_metrics()
+    return Response(content=body, headers={"Content-Type": content_type})
@@ -1,27 +1,109 @@
+import asyncio
 import logging
+import uuid
+from contextlib import AsyncExitStack
+from datetime import datetime
 from uuid import UUID
-from fastapi import (APIRouter, Depends, File, HTTPException, Response, UploadFile)
+from typing import Awaitable, Callable, Optional
+from fastapi import (APIRouter, Depends, File, Form, HTTPException, Query, Request, Response,
+                     UploadFile)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.api.client.minio import minio_client
+from app.api.client.storage import get_storage
+from app.api.routes.thumbnails import invalidate_cached_thumbnails
 from app.api.schemas import job as job_schemas
 from app.core.config import settings
-from app.core.validation import validate_image_file, validate_pagination_params
+from app.core.events import SSE_HEADERS, TERMINAL_STATUSES, format_sse, job_events
+from app.core.hashing import hash_stream
+from app.core.metrics import JOBS_COMPLETED, JOBS_SUBMITTED
+from app.core.pagination import encode_cursor
+from app.core.renditions import RENDITION_FORMATS, format_spec
+from app.core.validation import (validate_cursor, validate_image_file, validate_job_filters,
+                                 validate_pagination_params, validate_renditions)
 from app.core.logging import get_logger
 from app.db import models as db_models
-from app.db.session import get_db
-from app.worker.tasks import create_thumbnail_task
+from app.db.session import get_async_db, get_db
+from app.worker import inline
+from app.worker.dispatch import dispatcher, queue_for
+from app.worker.tasks import profile_columns
 
 logger = get_logger("jobs")
 router = APIRouter()
 
+# Job reads include the processing profile only when enabled
+JobResponse = (
+    job_schemas.JobProfiledStatusResponse if settings.EXPOSE_JOB_PROFILE else job_schemas.JobStatusResponse
+)
+
 @router.post("/jobs", response_model=job_schemas.JobCreateResponse, status_code=202)
-def submit_job(image: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Submit image for thumbnailing"""
+def submit_job(
+    image: UploadFile = File(...),
+    renditions: Optional[str] = Form(None, description='Comma separated "size:format" list, e.g. "100:png,64:webp"; a format may be an encoder profile such as "png-palette"'),
+    wait: bool = Query(False, description="Answer with the first rendition's bytes when the image is small enough"),
+    db: Session = Depends(get_db),
+):
+    """Submit image for thumbnailing.
+
+    With ``wait=true``, small uploads are rendered right away and the first
+    rendition comes back as the response body (200, job id in X-Job-Id)
+    once the job is stored and reads like any other. Anything else is
+    queued and answered with 202 as usual.
+    """
     logger.info(f"Got upload: {image.filename}")
     
-    validate_image_file(image)
+    info = validate_image_file(image)
+    requested = validate_renditions(renditions)
+    spec = format_spec(requested)
     
-    job = db_models.Job(status="processing", original_filename=image.filename)
+    digest = hash_stream(image.file)
+
+    # Identical upload with identical renditions: reuse the stored results
+    existing = _find_duplicate(db, digest, spec)
+    if existing:
+        job = db_models.Job(
+            status="succeeded",
+            original_filename=image.filename,
+            rendition_spec=spec,
+            content_hash=digest,
+            storage_job_id=existing.storage_job_id or existing.id,
+            thumbnail_filename=existing.thumbnail_filename,
+            renditions=existing.renditions,
+            **info.job_columns(),
+        )
+        db.add(job)
+        db.execute(
+            update(db_models.Job)
+            .where(db_models.Job.id == existing.id)
+            .values(dedup_hits=db_models.Job.dedup_hits + 1)
+        )
+        db.commit()
+        logger.info(f"Created job {job.id} as duplicate of {existing.id}")
+        JOBS_SUBMITTED.labels("deduplicated").inc()
+        if wait:
+            return _stored_rendition_response(job) or job
+        return job
+
+    job_id = uuid.uuid4()
+    queue = queue_for(info)
+
+    if wait and inline.eligible(info):
+        response = _submit_inline(db, image, info, spec, digest, job_id, queue)
+        if response:
+            return response
+
+    job = db_models.Job(
+        id=job_id,
+        status="queued",
+        original_filename=image.filename,
+        rendition_spec=spec,
+        content_hash=digest,
+        storage_job_id=job_id,
+        queue=queue,
+        **info.job_columns(),
+    )
     db.add(job)
     db.commit()
     db.refresh(job)
@@ -30,11 +112,11 @@ def submit_job(image: UploadFile = File(...), db: Session = Depends(get_db)):
 
     # Save original
     try:
-        image_data = image.file.read()
-        minio_client.save_file(
+        get_storage().save_stream(
             bucket_name=settings.MINIO_ORIGINALS_BUCKET,
             file_name=str(job.id),
-            data=image_data,
+            stream=image.file,
+            content_type=image.content_type or "application/octet-stream",
         )
     except Exception as e:
         logger.error(f"Failed to save: {e}")
@@ -44,8 +126,9 @@ def submit_job(image: UploadFile = File(...), db: Session = Depends(get_db)):
 
     # Queue task
     try:
-        create_thumbnail_task.delay(str(job.id))
-        logger.info(f"Queued job {job.id}")
+        dispatcher.submit(str(job.id), job.queue)
+        logger.info(f"Queued job {job.id} on {job.queue}")
+        JOBS_SUBMITTED.labels("queued").inc()
     except Exception as e:
         logger.error(f"Queue failed: {e}")
         job.status = "failed"
@@ -54,29 +137,293 @@ def submit_job(image: UploadFile = File(...), db: Session = Depends(get_db)):
 
     return job
 
-@router.get("/jobs/{job_id}", response_model=job_schemas.JobStatusResponse)
-def get_job_status(job_id: UUID, db: Session = Depends(get_db)):
-    """Get job by ID"""
+def _submit_inline(db: Session, image: UploadFile, info, spec: str, digest: str, job_id: uuid.UUID,
+                   queue: str) -> Optional[Response]:
+    """Render a small upload in the inline pool; None when it has to be queued instead.
+
+    The objects are stored before the row is written, and the row is
+    written as "succeeded" before answering: the job reads like any other
+    as soon as the client has its id.
+    """
+    data = image.file.read()
+    image.file.seek(0)
+    result = inline.render(str(job_id), data, spec)
+    if result is None:
+        return None
+    encoded, profile = result
+
+    produced = inline.store(job_id, data, image.content_type or "application/octet-stream", encoded, profile)
+    if produced is None:
+        return None
+
+    db.add(db_models.Job(
+        id=job_id,
+        status="succeeded",
+        original_filename=image.filename,
+        rendition_spec=spec,
+        content_hash=digest,
+        storage_job_id=job_id,
+        queue=queue,
+        attempts=1,
+        thumbnail_filename=produced[0]["key"],
+        renditions=produced,
+        **profile_columns(profile),
+        **info.job_columns(),
+    ))
+    db.commit()
+    logger.info(f"Created job {job_id}, rendered inline")
+    JOBS_SUBMITTED.labels("inline").inc()
+    JOBS_COMPLETED.labels("succeeded").inc()
+
+    return _rendition_response(job_id, produced[0], encoded[0][1])
+
+def _stored_rendition_response(job) -> Optional[Response]:
+    """First rendition of a finished job, None if it cannot be read"""
+    rendition = job.available_renditions[0]
+    try:
+        body = get_storage().get_file(settings.MINIO_THUMBNAILS_BUCKET, rendition["key"])
+    except Exception as e:
+        logger.error(f"Failed to read {rendition['key']}: {e}")
+        return None
+    return _rendition_response(job.id, rendition, body)
+
+def _rendition_response(job_id, rendition, body: bytes) -> Response:
+    headers = {"X-Job-Id": str(job_id), "Location": f"/jobs/{job_id}"}
+    if rendition.get("etag"):
+        headers["ETag"] = f'"{rendition["etag"]}"'
+    return Response(content=body, media_type=RENDITION_FORMATS[rendition["format"]], headers=headers)
+
+def _find_duplicate(db: Session, digest: str, spec: str):
+    """Succeeded job with the same content hash and rendition settings"""
+    return db.query(db_models.Job)\
+            .filter(
+                db_models.Job.content_hash == digest,
+                db_models.Job.rendition_spec == spec,
+                db_models.Job.status == "succeeded",
+            )\
+            .first()
+
+@router.delete("/jobs/{job_id}", status_code=204)
+def delete_job(job_id: UUID, db: Session = Depends(get_db)):
+    """Delete a job, and its stored objects once no other job refers to them"""
     job = db.query(db_models.Job).filter(db_models.Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if job.status == "processing":
+        raise HTTPException(status_code=409, detail="Job is still processing")
+
+    storage_id = job.storage_job_id or job.id
+    keys = [r["key"] for r in job.available_renditions]
+    db.delete(job)
+    db.flush()
+
+    references = db.query(db_models.Job)\
+            .filter(
+                (db_models.Job.storage_job_id == storage_id) | (db_models.Job.id == storage_id)
+            )\
+            .count()
+    db.commit()
+    invalidate_cached_thumbnails(job_id)
+
+    if references:
+        logger.info(f"Deleted job {job_id}, storage {storage_id} still has {references} reference(s)")
+        return Response(status_code=204)
+
+    try:
+        storage = get_storage()
+        storage.delete_file(settings.MINIO_ORIGINALS_BUCKET, str(storage_id))
+        for key in keys:
+            storage.delete_file(settings.MINIO_THUMBNAILS_BUCKET, key)
+    except Exception as e:
+        # The row is gone already; orphaned objects are harmless
+        logger.error(f"Failed to delete objects of {storage_id}: {e}")
+
+    logger.info(f"Deleted job {job_id} and its objects")
+    return Response(status_code=204)
+
+async def _wait_for_job(job_id: UUID, wait: int, load: Callable[[], Awaitable[Optional[db_models.Job]]]):
+    """Load a job, first blocking up to ``wait`` seconds for it to finish.
+
+    The subscription is opened before the first read so a transition that
+    lands in between is not missed. Waiting costs no database connection:
+    ``load`` releases it, and the job is read again once an event arrives
+    or the wait runs out. Without Redis this degrades to a plain read.
+    """
+    if not wait:
+        return await load()
+
+    async with AsyncExitStack() as stack:
+        try:
+            events = await stack.enter_async_context(job_events.subscribe(job_id))
+        except Exception as e:
+            logger.warning(f"Job events unavailable, not waiting: {e}")
+            return await load()
+
+        job = await load()
+        if job is None or job.status in TERMINAL_STATUSES:
+            return job
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                event = await asyncio.wait_for(events.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if event["status"] in TERMINAL_STATUSES:
+                break
+
+    return await load()
+
+
+def _job_not_found(job):
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     return job
 
-@router.get("/jobs", response_model=list[job_schemas.JobStatusResponse], tags=["Thumbnail Jobs"])
-def list_jobs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """List all jobs with pagination"""
-    logger.info(f"Listing jobs (skip={skip}, limit={limit})")
-    
+
+def get_job_loader(job_id: UUID, db: Session = Depends(get_db)) -> Callable[[], Awaitable[Optional[db_models.Job]]]:
+    """Reads the job in the threadpool, releasing the connection in between"""
+    def read():
+        job = db.get(db_models.Job, job_id, populate_existing=True)
+        db.close()
+        return job
+
+    async def load():
+        return await run_in_threadpool(read)
+
+    return load
+
+
+async def get_async_job_loader(
+    job_id: UUID, db: AsyncSession = Depends(get_async_db)
+) -> Callable[[], Awaitable[Optional[db_models.Job]]]:
+    """Reads the job through the async session, releasing the connection in between"""
+    async def load():
+        job = await db.get(db_models.Job, job_id, populate_existing=True)
+        await db.close()
+        return job
+
+    return load
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job_status(
+    job_id: UUID,
+    wait: int = Query(0, ge=0, le=settings.MAX_JOB_WAIT, description="Seconds to wait for the job to finish"),
+    load: Callable[[], Awaitable[Optional[db_models.Job]]] = Depends(
+        get_async_job_loader if settings.ASYNC_API else get_job_loader
+    ),
+):
+    """Get job by ID, optionally long-polling until it finishes"""
+    return _job_not_found(await _wait_for_job(job_id, wait, load))
+
+
+@router.get("/jobs/{job_id}/events", tags=["Thumbnail Jobs"])
+async def stream_job_events(job_id: UUID, db: Session = Depends(get_db)):
+    """Server-sent events with the job's status transitions, ending when it finishes"""
+    def read():
+        status = db.query(db_models.Job.status).filter(db_models.Job.id == job_id).scalar()
+        db.close()
+        return status
+
+    # Subscribe before reading the current status so nothing falls in between
+    try:
+        events = await job_events.open(job_id)
+    except Exception as e:
+        logger.error(f"Job events unavailable: {e}")
+        raise HTTPException(status_code=503, detail="Event stream unavailable")
+
+    status = await run_in_threadpool(read)
+    if status is None:
+        job_events.discard(job_id, events)
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream():
+        try:
+            yield format_sse("status", {"job_id": str(job_id), "status": status})
+            if status in TERMINAL_STATUSES:
+                return
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), settings.SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse("status", {"job_id": event["job_id"], "status": event["status"]})
+                if event["status"] in TERMINAL_STATUSES:
+                    return
+        finally:
+            job_events.discard(job_id, events)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.get("/jobs", response_model=list[JobResponse], tags=["Thumbnail Jobs"])
+def list_jobs(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    """List jobs, newest first.
+
+    Pages are keyed on (created_at, id): pass the previous response's
+    X-Next-Cursor header (also sent as a Link rel="next") as ``cursor`` to
+    continue, which costs the same at any depth. ``skip`` still works but
+    scans every skipped row.
+    """
+    logger.info(f"Listing jobs (skip={skip}, limit={limit}, cursor={cursor}, status={status})")
+
     try:
         skip, limit = validate_pagination_params(skip, limit)
-        jobs = db.query(db_models.Job)\
-                .order_by(db_models.Job.created_at.desc())\
+        position = validate_cursor(cursor)
+        if position and skip:
+            raise HTTPException(status_code=400, detail="Use either cursor or skip, not both")
+        status, created_after, created_before = validate_job_filters(status, created_after, created_before)
+        # Keep only the tighter upper bound: given both, the scan may start at
+        # created_before and walk every row down to the cursor
+        if position and created_before:
+            if position[0] < created_before:
+                created_before = None
+            else:
+                position = None
+
+        Job = db_models.Job
+        query = db.query(Job)
+        if status:
+            query = query.filter(Job.status == status)
+        if created_after:
+            query = query.filter(Job.created_at >= created_after)
+        if created_before:
+            query = query.filter(Job.created_at < created_before)
+        if position:
+            query = query.filter(tuple_(Job.created_at, Job.id) < tuple_(*position))
+
+        # One extra row tells whether there is a next page
+        jobs = query.order_by(Job.created_at.desc(), Job.id.desc())\
                 .offset(skip)\
-                .limit(limit)\
+                .limit(limit + 1)\
                 .all()
-        
+
+        if len(jobs) > limit:
+            jobs = jobs[:limit]
+            next_cursor = encode_cursor(jobs[-1].created_at, jobs[-1].id)
+            next_url = request.url.remove_query_params("skip").include_query_params(cursor=next_cursor)
+            response.headers["X-Next-Cursor"] = next_cursor
+            response.headers["Link"] = f'<{next_url}>; rel="next"'
+
         return jobs
-        
+
     except HTTPException:
         raise
     except Exception as e:
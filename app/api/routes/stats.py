@@ -0,0 +1,114 @@
+from collections import defaultdict
+from datetime import timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import case, func, literal_column, select
+from sqlalchemy.orm import Session
+
+from app.api.schemas import job as job_schemas
+from app.core.logging import get_logger
+from app.db import models as db_models
+from app.db.session import get_db
+
+logger = get_logger("stats")
+router = APIRouter(prefix="/stats", tags=["Monitoring"])
+
+Job = db_models.Job
+
+# Upper pixel bound (exclusive) and label of each input size bucket
+SIZE_BUCKETS = [
+    (250_000, "<0.25MP"),
+    (1_000_000, "0.25-1MP"),
+    (4_000_000, "1-4MP"),
+    (16_000_000, "4-16MP"),
+]
+LARGEST_BUCKET = ">=16MP"
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+def _size_bucket():
+    pixels = Job.input_width * Job.input_height
+    return case(
+        (Job.input_width.is_(None), "unknown"),
+        *[(pixels < limit, label) for limit, label in SIZE_BUCKETS],
+        else_=LARGEST_BUCKET,
+    )
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    """Linear interpolation between closest ranks, like percentile_cont"""
+    if not values:
+        return None
+    values = sorted(values)
+    pos = (len(values) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+@router.get("/processing", response_model=job_schemas.ProfileStatsResponse)
+def processing_stats(
+    hours: int = Query(24, ge=1, le=24 * 30, description="Look at jobs finished in the last N hours"),
+    db: Session = Depends(get_db),
+):
+    """Worker time percentiles of succeeded jobs by input format and size.
+
+    Shows which kinds of upload make up the tail: processing_ms is the sum of
+    the worker stages of a job's last attempt, queue wait is reported
+    separately.
+    """
+    bucket = _size_bucket().label("size_bucket")
+    since = func.now() - timedelta(hours=hours)
+    filters = (
+        Job.status == "succeeded",
+        Job.processing_ms.is_not(None),
+        Job.updated_at >= since,
+    )
+
+    if db.bind.dialect.name == "postgresql":
+        stmt = (
+            select(
+                Job.input_format,
+                bucket,
+                func.count(),
+                *[func.percentile_cont(q).within_group(Job.processing_ms) for q in PERCENTILES],
+                func.percentile_cont(0.95).within_group(Job.queue_wait_ms),
+            )
+            .where(*filters)
+            # By output name: a repeated CASE would carry its own bind parameters
+            .group_by(Job.input_format, literal_column("size_bucket"))
+        )
+        rows = db.execute(stmt).all()
+    else:
+        # No ordered-set aggregates (SQLite); percentiles are computed here
+        groups = defaultdict(lambda: ([], []))
+        stmt = select(Job.input_format, bucket, Job.processing_ms, Job.queue_wait_ms).where(*filters)
+        for input_format, size_bucket, processing_ms, wait_ms in db.execute(stmt):
+            processing, waits = groups[(input_format, size_bucket)]
+            processing.append(processing_ms)
+            if wait_ms is not None:
+                waits.append(wait_ms)
+        rows = [
+            (input_format, size_bucket, len(processing),
+             *[_percentile(processing, q) for q in PERCENTILES],
+             _percentile(waits, 0.95))
+            for (input_format, size_bucket), (processing, waits) in groups.items()
+        ]
+
+    buckets = [
+        job_schemas.ProfileStatsBucket(
+            input_format=input_format,
+            size_bucket=size_bucket,
+            count=count,
+            processing_ms_p50=p50,
+            processing_ms_p95=p95,
+            processing_ms_p99=p99,
+            queue_wait_ms_p95=wait_p95,
+        )
+        for input_format, size_bucket, count, p50, p95, p99, wait_p95 in rows
+    ]
+    # Slowest tails first
+    buckets.sort(key=lambda b: b.processing_ms_p99 or 0, reverse=True)
+    return job_schemas.ProfileStatsResponse(hours=hours, buckets=buckets)
@@ -1,21 +1,27 @@
 import logging
+from typing import Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.api.client.minio import minio_client
+from app.api.client.minio import get_async_minio_client
+from app.api.client.storage import get_storage
+from app.core.cache import thumbnail_cache
 from app.core.config import settings
+from app.core.hashing import content_hash
+from app.core.renditions import RENDITION_FORMATS, find_rendition
 from app.db import models as db_models
-from app.db.session import get_db
+from app.db.session import get_async_db, get_db
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.get("/thumbnails/{job_id}", tags=["Thumbnails"])
-def get_thumbnail(job_id: UUID, db: Session = Depends(get_db)):
-    """Get thumbnail image by id"""
-    logger.info(f"Attempting to retrieve thumbnail for job {job_id}")
-    job = db.query(db_models.Job).filter(db_models.Job.id == job_id).first()
+DELIVERY_MODES = {"proxy", "redirect", "url"}
 
+def _select_rendition(job_id: UUID, job, size: Optional[int], format: Optional[str]) -> dict:
+    """Rendition to serve for a job, or the 404 explaining why there is none"""
     if not job:
         logger.warning(f"Job {job_id} not found for thumbnail retrieval.")
         raise HTTPException(status_code=404, detail="Job not found.")
@@ -28,8 +34,191 @@ def get_thumbnail(job_id: UUID, db: Session = Depends(get_db)):
             status_code=404, detail="Thumbnail not ready or job failed."
         )
 
-    thumbnail_data = minio_client.get_file(
-        bucket_name=settings.MINIO_THUMBNAILS_BUCKET, file_name=str(job.id)
+    rendition = find_rendition(job.available_renditions, size, format)
+    if not rendition:
+        raise HTTPException(status_code=404, detail="Rendition not available.")
+    return rendition
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for this header)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/").strip('"') == etag for tag in tags)
+
+def _cache_headers(etag: str) -> dict:
+    return {
+        "ETag": f'"{etag}"',
+        "Cache-Control": f"public, max-age={settings.THUMBNAIL_CACHE_MAX_AGE}, immutable",
+    }
+
+def _thumbnail_response(data: bytes, etag: str, media_type: str, if_none_match: Optional[str]) -> Response:
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=_cache_headers(etag))
+    return Response(content=data, media_type=media_type, headers=_cache_headers(etag))
+
+def _delivery_mode(delivery: Optional[str]) -> str:
+    mode = (delivery or settings.THUMBNAIL_DELIVERY).lower()
+    if mode not in DELIVERY_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid delivery mode. Allowed: {', '.join(sorted(DELIVERY_MODES))}"
+        )
+    if mode != "proxy" and not get_storage().supports_presign:
+        # A configured default falls back quietly; an explicit ask is an error
+        if delivery:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Delivery mode '{mode}' is not supported by {get_storage().name} storage."
+            )
+        return "proxy"
+    return mode
+
+def _presigned_response(rendition: dict, mode: str) -> Response:
+    """Point the client at object storage instead of sending the bytes ourselves"""
+    ttl = settings.PRESIGNED_URL_TTL
+    url = get_storage().presigned_url(settings.MINIO_THUMBNAILS_BUCKET, rendition["key"], ttl)
+    # Never let a cached answer outlive the URL it carries
+    headers = {"Cache-Control": f"private, max-age={ttl // 2}"}
+
+    if mode == "redirect":
+        return RedirectResponse(url, status_code=307, headers=headers)
+    return JSONResponse(
+        {
+            "url": url,
+            "expires_in": ttl,
+            "media_type": RENDITION_FORMATS[rendition["format"]],
+            "etag": rendition.get("etag"),
+        },
+        headers=headers,
     )
 
-    return Response(content=thumbnail_data, media_type="image/png")
\ No newline at end of file
+def _should_stream(rendition: dict) -> bool:
+    """Stream renditions too large to cache instead of buffering them.
+
+    Needs the etag and size recorded by the worker, since headers go out
+    before the body is read.
+    """
+    size = rendition.get("bytes")
+    return bool(rendition.get("etag")) and size is not None and size > settings.THUMBNAIL_CACHE_MAX_ITEM_BYTES
+
+def _streaming_response(chunks, rendition: dict) -> StreamingResponse:
+    headers = _cache_headers(rendition["etag"])
+    headers["Content-Length"] = str(rendition["bytes"])
+    return StreamingResponse(chunks, media_type=RENDITION_FORMATS[rendition["format"]], headers=headers)
+
+def _file_response(path: str, rendition: dict) -> FileResponse:
+    """Serve a rendition from local storage without reading it in Python"""
+    return FileResponse(path, media_type=RENDITION_FORMATS[rendition["format"]], headers=_cache_headers(rendition["etag"]))
+
+def _missing_object(job_id: UUID, rendition: dict) -> HTTPException:
+    logger.error(f"Thumbnail object {rendition['key']} of job {job_id} is missing from storage.")
+    return HTTPException(status_code=404, detail="Thumbnail not found in storage.")
+
+def invalidate_cached_thumbnails(job_id: UUID) -> None:
+    """Forget every cached rendition of a job in this process"""
+    thumbnail_cache.invalidate(lambda key: key[0] == job_id)
+
+class ThumbnailReads:
+    """Database and storage reads behind GET /thumbnails, on the sync stack.
+
+    Each read runs in the threadpool. AsyncThumbnailReads swaps in the async
+    session and MinIO client; everything else about the request is shared.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    async def job(self, job_id: UUID):
+        """The job, with its connection back in the pool before storage is read"""
+        def read():
+            job = self.db.query(db_models.Job).filter(db_models.Job.id == job_id).first()
+            self.db.close()
+            return job
+
+        return await run_in_threadpool(read)
+
+    async def stream(self, rendition: dict) -> Response:
+        """Serve a rendition too large to cache without holding it in memory"""
+        storage = get_storage()
+        path = storage.local_path(settings.MINIO_THUMBNAILS_BUCKET, rendition["key"])
+        if path:
+            return _file_response(path, rendition)
+        chunks = await run_in_threadpool(storage.iter_file, settings.MINIO_THUMBNAILS_BUCKET, rendition["key"])
+        return _streaming_response(chunks, rendition)
+
+    async def read(self, rendition: dict) -> bytes:
+        return await run_in_threadpool(
+            get_storage().get_file, settings.MINIO_THUMBNAILS_BUCKET, rendition["key"]
+        )
+
+class AsyncThumbnailReads(ThumbnailReads):
+    """Async session, and network reads through the async MinIO client instead of a thread"""
+
+    async def job(self, job_id: UUID):
+        job = await self.db.get(db_models.Job, job_id)
+        await self.db.close()
+        return job
+
+    async def stream(self, rendition: dict) -> Response:
+        if get_storage().name != "minio":
+            return await super().stream(rendition)
+        chunks = await get_async_minio_client().iter_file(settings.MINIO_THUMBNAILS_BUCKET, rendition["key"])
+        return _streaming_response(chunks, rendition)
+
+    async def read(self, rendition: dict) -> bytes:
+        if get_storage().name != "minio":
+            return await super().read(rendition)
+        return await get_async_minio_client().get_file(
+            bucket_name=settings.MINIO_THUMBNAILS_BUCKET, file_name=rendition["key"]
+        )
+
+def get_thumbnail_reads(db: Session = Depends(get_db)) -> ThumbnailReads:
+    return ThumbnailReads(db)
+
+async def get_async_thumbnail_reads(db: AsyncSession = Depends(get_async_db)) -> ThumbnailReads:
+    return AsyncThumbnailReads(db)
+
+@router.get("/thumbnails/{job_id}", tags=["Thumbnails"])
+async def get_thumbnail(
+    job_id: UUID,
+    size: Optional[int] = None,
+    format: Optional[str] = None,
+    delivery: Optional[str] = Query(None, description="proxy, redirect or url; defaults to THUMBNAIL_DELIVERY"),
+    if_none_match: Optional[str] = Header(None),
+    reads: ThumbnailReads = Depends(get_async_thumbnail_reads if settings.ASYNC_API else get_thumbnail_reads),
+):
+    """Get thumbnail image by id, optionally picking a rendition by size/format"""
+    mode = _delivery_mode(delivery)
+    logger.info(f"Attempting to retrieve thumbnail for job {job_id}")
+    # Read even when the bytes are cached: the cache is per process, and the
+    # job may have been deleted or rendered again through another one
+    job = await reads.job(job_id)
+    rendition = _select_rendition(job_id, job, size, format)
+    media_type = RENDITION_FORMATS[rendition["format"]]
+
+    etag = rendition.get("etag")
+    if etag and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=_cache_headers(etag))
+
+    if mode != "proxy":
+        return _presigned_response(rendition, mode)
+
+    # Entries of an earlier version of the job are never matched again
+    cache_key = (job_id, rendition["key"], job.updated_at)
+    cached = None if _should_stream(rendition) else thumbnail_cache.get(cache_key)
+    if cached:
+        return _thumbnail_response(*cached, if_none_match)
+
+    try:
+        if _should_stream(rendition):
+            return await reads.stream(rendition)
+        thumbnail_data = await reads.read(rendition)
+    except FileNotFoundError:
+        raise _missing_object(job_id, rendition)
+    etag = etag or content_hash(thumbnail_data)
+    thumbnail_cache.put(cache_key, (thumbnail_data, etag, media_type), len(thumbnail_data))
+
+    return _thumbnail_response(thumbnail_data, etag, media_type, if_none_match)
@@ -1,4 +1,10 @@
 # Add content to the schemas __init__.py file
-from .job import JobCreateResponse, JobStatusResponse
+from .job import (JobCreateResponse, JobProfiledStatusResponse, JobStatusResponse, ProfileStatsBucket,
+                  ProfileStatsResponse, RenditionResponse)
+from .batch import BatchCreateResponse, BatchRejectedFile, BatchStatusResponse
 
-__all__ = ["JobCreateResponse", "JobStatusResponse"]
+__all__ = [
+    "JobCreateResponse", "JobStatusResponse", "JobProfiledStatusResponse", "RenditionResponse",
+    "ProfileStatsBucket", "ProfileStatsResponse",
+    "BatchCreateResponse", "BatchRejectedFile", "BatchStatusResponse",
+]
@@ -0,0 +1,19 @@
+# app/api/schemas/batch.py
+from pydantic import BaseModel
+from uuid import UUID
+from typing import Dict, List
+
+class BatchRejectedFile(BaseModel):
+    filename: str
+    error: str
+
+class BatchCreateResponse(BaseModel):
+    batch_id: UUID
+    job_ids: List[UUID]
+    rejected: List[BatchRejectedFile] = []
+
+class BatchStatusResponse(BaseModel):
+    batch_id: UUID
+    total: int
+    statuses: Dict[str, int]
+    done: bool
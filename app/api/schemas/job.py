@@ -1,8 +1,8 @@
 # app/api/schemas/job.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from uuid import UUID
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 class JobCreateResponse(BaseModel):
     id: UUID
@@ -10,13 +10,50 @@ class JobCreateResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class RenditionResponse(BaseModel):
+    size: int
+    format: str
+    profile: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    bytes: Optional[int] = None
+    # Set on animated renditions only
+    frames: Optional[int] = None
+
 class JobStatusResponse(BaseModel):
     id: UUID
     status: str
     original_filename: Optional[str] = None
     thumbnail_filename: Optional[str] = None
+    renditions: List[RenditionResponse] = Field(default=[], validation_alias="available_renditions")
     created_at: datetime
     updated_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class JobProfiledStatusResponse(JobStatusResponse):
+    """JobStatusResponse plus processing details, served when EXPOSE_JOB_PROFILE is on"""
+    input_format: Optional[str] = None
+    input_width: Optional[int] = None
+    input_height: Optional[int] = None
+    input_bytes: Optional[int] = None
+    queue: Optional[str] = None
+    attempts: int = 0
+    processing_ms: Optional[int] = None
+    queue_wait_ms: Optional[int] = None
+    profile: Optional[Dict[str, Any]] = None
+
+class ProfileStatsBucket(BaseModel):
+    input_format: Optional[str] = None
+    size_bucket: str
+    count: int
+    processing_ms_p50: Optional[float] = None
+    processing_ms_p95: Optional[float] = None
+    processing_ms_p99: Optional[float] = None
+    queue_wait_ms_p95: Optional[float] = None
+
+class ProfileStatsResponse(BaseModel):
+    hours: int
+    buckets: List[ProfileStatsBucket]
+
@@ -0,0 +1,93 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from app.core.config import settings
+from app.core.metrics import CACHE_BYTES, CACHE_EVICTIONS, CACHE_REQUESTS
+
+
+class LRUByteCache:
+    """Thread-safe LRU cache bounded by the total byte size of its values.
+
+    Each entry is stored with the byte size it is charged for; the least
+    recently used entries are evicted until a new one fits. Entries larger
+    than ``max_item_bytes`` are never cached. A cache given a ``name`` also
+    exports its lookups, evictions and size to Prometheus under that label.
+    """
+
+    def __init__(self, max_bytes: int, max_item_bytes: int, name: Optional[str] = None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if self.name:
+            CACHE_REQUESTS.labels(self.name, "miss" if entry is None else "hit").inc()
+        return None if entry is None else entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        if size > self.max_item_bytes or size > self.max_bytes:
+            return
+
+        evicted = 0
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+
+            while self._entries and self.current_bytes + size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                evicted += 1
+
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            self.evictions += evicted
+            current_bytes = self.current_bytes
+        if self.name:
+            if evicted:
+                CACHE_EVICTIONS.labels(self.name).inc(evicted)
+            CACHE_BYTES.labels(self.name).set(current_bytes)
+
+    def invalidate(self, predicate) -> int:
+        """Drop every entry whose key matches predicate, returns how many"""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self.current_bytes -= self._entries.pop(key)[1]
+            current_bytes = self.current_bytes
+        if self.name:
+            CACHE_BYTES.labels(self.name).set(current_bytes)
+        return len(keys)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Rendition bytes keyed by (job_id, rendition key, job updated_at)
+thumbnail_cache = LRUByteCache(
+    max_bytes=settings.THUMBNAIL_CACHE_MAX_BYTES,
+    max_item_bytes=settings.THUMBNAIL_CACHE_MAX_ITEM_BYTES,
+    name="thumbnails",
+)
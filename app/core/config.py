@@ -7,15 +7,150 @@ class Settings(BaseSettings):
     POSTGRES_PORT: int = 5432
     POSTGRES_DB: str
     DATABASE_URL: str = ""
+    # asyncpg URL used when ASYNC_API is on; derived from DATABASE_URL if empty
+    ASYNC_DATABASE_URL: str = ""
+
+    # Serve the hot read paths (job status, thumbnails) with async SQLAlchemy
+    # and an async MinIO client instead of the threadpool-bound sync stack
+    ASYNC_API: bool = False
 
     REDIS_HOST: str
     REDIS_PORT: int = 6379
+    # Pub/sub channel workers announce job status transitions on
+    JOB_EVENTS_CHANNEL: str = "thumbnail:job-events"
+    # Longest a GET /jobs/{id}?wait= long-poll may block, in seconds
+    MAX_JOB_WAIT: int = 60
+    # Interval of keep-alive comments on idle event streams, in seconds
+    SSE_KEEPALIVE_INTERVAL: int = 15
+
+    # Where originals and renditions live: "minio", or "filesystem" for a
+    # single node or a volume shared by API and workers (STORAGE_ROOT)
+    STORAGE_BACKEND: str = "minio"
+    STORAGE_ROOT: str = "/data/storage"
 
     MINIO_ENDPOINT: str
     MINIO_ACCESS_KEY: str
     MINIO_SECRET_KEY: str
     MINIO_ORIGINALS_BUCKET: str = "originals"
     MINIO_THUMBNAILS_BUCKET: str = "thumbnails"
+    MINIO_REGION: str = "us-east-1"
+    # Host clients/ingress use to reach MinIO directly; presigned URLs are
+    # signed for this host. Defaults to MINIO_ENDPOINT
+    MINIO_PUBLIC_ENDPOINT: str = ""
+    MINIO_PUBLIC_SECURE: bool = False
+    # Connections kept per MinIO host, shared by all threads of a process
+    MINIO_POOL_MAXSIZE: int = 32
+    # Connections the async client (ASYNC_API) opens per MinIO host; further
+    # reads wait for one. miniopy-async's own default is 10
+    MINIO_ASYNC_MAX_CONNECTIONS: int = 100
+    MINIO_CONNECT_TIMEOUT: float = 5.0
+    MINIO_READ_TIMEOUT: float = 60.0
+    # Streaming uploads are sent as multipart in parts of this size (S3 minimum is 5MiB),
+    # which also bounds the memory one in-flight upload can use
+    MINIO_PART_SIZE: int = 5 * 1024 * 1024
+
+    # Keep transparency in thumbnails when the output format supports it,
+    # otherwise alpha is flattened onto a white background
+    THUMBNAIL_KEEP_ALPHA: bool = False
+    # Animated GIF/WebP uploads keep their animation in gif and webp renditions
+    # up to MAX_ANIMATION_SIZE px; other renditions get the first frame
+    THUMBNAIL_ANIMATION: bool = True
+    MAX_ANIMATION_SIZE: int = 256
+    # Frames are subsampled to stay within both caps; a dropped frame's time
+    # goes to the frame shown before it, so playback speed is unchanged
+    MAX_ANIMATION_FRAMES: int = 50
+    MAX_ANIMATION_FPS: int = 15
+    # Every frame of an animation is decoded, kept or not; animations over this
+    # many decoded pixels (width x height x frames) get their first frame only
+    MAX_ANIMATION_PIXELS: int = 50_000_000
+
+    # Upload validation only parses headers found in this many leading bytes;
+    # GIF frames are the exception, counted by skipping through the whole file
+    VALIDATION_PEEK_BYTES: int = 512 * 1024
+    # Ceiling on decoded pixels (width x height x frames), guards against decompression bombs
+    MAX_IMAGE_PIXELS: int = 100_000_000
+
+    # Per-process LRU cache of served thumbnails (0 disables it)
+    THUMBNAIL_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    THUMBNAIL_CACHE_MAX_ITEM_BYTES: int = 1024 * 1024
+    # Cache-Control max-age for thumbnails; they never change once produced
+    THUMBNAIL_CACHE_MAX_AGE: int = 31536000
+
+    # How GET /thumbnails/{job_id} delivers bytes: "proxy" streams them through
+    # the API, "redirect" answers 307 to a presigned MinIO URL, "url" returns
+    # the presigned URL as JSON
+    THUMBNAIL_DELIVERY: str = "proxy"
+    PRESIGNED_URL_TTL: int = 300
+
+    # POST /jobs/batch limits
+    MAX_BATCH_FILES: int = 500
+    BATCH_UPLOAD_CONCURRENCY: int = 8
+
+    # Jobs submitted within WORKER_BATCH_WINDOW_MS of each other are sent to the
+    # worker in one create_thumbnails_batch message of up to WORKER_BATCH_SIZE
+    # jobs; 1 sends every job as its own task
+    WORKER_BATCH_SIZE: int = 1
+    WORKER_BATCH_WINDOW_MS: int = 50
+    # Batch tasks download up to WORKER_PREFETCH_DEPTH originals ahead of the
+    # image being resized and keep up to WORKER_UPLOAD_DEPTH uploads in flight;
+    # together they bound how many images a worker process holds in memory.
+    # Single-job tasks run their stages in sequence, so with the default
+    # WORKER_BATCH_SIZE of 1 nothing is pipelined
+    WORKER_PREFETCH_DEPTH: int = 4
+    WORKER_UPLOAD_DEPTH: int = 4
+    # Bytes of decoded bitmaps one worker process may hold, estimated from
+    # the image header before decoding; 0 disables the check. Size it as the
+    # pod's memory limit less the processes' baseline, divided by
+    # --concurrency. A job over the budget is sent to QUEUE_LARGE instead,
+    # or fails if it is on that queue already
+    WORKER_MEMORY_BUDGET: int = 0
+
+    # Celery queues jobs are routed to by their upload's header facts. Uploads
+    # over LARGE_JOB_PIXELS decoded pixels (width x height x frames) or
+    # LARGE_JOB_BYTES go to QUEUE_LARGE; the rest of POST /jobs goes to
+    # QUEUE_SMALL and the rest of POST /jobs/batch to QUEUE_BATCH. A worker
+    # started without -Q consumes all three
+    QUEUE_SMALL: str = "small"
+    QUEUE_LARGE: str = "large"
+    QUEUE_BATCH: str = "batch"
+    # Celery's default queue, where the release before queue routing sent
+    # every job. Still consumed so messages left there at deploy are not
+    # stranded; set it to "" once it has drained, a release later
+    QUEUE_LEGACY: str = "celery"
+    LARGE_JOB_PIXELS: int = 16_000_000
+    LARGE_JOB_BYTES: int = 10 * 1024 * 1024
+
+    # POST /jobs?wait=true renders uploads of up to INLINE_MAX_PIXELS decoded
+    # pixels and INLINE_MAX_BYTES in the API's own pool of INLINE_WORKERS
+    # processes and answers with the first rendition. Uploads above either
+    # limit, or that find INLINE_MAX_PENDING renders already waiting, or take
+    # longer than INLINE_TIMEOUT seconds, are queued as usual. Each worker is
+    # a process of about 80 MB on top of the API's, so the fast path is off
+    # (0 workers) unless enabled and the API's memory limit raised to match
+    INLINE_WORKERS: int = 0
+    INLINE_MAX_PENDING: int = 4
+    INLINE_MAX_PIXELS: int = 4_000_000
+    INLINE_MAX_BYTES: int = 4 * 1024 * 1024
+    INLINE_TIMEOUT: float = 2.0
+
+    # Include input facts, attempts and the stage timing profile in job responses
+    EXPOSE_JOB_PROFILE: bool = False
+
+    # Port the Celery worker serves Prometheus metrics on; 0 disables. Set
+    # PROMETHEUS_MULTIPROC_DIR so prefork children are aggregated
+    WORKER_METRICS_PORT: int = 9808
+
+    # A job left in "processing" this long (worker died) may be claimed again
+    JOB_CLAIM_TIMEOUT: int = 600
+
+    # Renditions built when a job does not ask for any, e.g. "100:png,64:webp"
+    DEFAULT_RENDITIONS: str = "100:png"
+    MAX_RENDITIONS: int = 8
+    MAX_RENDITION_SIZE: int = 1024
+    # Encoder profile used when a rendition names only a format; tokens like
+    # "100:png-palette" pick one per job. png-archival is the old optimize=True
+    PNG_ENCODER_PROFILE: str = "png-fast"
+    WEBP_ENCODER_PROFILE: str = "webp-lossy"
     
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding='utf-8', extra="ignore")
 
@@ -26,5 +161,9 @@ class Settings(BaseSettings):
                 f"postgresql+psycopg2://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@"
                 f"{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
             )
+        if not self.ASYNC_DATABASE_URL:
+            self.ASYNC_DATABASE_URL = self.DATABASE_URL.replace(
+                "postgresql+psycopg2://", "postgresql+asyncpg://", 1
+            )
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,148 @@
+import asyncio
+import json
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Set
+
+import redis
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("events")
+
+REDIS_URL = f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/0"
+
+TERMINAL_STATUSES = {"succeeded", "failed"}
+
+# Seconds to wait before resubscribing after the pub/sub connection drops
+RECONNECT_DELAY = 1.0
+
+_publisher: Optional[redis.Redis] = None
+
+
+def publish_job_event(job_id: Any, status: str, batch_id: Any = None) -> None:
+    """Announce a job status transition; best effort, never raises.
+
+    Notifications only save clients a poll: anything missed here is still
+    visible in the database.
+    """
+    global _publisher
+    event = {
+        "job_id": str(job_id),
+        "status": status,
+        "batch_id": str(batch_id) if batch_id else None,
+    }
+    try:
+        if _publisher is None:
+            _publisher = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=1, socket_timeout=1)
+        _publisher.publish(settings.JOB_EVENTS_CHANNEL, json.dumps(event))
+    except Exception as e:
+        logger.warning(f"Failed to publish event for job {job_id}: {e}")
+
+
+class JobEventHub:
+    """Fans job events out to the waiters of one API process.
+
+    The process holds a single Redis subscription to JOB_EVENTS_CHANNEL,
+    opened on first use; each waiter registers a queue under a job or batch
+    id and receives only the events for it. Thousands of long-polls or SSE
+    streams therefore cost one Redis connection and no database queries
+    while they wait.
+    """
+
+    def __init__(self, url: str, channel: str):
+        self.url = url
+        self.channel = channel
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._client: Optional[aioredis.Redis] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def _start(self) -> None:
+        async with self._lock:
+            if self._listener is not None:
+                return
+            self._client = aioredis.Redis.from_url(self.url)
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(self.channel)
+            self._listener = asyncio.create_task(self._listen(pubsub))
+            logger.info(f"Subscribed to {self.channel}")
+
+    async def _listen(self, pubsub) -> None:
+        while True:
+            try:
+                async for message in pubsub.listen():
+                    self._dispatch(message["data"])
+            except asyncio.CancelledError:
+                await pubsub.aclose()
+                raise
+            except Exception as e:
+                logger.error(f"Event subscription lost: {e}")
+                await asyncio.sleep(RECONNECT_DELAY)
+                try:
+                    await pubsub.aclose()
+                    pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                    await pubsub.subscribe(self.channel)
+                except Exception as e:
+                    logger.error(f"Resubscribe failed: {e}")
+
+    def _dispatch(self, data: bytes) -> None:
+        try:
+            event = json.loads(data)
+        except ValueError:
+            return
+        for key in (event.get("job_id"), event.get("batch_id")):
+            for queue in self._subscribers.get(key, ()):
+                queue.put_nowait(event)
+
+    async def open(self, key: Any) -> asyncio.Queue:
+        """Register a queue that receives the events of a job or batch id"""
+        await self._start()
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers[str(key)].add(queue)
+        return queue
+
+    def discard(self, key: Any, queue: asyncio.Queue) -> None:
+        key = str(key)
+        waiters = self._subscribers.get(key)
+        if waiters is not None:
+            waiters.discard(queue)
+            if not waiters:
+                del self._subscribers[key]
+
+    @asynccontextmanager
+    async def subscribe(self, key: Any):
+        """open() for the duration of the block"""
+        queue = await self.open(key)
+        try:
+            yield queue
+        finally:
+            self.discard(key, queue)
+
+    def waiters(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+job_events = JobEventHub(REDIS_URL, settings.JOB_EVENTS_CHANNEL)
+
+
+# Event streams must not be cached or buffered by proxies
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
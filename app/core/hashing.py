@@ -0,0 +1,23 @@
+import hashlib
+from typing import BinaryIO
+
+# blake2b is the fastest cryptographic hash in the stdlib on 64-bit CPUs,
+# 128 bits is plenty to make accidental collisions a non-issue
+DIGEST_SIZE = 16
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(data: bytes) -> str:
+    """Hex digest identifying the content of an uploaded file"""
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).hexdigest()
+
+
+def hash_stream(stream: BinaryIO, chunk_size: int = CHUNK_SIZE) -> str:
+    """content_hash() of a file object, read in chunks and rewound afterwards"""
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
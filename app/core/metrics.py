@@ -0,0 +1,156 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess, start_http_server)
+
+# When PROMETHEUS_MULTIPROC_DIR is set (Celery prefork, several uvicorn
+# workers) every process writes its samples to files in that directory and
+# the exporter aggregates them; the directory must be emptied on deploy.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Thumbnails are small and quick; originals can take a while to move
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUEUE_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+STAGE_SECONDS = Histogram(
+    "thumbnail_stage_duration_seconds",
+    "Time spent per worker stage: download, decode, resize, encode, upload",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+QUEUE_WAIT_SECONDS = Histogram(
+    "thumbnail_queue_wait_seconds",
+    "Time between a task being published and a worker starting it",
+    ["task"],
+    buckets=QUEUE_WAIT_BUCKETS,
+)
+
+BYTES = Counter(
+    "thumbnail_bytes_total",
+    "Image bytes moved by workers; in = originals read, out = renditions written",
+    ["direction"],
+)
+
+TASK_RETRIES = Counter(
+    "thumbnail_task_retries_total",
+    "Task retries scheduled",
+    ["task"],
+)
+
+JOBS_COMPLETED = Counter(
+    "thumbnail_jobs_completed_total",
+    "Jobs finished by workers, by final status",
+    ["status"],
+)
+
+JOBS_SUBMITTED = Counter(
+    "thumbnail_jobs_submitted_total",
+    "Jobs accepted by the API; deduplicated ones are served from existing results, inline ones rendered by the API",
+    ["outcome"],
+)
+
+MEMORY_BUDGET_REFUSALS = Counter(
+    "thumbnail_memory_budget_refusals_total",
+    "Jobs a worker did not decode for lack of memory budget: rerouted, deferred or rejected",
+    ["action"],
+)
+
+CACHE_REQUESTS = Counter(
+    "thumbnail_cache_requests_total",
+    "In-process cache lookups, by result: hit or miss",
+    ["cache", "result"],
+)
+
+CACHE_EVICTIONS = Counter(
+    "thumbnail_cache_evictions_total",
+    "Entries evicted from an in-process cache to make room for new ones",
+    ["cache"],
+)
+
+# Summed over the live processes, each of which holds a cache of its own
+CACHE_BYTES = Gauge(
+    "thumbnail_cache_bytes",
+    "Bytes held by in-process caches",
+    ["cache"],
+    multiprocess_mode="livesum",
+)
+
+
+# Profile of the job the current thread is working on, see profiling()
+_current_profile: ContextVar[Optional[Dict[str, Any]]] = ContextVar("job_profile", default=None)
+
+
+@contextmanager
+def profiling(profile: Dict[str, Any]):
+    """Also record stage timings and counters of the enclosed work into ``profile``"""
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+@contextmanager
+def stage(name: str):
+    """Time one worker stage into the histogram and the current job profile"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    """Record time spent in a stage, for work timed in pieces (e.g. per frame)"""
+    STAGE_SECONDS.labels(name).observe(seconds)
+    profile = _current_profile.get()
+    if profile is not None:
+        stages = profile.setdefault("stages_ms", {})
+        stages[name] = round(stages.get(name, 0) + seconds * 1000, 2)
+
+
+def record(key: str, amount: float) -> None:
+    """Add to a counter of the current job profile, if any"""
+    profile = _current_profile.get()
+    if profile is not None:
+        profile[key] = profile.get(key, 0) + amount
+
+
+def observe_queue_wait(task: str, enqueued_at: float) -> None:
+    QUEUE_WAIT_SECONDS.labels(task).observe(max(time.time() - enqueued_at, 0))
+
+
+def _exposed_registry():
+    """This process's registry, or an aggregate of all processes in multiprocess mode"""
+    if not MULTIPROCESS:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    return generate_latest(_exposed_registry()), CONTENT_TYPE_LATEST
+
+
+def start_exporter(port: int) -> None:
+    """Serve /metrics over HTTP from a process that has no web server (the worker)"""
+    start_http_server(port, registry=_exposed_registry())
+
+
+def mark_process_dead(pid: int) -> None:
+    """Drop a finished process's live samples in multiprocess mode"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
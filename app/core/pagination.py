@@ -0,0 +1,21 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+from uuid import UUID
+
+
+def encode_cursor(created_at: datetime, job_id: UUID) -> str:
+    """Opaque token for the position right after a job in (created_at, id) order"""
+    raw = json.dumps([created_at.isoformat(), str(job_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Inverse of encode_cursor, raises ValueError on a malformed token"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, job_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), UUID(job_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
@@ -0,0 +1,117 @@
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+# Output formats a rendition can be encoded to, with the media type served
+RENDITION_FORMATS = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+    "gif": "image/gif",
+}
+
+# Formats whose renditions of an animated upload stay animated
+ANIMATED_FORMATS = {"gif", "webp"}
+
+FORMAT_ALIASES = {"jpg": "jpeg"}
+
+DEFAULT_FORMAT = "png"
+
+# Named encoder settings and the format each produces. A rendition token may
+# name a profile instead of a bare format, e.g. "100:png-palette"
+ENCODER_PROFILES = {
+    "png-fast": "png",
+    "png-palette": "png",
+    "png-archival": "png",
+    "webp-lossy": "webp",
+    "webp-lossless": "webp",
+    "jpeg": "jpeg",
+    "gif": "gif",
+}
+
+
+def default_profile(fmt: str) -> str:
+    """Encoder profile used for a bare format, from Settings"""
+    profile = {
+        "png": settings.PNG_ENCODER_PROFILE,
+        "webp": settings.WEBP_ENCODER_PROFILE,
+    }.get(fmt, fmt)
+    if ENCODER_PROFILES.get(profile) != fmt:
+        raise ValueError(f"Encoder profile {profile!r} does not produce {fmt}")
+    return profile
+
+
+def parse_spec(spec: str) -> List[Dict[str, Any]]:
+    """Parse "100:png,64:webp-lossless,32" into [{"size": 100, "format": "png", "profile": "png-fast"}, ...].
+
+    Bare formats get their default encoder profile. Order is preserved (the
+    first entry is the job's default rendition) and duplicates of a size and
+    format are dropped. Raises ValueError on malformed input.
+    """
+    renditions = []
+    seen = set()
+
+    for token in spec.split(","):
+        token = token.strip().lower()
+        if not token:
+            continue
+
+        size_part, _, name = token.partition(":")
+        name = FORMAT_ALIASES.get(name, name) or DEFAULT_FORMAT
+
+        try:
+            size = int(size_part)
+        except ValueError:
+            raise ValueError(f"Invalid rendition size: {size_part!r}")
+
+        if size < 1 or size > settings.MAX_RENDITION_SIZE:
+            raise ValueError(f"Rendition size must be between 1 and {settings.MAX_RENDITION_SIZE}")
+
+        if name in RENDITION_FORMATS:
+            fmt, profile = name, default_profile(name)
+        elif name in ENCODER_PROFILES:
+            fmt, profile = ENCODER_PROFILES[name], name
+        else:
+            raise ValueError(
+                f"Invalid rendition format. Allowed: {', '.join(RENDITION_FORMATS)}"
+                f" or a profile: {', '.join(ENCODER_PROFILES)}"
+            )
+
+        if (size, fmt) in seen:
+            continue
+        seen.add((size, fmt))
+        renditions.append({"size": size, "format": fmt, "profile": profile})
+
+    if not renditions:
+        raise ValueError("At least one rendition is required")
+
+    if len(renditions) > settings.MAX_RENDITIONS:
+        raise ValueError(f"Too many renditions. Maximum: {settings.MAX_RENDITIONS}")
+
+    return renditions
+
+
+def format_spec(renditions: List[Dict[str, Any]]) -> str:
+    """Canonical string form of a rendition list, inverse of parse_spec"""
+    return ",".join(f"{r['size']}:{r.get('profile', r['format'])}" for r in renditions)
+
+
+def rendition_key(job_id: str, size: int, fmt: str) -> str:
+    """Object name of a rendition in the thumbnails bucket"""
+    return f"{job_id}/{size}.{fmt}"
+
+
+def find_rendition(
+    renditions: List[Dict[str, Any]], size: Optional[int] = None, fmt: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """First rendition matching size and/or format, or the default one"""
+    if fmt:
+        fmt = FORMAT_ALIASES.get(fmt.lower(), fmt.lower())
+
+    for rendition in renditions:
+        if size is not None and rendition["size"] != size:
+            continue
+        if fmt and rendition["format"] != fmt:
+            continue
+        return rendition
+    return None
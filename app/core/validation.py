@@ -1,7 +1,14 @@
 import io
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
 from fastapi import HTTPException, UploadFile
 from PIL import Image
+from app.core.config import settings
 from app.core.logging import get_logger
+from app.core.pagination import decode_cursor
+from app.core.renditions import parse_spec
+from app.worker.imaging import webp_header
 
 logger = get_logger("validation")
 
@@ -10,6 +17,8 @@ ALLOWED_TYPES = {
     "image/webp", "image/bmp", "image/tiff"
 }
 
+JOB_STATUSES = {"queued", "processing", "succeeded", "failed"}
+
 ALLOWED_EXTENSIONS = {
     ".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".tiff", ".tif"
 }
@@ -17,8 +26,167 @@ ALLOWED_EXTENSIONS = {
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 MIN_FILE_SIZE = 10
 
-def validate_image_file(file: UploadFile) -> None:
-    """Validate image file"""
+MIN_DIMENSION = 10
+MAX_DIMENSION = 10000
+
+# Leading bytes of each accepted container format
+MAGIC_BYTES = [
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"BM", "BMP"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF"),
+]
+
+@dataclass
+class ImageInfo:
+    """Header facts about an upload, gathered without decoding pixels"""
+    format: str
+    width: int
+    height: int
+    frames: int
+    size: int
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height * self.frames
+
+    def job_columns(self) -> Dict[str, Any]:
+        """Job.input_* values describing this upload"""
+        return {
+            "input_format": self.format.lower(),
+            "input_width": self.width,
+            "input_height": self.height,
+            "input_bytes": self.size,
+        }
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """Container format from magic bytes, None if not an accepted format"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    for magic, fmt in MAGIC_BYTES:
+        if head.startswith(magic):
+            return fmt
+    return None
+
+def read_header(file: UploadFile, fmt: str):
+    """Open the image lazily from a bounded prefix of the upload.
+
+    PIL only parses headers on open. A prefix of VALIDATION_PEEK_BYTES covers
+    them for practically every file; the rare JPEG with more metadata than
+    that in front of its frame header is opened from the stream instead,
+    which still stops reading at the header.
+    """
+    file.file.seek(0)
+    head = file.file.read(settings.VALIDATION_PEEK_BYTES)
+    try:
+        return Image.open(io.BytesIO(head), formats=[fmt])
+    except Exception:
+        file.file.seek(0)
+        return Image.open(file.file, formats=[fmt])
+
+def skip_sub_blocks(stream) -> bool:
+    """Move past a chain of GIF data sub-blocks; False if the stream ends first"""
+    while True:
+        length = stream.read(1)
+        if not length:
+            return False
+        if length == b"\x00":
+            return True
+        stream.seek(length[0], io.SEEK_CUR)
+
+def count_gif_frames(stream) -> int:
+    """Frames of a GIF, counted over the whole stream without decoding.
+
+    PIL can only count the frames within the bytes it was given, so a
+    prefix undercounts a long animation. This walks the block structure
+    instead, counting image descriptors and skipping the LZW data between
+    them sub-block by sub-block. A truncated or corrupt stream counts the
+    frames before the damage, which is all the worker could decode.
+    """
+    stream.seek(10)
+    packed = stream.read(1)
+    if not packed:
+        return 0
+    stream.seek(2, io.SEEK_CUR)
+    if packed[0] & 0x80:
+        # Global colour table
+        stream.seek(3 << ((packed[0] & 0x07) + 1), io.SEEK_CUR)
+
+    frames = 0
+    while True:
+        block = stream.read(1)
+        if block == b"\x2c":
+            descriptor = stream.read(9)
+            if len(descriptor) < 9:
+                break
+            if descriptor[8] & 0x80:
+                # Local colour table
+                stream.seek(3 << ((descriptor[8] & 0x07) + 1), io.SEEK_CUR)
+            # LZW minimum code size, then the image data
+            stream.seek(1, io.SEEK_CUR)
+            if not skip_sub_blocks(stream):
+                break
+            frames += 1
+        elif block == b"\x21":
+            # Extension label, then its sub-blocks
+            stream.seek(1, io.SEEK_CUR)
+            if not skip_sub_blocks(stream):
+                break
+        else:
+            # Trailer, end of stream or garbage
+            break
+    return max(frames, 1)
+
+def count_webp_frames(stream) -> int:
+    """Frames of an animated WebP, counted over the whole stream without decoding.
+
+    Walks the RIFF chunks from their 8-byte headers, counting ANMF chunks
+    and seeking past every payload. A truncated stream counts the frames
+    before the cut.
+    """
+    stream.seek(12)
+    frames = 0
+    while True:
+        header = stream.read(8)
+        if len(header) < 8:
+            break
+        if header[:4] == b"ANMF":
+            frames += 1
+        length = int.from_bytes(header[4:], "little")
+        # Chunk payloads are padded to an even length
+        stream.seek(length + (length & 1), io.SEEK_CUR)
+    return max(frames, 1)
+
+def read_webp_header(file: UploadFile) -> Optional[Tuple[int, int, int]]:
+    """(width, height, frames) of a WebP, from its first chunk and the chunk headers.
+
+    Pillow's WebP plugin hands the whole file to libwebp's demuxer on open,
+    so it is never opened here.
+    """
+    file.file.seek(0)
+    header = webp_header(file.file.read(30))
+    if header is None:
+        return None
+    width, height, _, animated = header
+    return width, height, count_webp_frames(file.file) if animated else 1
+
+def count_frames(image) -> int:
+    """Frame count as far as it can be told from the header bytes available"""
+    try:
+        return max(1, getattr(image, "n_frames", 1))
+    except Exception:
+        return 1
+
+def validate_image_file(file: UploadFile) -> ImageInfo:
+    """Validate image file from its container headers only.
+
+    Checks magic bytes, dimensions, frame count and the decoded pixel count
+    (decompression bombs) without decoding any pixel data; the worker does
+    the full decode and rejects anything corrupt past the header.
+    """
     if not file or not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
     
@@ -38,41 +206,57 @@ def validate_image_file(file: UploadFile) -> None:
         )
     
     try:
-        content = file.file.read()
+        # The upload is already spooled to disk by Starlette: get its size
+        # from the file position instead of reading it into memory
+        file.file.seek(0, io.SEEK_END)
+        size = file.file.tell()
         file.file.seek(0)
         
         # Check file size
-        if len(content) > MAX_FILE_SIZE:
+        if size > MAX_FILE_SIZE:
             raise HTTPException(
                 status_code=400,
                 detail=f"File too large. Maximum: {MAX_FILE_SIZE // (1024*1024)}MB"
             )
         
-        if len(content) < MIN_FILE_SIZE:
+        if size < MIN_FILE_SIZE:
             raise HTTPException(status_code=400, detail="File too small")
         
-        if len(content) > MAX_FILE_SIZE:
-            raise HTTPException(status_code=400, detail="File too large")
+        # Check magic bytes
+        fmt = sniff_format(file.file.read(16))
+        if not fmt:
+            logger.error(f"Invalid: {file.filename} (unknown signature)")
+            raise HTTPException(status_code=400, detail="Invalid image")
         
-        # Validate with PIL
+        # Parse headers
         try:
-            image = Image.open(io.BytesIO(content))
-            image.verify()
-            
-            image = Image.open(io.BytesIO(content))
-            width, height = image.size
-            
-            logger.info(f"Valid: {file.filename}, {width}x{height}")
-            
-            if width < 10 or height < 10:
-                raise HTTPException(status_code=400, detail="Image too small")
-            
-            if width > 10000 or height > 10000:
-                raise HTTPException(status_code=400, detail="Image too large")
-                
+            if fmt == "WEBP":
+                header = read_webp_header(file)
+                if header is None:
+                    raise ValueError("unknown WebP chunk")
+                width, height, frames = header
+            else:
+                image = read_header(file, fmt)
+                width, height = image.size
+                frames = count_gif_frames(file.file) if fmt == "GIF" else count_frames(image)
         except Exception as e:
-            logger.error(f"Invalid: {file.filename}")
+            logger.error(f"Invalid: {file.filename} ({e})")
             raise HTTPException(status_code=400, detail="Invalid image")
+        
+        info = ImageInfo(format=fmt, width=width, height=height, frames=frames, size=size)
+        logger.info(f"Valid: {file.filename}, {fmt} {width}x{height}, {frames} frame(s)")
+        
+        if width < MIN_DIMENSION or height < MIN_DIMENSION:
+            raise HTTPException(status_code=400, detail="Image too small")
+        
+        if width > MAX_DIMENSION or height > MAX_DIMENSION:
+            raise HTTPException(status_code=400, detail="Image too large")
+        
+        if info.pixels > settings.MAX_IMAGE_PIXELS:
+            logger.warning(f"Rejected {file.filename}: {info.pixels} decoded pixels")
+            raise HTTPException(status_code=400, detail="Image decodes to too many pixels")
+        
+        return info
             
     except HTTPException:
         raise
@@ -82,6 +266,13 @@ def validate_image_file(file: UploadFile) -> None:
     finally:
         file.file.seek(0)
 
+def validate_renditions(spec: Optional[str]) -> List[Dict[str, Any]]:
+    """Validate requested renditions, falling back to DEFAULT_RENDITIONS"""
+    try:
+        return parse_spec(spec or settings.DEFAULT_RENDITIONS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 def validate_pagination_params(skip: int, limit: int):
     """Validate pagination"""
     if skip < 0:
@@ -94,3 +285,30 @@ def validate_pagination_params(skip: int, limit: int):
         raise HTTPException(status_code=400, detail="Limit must be <= 1000")
     
     return skip, limit
+
+
+def validate_cursor(cursor: Optional[str]):
+    """Decode a list cursor into (created_at, id), None if not given"""
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def validate_job_filters(status: Optional[str], created_after: Optional[datetime], created_before: Optional[datetime]):
+    """Validate list filters; timestamps are normalized to naive UTC like created_at"""
+    if status is not None and status not in JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Allowed: {', '.join(sorted(JOB_STATUSES))}")
+
+    def naive_utc(value):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    created_after, created_before = naive_utc(created_after), naive_utc(created_before)
+    if created_after and created_before and created_after >= created_before:
+        raise HTTPException(status_code=400, detail="created_after must be before created_before")
+
+    return status, created_after, created_before
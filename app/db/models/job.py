@@ -1,7 +1,7 @@
 # app/db/models.py
 import uuid
-from sqlalchemy import Column, String, DateTime, func
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, DateTime, Index, Integer, JSON, func
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from ..base import Base
 
 class Job(Base):
@@ -11,5 +11,53 @@ class Job(Base):
     status = Column(String, nullable=False, index=True)
     original_filename = Column(String, nullable=True)
     thumbnail_filename = Column(String, nullable=True)
+    # Requested renditions in canonical "size:format,..." form
+    rendition_spec = Column(String, nullable=True)
+    # Renditions produced by the worker: [{"size", "format", "key", "width", "height", "bytes"}]
+    renditions = Column(JSON, nullable=True)
+    # Hash of the uploaded bytes, used to reuse results of identical uploads
+    content_hash = Column(String, nullable=True, index=True)
+    # Job that owns the stored original/thumbnails this job points at (itself
+    # unless it was deduplicated); objects are deleted when no job refers to them
+    storage_job_id = Column(UUID(as_uuid=True), nullable=True, index=True)
+    # Number of later uploads that were served from this job's results
+    dedup_hits = Column(Integer, nullable=False, default=0, server_default="0")
+    # Set for jobs submitted together through POST /jobs/batch
+    batch_id = Column(UUID(as_uuid=True), nullable=True, index=True)
+    # Celery queue the job was routed to; re-sends go back to the same one
+    queue = Column(String, nullable=True)
+    # Upload as seen by validation (header only)
+    input_format = Column(String, nullable=True)
+    input_width = Column(Integer, nullable=True)
+    input_height = Column(Integer, nullable=True)
+    input_bytes = Column(Integer, nullable=True)
+    # Times a worker has claimed the job
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    # Worker time of the last attempt (sum of its stages) and how long its
+    # message waited in the queue
+    processing_ms = Column(Integer, nullable=True)
+    queue_wait_ms = Column(Integer, nullable=True)
+    # Details of the last attempt: {"stages_ms": {...}, "output_bytes", "error"}
+    profile = Column(JSON().with_variant(JSONB, "postgresql"), nullable=True)
     created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # Keyset pagination of GET /jobs walks (created_at, id), optionally
+        # within one status
+        Index("ix_jobs_created_at_id", "created_at", "id"),
+        Index("ix_jobs_status_created_at_id", "status", "created_at", "id"),
+    )
+
+    @property
+    def available_renditions(self):
+        """Renditions that can be served for this job.
+
+        Jobs created before renditions existed only have ``thumbnail_filename``,
+        which is a single 100px PNG.
+        """
+        if self.renditions:
+            return self.renditions
+        if self.status == "succeeded" and self.thumbnail_filename:
+            return [{"size": 100, "format": "png", "key": self.thumbnail_filename}]
+        return []
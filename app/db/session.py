@@ -1,15 +1,88 @@
 import logging
-from sqlalchemy import create_engine, inspect
+import re
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
-engine = create_engine(settings.DATABASE_URL)
+# Pooled connections are reused across requests and worker tasks; pre-ping
+# replaces ones the server dropped while idle
+engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Only built in async mode, so sync deployments never need asyncpg
+async_engine = create_async_engine(settings.ASYNC_DATABASE_URL) if settings.ASYNC_API else None
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    if async_engine else None
+)
+
+def concurrent_index_ddl(index, dialect) -> str:
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS for ``index`` (PostgreSQL)"""
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect))
+    return re.sub(r"^CREATE (UNIQUE )?INDEX", r"CREATE \1INDEX CONCURRENTLY", ddl)
+
+def _create_indexes_concurrently(table, indexes):
+    """Build indexes on PostgreSQL without blocking writes to ``table``.
+
+    CONCURRENTLY cannot run inside a transaction, so each index is built on
+    an autocommit connection. A build that fails leaves an invalid index
+    behind, which IF NOT EXISTS would then skip; those are reported instead.
+    """
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        for index in indexes:
+            logger.info(f"Building index {index.name} concurrently")
+            conn.execute(text(concurrent_index_ddl(index, engine.dialect)))
+        invalid = conn.execute(text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid"
+            " WHERE i.indrelid = CAST(:table AS regclass) AND NOT i.indisvalid"
+        ), {"table": table.name}).scalars().all()
+    for name in invalid:
+        logger.warning(f"Index {name} is not valid: still being built by another replica, "
+                       f"or a failed build to redo with REINDEX INDEX CONCURRENTLY {name}")
+
+def upgrade_schema(table):
+    """Add the columns and indexes ``table`` gained since it was created.
+
+    Every schema change so far is additive (nullable or defaulted columns,
+    new indexes), so existing databases are brought up to date in place.
+    On PostgreSQL the IF NOT EXISTS forms keep API replicas starting at the
+    same time from tripping over each other, and missing indexes are built
+    CONCURRENTLY so a large ``jobs`` table stays writable meanwhile.
+    """
+    dialect = engine.dialect
+    if_not_exists = " IF NOT EXISTS" if dialect.name == "postgresql" else ""
+    inspector = inspect(engine)
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    indexed = {index["name"] for index in inspector.get_indexes(table.name)}
+    missing = [index for index in table.indexes if index.name not in indexed]
+
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"{column.name} {column.type.compile(dialect=dialect)}"
+            if column.server_default is not None:
+                default = column.server_default.arg
+                ddl += f" DEFAULT {default if isinstance(default, str) else default.compile(dialect=dialect)}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+            logger.info(f"Adding column {table.name}.{column.name}")
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN{if_not_exists} {ddl}"))
+
+        if dialect.name != "postgresql":
+            for index in missing:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+    if missing and dialect.name == "postgresql":
+        _create_indexes_concurrently(table, missing)
+
 def init_db():
-    """Initialize database tables if they don't exist"""
+    """Create missing tables and bring existing ones up to the current models"""
     try:
         from app.db.models import job
         from app.db.base import Base
@@ -25,7 +98,8 @@ def init_db():
             Base.metadata.create_all(bind=engine)
             logger.info("Database tables created")
         else:
-            logger.info("Database tables already exist")
+            upgrade_schema(job.Job.__table__)
+            logger.info("Database tables up to date")
             
     except Exception as e:
         logger.error(f"Database initialization error: {e}")
@@ -36,4 +110,8 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
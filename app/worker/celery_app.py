@@ -1,6 +1,9 @@
 import os
+import time
 from celery import Celery
-from celery.signals import setup_logging, worker_ready, worker_shutdown
+from kombu import Queue
+from celery.signals import (before_task_publish, setup_logging, task_prerun, task_retry, worker_process_init,
+                            worker_process_shutdown, worker_ready, worker_shutdown)
 from app.core.config import settings
 
 # Configure Celery app
@@ -20,6 +23,12 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    # Jobs are routed by size (app.worker.dispatch.queue_for); workers pick
+    # their queues with -Q, or consume all of them without it. Nothing is
+    # published to QUEUE_LEGACY any more, it is only drained
+    task_queues=[Queue(name) for name in (settings.QUEUE_SMALL, settings.QUEUE_LARGE, settings.QUEUE_BATCH,
+                                          settings.QUEUE_LEGACY) if name],
+    task_default_queue=settings.QUEUE_SMALL,
     # Disable Celery's default logging to use custom logging
     worker_hijack_root_logger=False,
     worker_log_color=False,
@@ -37,12 +46,52 @@ def config_loggers(*args, **kwargs):
     logger = get_logger("celery.setup")
     logger.info(f"Celery worker logging configured with level: {log_level}")
 
+@worker_process_init.connect
+def reset_db_pool(**kwargs):
+    """Give each prefork child its own DB connections.
+
+    The engine is created in the parent before forking; without this the
+    children would share (and corrupt) the parent's pooled sockets. After the
+    reset every task in a child reuses that child's pooled connections.
+    """
+    from app.db.session import engine
+    engine.dispose(close=False)
+
+@worker_process_shutdown.connect
+def drop_process_metrics(pid=None, **kwargs):
+    from app.core.metrics import mark_process_dead
+    mark_process_dead(pid or os.getpid())
+
+@before_task_publish.connect
+def stamp_enqueue_time(headers=None, **kwargs):
+    """Record when a task was published, for the queue wait histogram"""
+    if headers is not None:
+        headers.setdefault("enqueued_at", time.time())
+
+@task_prerun.connect
+def observe_queue_wait(task=None, **kwargs):
+    # Delayed retries sit in the queue on purpose; only count real waits
+    enqueued_at = getattr(task.request, "enqueued_at", None)
+    if enqueued_at and not task.request.eta:
+        from app.core.metrics import observe_queue_wait
+        observe_queue_wait(task.name, enqueued_at)
+
+@task_retry.connect
+def count_retry(sender=None, **kwargs):
+    from app.core.metrics import TASK_RETRIES
+    TASK_RETRIES.labels(sender.name).inc()
+
 @worker_ready.connect
 def worker_ready_handler(sender=None, **kwargs):
     from app.core.logging import get_logger
     logger = get_logger("celery.worker")
     logger.info(f"Celery worker {sender.hostname} ready")
 
+    if settings.WORKER_METRICS_PORT:
+        from app.core.metrics import start_exporter
+        start_exporter(settings.WORKER_METRICS_PORT)
+        logger.info(f"Serving metrics on :{settings.WORKER_METRICS_PORT}")
+
 @worker_shutdown.connect  
 def worker_shutdown_handler(sender=None, **kwargs):
     from app.core.logging import get_logger
@@ -0,0 +1,134 @@
+import threading
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from celery import group
+from sqlalchemy import update
+
+from app.core.config import settings
+from app.core.events import publish_job_event
+from app.core.logging import get_logger
+from app.core.validation import ImageInfo
+from app.db import models
+from app.db.session import engine
+from app.worker.tasks import create_thumbnail_task, create_thumbnails_batch
+
+logger = get_logger("dispatch")
+
+
+def chunked(job_ids: List[str], size: int) -> List[List[str]]:
+    return [job_ids[i:i + size] for i in range(0, len(job_ids), size)]
+
+
+def is_large(info: ImageInfo) -> bool:
+    return info.pixels > settings.LARGE_JOB_PIXELS or info.size > settings.LARGE_JOB_BYTES
+
+
+def queue_for(info: ImageInfo, batch: bool = False) -> str:
+    """Celery queue for a job, from the upload's header facts.
+
+    Large images get a queue of their own so a single huge decode never sits
+    in front of many small ones; everything else goes to the small queue, or
+    to the batch queue when it came in through POST /jobs/batch.
+    """
+    if is_large(info):
+        return settings.QUEUE_LARGE
+    return settings.QUEUE_BATCH if batch else settings.QUEUE_SMALL
+
+
+def publish(job_ids: List[str], queue: Optional[str] = None) -> None:
+    """Send jobs to a queue, one batch task per WORKER_BATCH_SIZE jobs.
+
+    Large jobs are never grouped: one of them already fills a worker.
+    """
+    queue = queue or settings.QUEUE_SMALL
+    if len(job_ids) == 1:
+        create_thumbnail_task.apply_async((job_ids[0],), queue=queue)
+    elif settings.WORKER_BATCH_SIZE <= 1 or queue == settings.QUEUE_LARGE:
+        group(create_thumbnail_task.s(job_id).set(queue=queue) for job_id in job_ids).apply_async()
+    else:
+        group(
+            create_thumbnails_batch.s(chunk).set(queue=queue)
+            for chunk in chunked(job_ids, settings.WORKER_BATCH_SIZE)
+        ).apply_async()
+
+
+class JobDispatcher:
+    """Coalesces jobs submitted close together into batch task messages.
+
+    A job is held for at most ``window_ms``; the pending group is published
+    as soon as it reaches ``batch_size`` or the window expires, whichever
+    comes first. Jobs are grouped per queue. With ``batch_size`` <= 1, and
+    always for the large queue, every job is published immediately as its
+    own create_thumbnail_task.
+    """
+
+    def __init__(self, batch_size: int, window_ms: int):
+        self.batch_size = batch_size
+        self.window = window_ms / 1000
+        self._pending: Dict[str, List[str]] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.batch_size > 1
+
+    def submit(self, job_id: str, queue: Optional[str] = None) -> None:
+        """Queue a job; raises only when publishing immediately"""
+        queue = queue or settings.QUEUE_SMALL
+        if not self.enabled or queue == settings.QUEUE_LARGE:
+            create_thumbnail_task.apply_async((job_id,), queue=queue)
+            return
+
+        with self._lock:
+            pending = self._pending.setdefault(queue, [])
+            pending.append(job_id)
+            if len(pending) >= self.batch_size:
+                job_ids = self._pending.pop(queue)
+            else:
+                job_ids = None
+                if self._timer is None:
+                    self._timer = threading.Timer(self.window, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+        if job_ids:
+            self._publish(job_ids, queue)
+
+    def flush(self) -> None:
+        """Publish whatever is pending now"""
+        with self._lock:
+            pending = self._take()
+        for queue, job_ids in pending.items():
+            self._publish(job_ids, queue)
+
+    def _take(self) -> Dict[str, List[str]]:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, {}
+        return pending
+
+    def _publish(self, job_ids: List[str], queue: str) -> None:
+        # The submitting requests have already returned, so a failure can
+        # only be recorded on the jobs themselves
+        try:
+            publish(job_ids, queue)
+            logger.info(f"Queued {len(job_ids)} job(s) on {queue}")
+        except Exception as e:
+            logger.error(f"Queue failed for {len(job_ids)} job(s) on {queue}: {e}")
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        update(models.Job)
+                        .where(models.Job.id.in_([UUID(job_id) for job_id in job_ids]))
+                        .values(status="failed")
+                    )
+                for job_id in job_ids:
+                    publish_job_event(job_id, "failed")
+            except Exception as e:
+                logger.error(f"Failed to mark unqueued jobs failed: {e}")
+
+
+dispatcher = JobDispatcher(settings.WORKER_BATCH_SIZE, settings.WORKER_BATCH_WINDOW_MS)
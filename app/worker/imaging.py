@@ -0,0 +1,445 @@
+import io
+import mmap
+import time
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import observe_stage, record, stage
+from app.core.renditions import ANIMATED_FORMATS, default_profile
+
+logger = get_logger("imaging")
+
+# The API only checks headers; the worker is where a bomb would actually be
+# decoded, so make Pillow enforce the same ceiling
+Image.MAX_IMAGE_PIXELS = settings.MAX_IMAGE_PIXELS
+
+THUMBNAIL_SIZE = (100, 100)
+
+# Decode to at least this multiple of the target so the final LANCZOS pass
+# still has enough source pixels to produce a clean result
+DECODE_OVERSAMPLE = 2
+
+# Output formats that can carry an alpha channel (GIF as one transparent index)
+ALPHA_FORMATS = {"PNG", "WEBP", "GIF"}
+
+WHITE = (255, 255, 255)
+
+# Pillow format name per rendition format
+PIL_FORMATS = {"png": "PNG", "webp": "WEBP", "jpeg": "JPEG", "gif": "GIF"}
+
+# save() arguments per encoder profile (see ENCODER_PROFILES). Numbers from
+# `python -m benchmarks run --suites encode` are in docs/DEVELOPMENT.md
+ENCODERS = {
+    # zlib level 1: about 10% larger than png-archival for 10-50% less encode time
+    "png-fast": {"compress_level": 1},
+    # Quantized to 256 colours first (alpha kept): lossy, but a third of the bytes
+    "png-palette": {"compress_level": 6},
+    # Every zlib strategy tried for the smallest lossless file
+    "png-archival": {"optimize": True},
+    "webp-lossy": {"quality": 80, "method": 4},
+    # For lossless WebP quality is effort; method 2 is within 1% of 4 at a quarter of the time
+    "webp-lossless": {"lossless": True, "quality": 50, "method": 2},
+    "jpeg": {"quality": 85, "optimize": True},
+    # Own palette per frame
+    "gif": {},
+}
+
+# Profiles that quantize to a palette before encoding
+PALETTE_PROFILES = {"png-palette", "gif"}
+
+# Sources whose frames are an animation (MPO "frames" are separate pictures)
+ANIMATED_SOURCES = {"GIF", "WEBP", "PNG"}
+
+# Modes normalize_mode() leaves alone
+RESAMPLE_MODES = ("L", "LA", "RGB", "RGBA")
+
+# Bytes Pillow stores per pixel; every mode not listed (RGB included) takes four
+MODE_BYTES = {"1": 1, "L": 1, "P": 1, "I;16": 2, "I;16L": 2, "I;16B": 2, "I;16N": 2}
+BYTES_PER_PIXEL = 4
+
+# Browsers show GIF frames of 0 or 10ms for 100ms; GIF delays are in 10ms units
+DEFAULT_FRAME_DURATION = 100
+MIN_FRAME_DURATION = 20
+
+
+@dataclass
+class Animation:
+    """Frames of an animated rendition, with display times in ms"""
+    frames: List[Image.Image] = field(default_factory=list)
+    durations: List[int] = field(default_factory=list)
+    loop: int = 0
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.frames[0].size
+
+    @property
+    def width(self) -> int:
+        return self.frames[0].width
+
+    @property
+    def height(self) -> int:
+        return self.frames[0].height
+
+
+Rendition = Union[Image.Image, Animation]
+
+
+class MappedFile(io.RawIOBase):
+    """Read-only file over a memory map, read in place rather than copied.
+
+    Pillow probes some formats at fixed offsets (PCD at 2048); a map raises
+    on a seek past its end where a file would just read nothing.
+    """
+
+    def __init__(self, buffer: mmap.mmap):
+        self._buffer = buffer
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._buffer)}[whence]
+        if base + offset < 0:
+            raise ValueError(f"negative seek position {base + offset}")
+        self._pos = base + offset
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._buffer) if size is None or size < 0 else self._pos + size
+        data = self._buffer[self._pos:end]
+        self._pos += len(data)
+        return data
+
+    def readinto(self, target) -> int:
+        data = self.read(len(target))
+        target[:len(data)] = data
+        return len(data)
+
+
+def open_image(data) -> Image.Image:
+    """Open lazily; a memory map (filesystem storage) is read in place rather than copied"""
+    return Image.open(MappedFile(data) if isinstance(data, mmap.mmap) else BytesIO(data))
+
+
+def decode_reduced(data, target: Tuple[int, int] = THUMBNAIL_SIZE) -> Image.Image:
+    """Decode image at the smallest scale still >= DECODE_OVERSAMPLE x target.
+
+    JPEG is scaled in the DCT domain with ``Image.draft`` (1/2, 1/4, 1/8), so
+    the full-resolution bitmap is never materialized. Other formats have to be
+    decoded fully, but are shrunk with ``Image.reduce`` (box filter on integer
+    factors) before any further processing touches the pixels.
+
+    ``data`` may also be an image already opened with ``open_image``.
+    """
+    img = data if isinstance(data, Image.Image) else open_image(data)
+    min_size = (target[0] * DECODE_OVERSAMPLE, target[1] * DECODE_OVERSAMPLE)
+
+    if img.format == "JPEG":
+        img.draft(None, min_size)
+
+    img.load()
+    img = normalize_mode(img)
+
+    factor = min(img.width // min_size[0], img.height // min_size[1])
+    if factor > 1:
+        reduced = img.reduce(factor)
+        reduced.info = img.info
+        img = reduced
+
+    return img
+
+
+def webp_header(data) -> Optional[Tuple[int, int, bool, bool]]:
+    """(width, height, has_alpha, animated) of a WebP from its first chunk.
+
+    Opening a WebP with Pillow creates libwebp's animation decoder, which
+    allocates two full canvases up front; this reads the RIFF header instead.
+    None if the chunk is not one it knows.
+    """
+    head = bytes(data[:30])
+    chunk = head[12:16]
+    if chunk == b"VP8X":
+        flags = head[20]
+        width = 1 + int.from_bytes(head[24:27], "little")
+        height = 1 + int.from_bytes(head[27:30], "little")
+        return width, height, bool(flags & 0x10), bool(flags & 0x02)
+    if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+        width = int.from_bytes(head[26:28], "little") & 0x3FFF
+        height = int.from_bytes(head[28:30], "little") & 0x3FFF
+        return width, height, False, False
+    if chunk == b"VP8L" and head[20] == 0x2F:
+        bits = int.from_bytes(head[21:25], "little")
+        return 1 + (bits & 0x3FFF), 1 + ((bits >> 14) & 0x3FFF), bool(bits >> 28 & 1), False
+    return None
+
+
+def estimate_decode_bytes(data, largest: int) -> int:
+    """Bitmap bytes create_renditions() holds at its peak, from the header alone.
+
+    Counts the decoded image (at the JPEG draft scale), the copy
+    normalize_mode() makes of other modes, the premultiplied copy Pillow
+    resamples alpha in and the reduced copy. A WebP also has libwebp's two
+    canvases and the frame it copies out, which is freed before any alpha
+    is premultiplied. Animations hold a frame, the canvas it is composited
+    onto and their normalized copies at full size: about three canvases for
+    GIF and PNG, eight for WebP, as measured by ``python -m benchmarks stress``.
+    """
+    header = webp_header(data) if bytes(data[8:12]) == b"WEBP" else None
+    if header:
+        width, height, has_alpha, animated = header
+        fmt, mode = "WEBP", "RGBA" if has_alpha else "RGB"
+    else:
+        img = open_image(data)
+        width, height = img.size
+        fmt, mode = img.format, img.mode
+        animated = fmt in ANIMATED_SOURCES and getattr(img, "is_animated", False)
+        has_alpha = mode in ("LA", "PA", "RGBA") or "transparency" in img.info
+
+    if fmt == "JPEG":
+        # Same scale Image.draft picks: the largest of 1/2, 1/4, 1/8 still >= the decode target
+        min_size = largest * DECODE_OVERSAMPLE
+        scale = 1
+        while scale < 8 and width // (scale * 2) >= min_size and height // (scale * 2) >= min_size:
+            scale *= 2
+        width, height = -(-width // scale), -(-height // scale)
+
+    canvas = width * height * BYTES_PER_PIXEL
+    if animated:
+        return (8 if fmt == "WEBP" else 3) * canvas
+
+    total = width * height * MODE_BYTES.get(mode, BYTES_PER_PIXEL)
+    if mode not in RESAMPLE_MODES:
+        total += canvas
+    if fmt == "WEBP":
+        total += 3 * canvas
+    elif has_alpha:
+        total += canvas
+    # reduce() keeps at most a quarter; without it thumbnail() copies at most the whole
+    return total + canvas // 4
+
+
+def normalize_mode(img: Image.Image) -> Image.Image:
+    """Convert to a mode LANCZOS can resample (L/LA/RGB/RGBA), keeping alpha"""
+    if img.mode in RESAMPLE_MODES:
+        return img
+    if img.mode == "P":
+        return img.convert("RGBA" if "transparency" in img.info else "RGB")
+    if img.mode == "PA":
+        return img.convert("RGBA")
+    if img.mode == "1":
+        return img.convert("L")
+    return img.convert("RGB")
+
+
+def finalize_mode(img: Image.Image, output_format: str, keep_alpha: bool) -> Image.Image:
+    """Flatten alpha onto white unless it is kept and the format supports it"""
+    has_alpha = img.mode in ("LA", "RGBA")
+
+    if has_alpha and keep_alpha and output_format.upper() in ALPHA_FORMATS:
+        return img.convert("RGBA") if img.mode != "RGBA" else img
+
+    if has_alpha:
+        rgba = img.convert("RGBA") if img.mode != "RGBA" else img
+        bg = Image.new("RGB", img.size, WHITE)
+        bg.paste(rgba, mask=rgba.getchannel("A"))
+        return bg
+
+    return img.convert("RGB") if img.mode != "RGB" else img
+
+
+def _downscale_chain(img: Image.Image, chain: List[Dict[str, Any]], keep_alpha: bool) -> Dict[Tuple[int, str], Image.Image]:
+    """Each rendition of ``chain`` (largest first) from the previous, already smaller one"""
+    results = {}
+    for rendition in chain:
+        size = (rendition["size"], rendition["size"])
+        if img.width > size[0] or img.height > size[1]:
+            img = img.copy()
+            img.thumbnail(size, Image.Resampling.LANCZOS)
+        fmt = PIL_FORMATS[rendition["format"]]
+        results[(rendition["size"], rendition["format"])] = finalize_mode(img, fmt, keep_alpha)
+    return results
+
+
+def is_animated_rendition(rendition: Dict[str, Any]) -> bool:
+    return rendition["format"] in ANIMATED_FORMATS and rendition["size"] <= settings.MAX_ANIMATION_SIZE
+
+
+def within_animation_budget(img: Image.Image) -> bool:
+    """Whether decoding every frame stays under MAX_ANIMATION_PIXELS"""
+    pixels = img.width * img.height * img.n_frames
+    if pixels <= settings.MAX_ANIMATION_PIXELS:
+        return True
+    logger.warning(
+        f"Animation of {img.n_frames} frames at {img.width}x{img.height} is over "
+        f"MAX_ANIMATION_PIXELS, keeping the first frame"
+    )
+    return False
+
+
+def create_renditions(
+    data, renditions: List[Dict[str, Any]], keep_alpha: bool = False
+) -> List[Tuple[Dict[str, Any], Rendition]]:
+    """Build every requested rendition from a single decode.
+
+    The original is decoded once for the largest size; each smaller size is
+    then downscaled from the previous (already small) result, largest first.
+    EXIF rotation and alpha flattening run after the first downscale, so they
+    never touch a full-resolution bitmap.
+
+    Animated uploads go through ``create_animations`` when any rendition can
+    stay animated and decoding all their frames fits MAX_ANIMATION_PIXELS.
+    """
+    chain = sorted(renditions, key=lambda r: r["size"], reverse=True)
+    largest = chain[0]["size"]
+
+    with stage("decode"):
+        img = open_image(data)
+        animated = (
+            settings.THUMBNAIL_ANIMATION
+            and img.format in ANIMATED_SOURCES
+            and getattr(img, "is_animated", False)
+            and any(is_animated_rendition(r) for r in renditions)
+            and within_animation_budget(img)
+        )
+        if not animated:
+            img = decode_reduced(img, (largest, largest))
+
+    if animated:
+        results = create_animations(img, chain, keep_alpha)
+    else:
+        with stage("resize"):
+            img.thumbnail((largest, largest), Image.Resampling.LANCZOS)
+            img = ImageOps.exif_transpose(img)
+            results = _downscale_chain(img, chain, keep_alpha)
+
+    return [(r, results[(r["size"], r["format"])]) for r in renditions]
+
+
+def _frame_duration(img: Image.Image) -> int:
+    duration = img.info.get("duration") or 0
+    return duration if duration > 10 else DEFAULT_FRAME_DURATION
+
+
+def create_animations(
+    img: Image.Image, chain: List[Dict[str, Any]], keep_alpha: bool = False
+) -> Dict[Tuple[int, str], Rendition]:
+    """Resize an animated image frame by frame.
+
+    Only the current frame exists at full size: each kept frame is shrunk
+    into every animated rendition (``chain`` is largest first) before the
+    next one is decoded. Frames are subsampled to MAX_ANIMATION_FRAMES and
+    MAX_ANIMATION_FPS, and a dropped frame's duration is added to the kept
+    frame before it. Still renditions come from the first frame.
+
+    Callers check ``within_animation_budget`` first: every frame is decoded.
+    """
+    n_frames = img.n_frames
+    # Every frame is decoded (GIF/WebP frames build on the previous one), only kept ones are resized
+    stride = -(-n_frames // settings.MAX_ANIMATION_FRAMES)
+    min_interval = 1000 / settings.MAX_ANIMATION_FPS
+
+    animated_chain = [r for r in chain if is_animated_rendition(r)]
+    animations = {(r["size"], r["format"]): Animation(loop=img.info.get("loop", 0)) for r in animated_chain}
+    results = {}
+    decode_seconds = resize_seconds = 0.0
+    elapsed = next_shown = next_index = 0
+
+    for index in range(n_frames):
+        start = time.perf_counter()
+        img.seek(index)
+        # WebP sets a frame's duration only once it is loaded
+        img.load()
+        duration = _frame_duration(img)
+        decode_seconds += time.perf_counter() - start
+
+        shown_at = elapsed
+        elapsed += duration
+        if index < next_index or shown_at < next_shown:
+            for animation in animations.values():
+                animation.durations[-1] += duration
+            continue
+        # At least ``stride`` frames and ``min_interval`` ms apart
+        next_index = index + stride
+        next_shown = shown_at + min_interval
+
+        start = time.perf_counter()
+        frame = normalize_mode(img)
+        # The first frame also feeds the still renditions
+        frame_chain = chain if index == 0 else animated_chain
+        largest = frame_chain[0]["size"]
+        min_size = largest * DECODE_OVERSAMPLE
+        factor = min(frame.width // min_size, frame.height // min_size)
+        small = frame.reduce(factor) if factor > 1 else frame.copy()
+        small.thumbnail((largest, largest), Image.Resampling.LANCZOS)
+        if "exif" in img.info:
+            small.info["exif"] = img.info["exif"]
+        small = ImageOps.exif_transpose(small)
+        del frame
+
+        resized = _downscale_chain(small, frame_chain, keep_alpha)
+        if index == 0:
+            results.update(resized)
+        for key, animation in animations.items():
+            animation.frames.append(resized[key])
+            animation.durations.append(duration)
+        resize_seconds += time.perf_counter() - start
+
+    observe_stage("decode", decode_seconds)
+    observe_stage("resize", resize_seconds)
+    kept = len(next(iter(animations.values())).frames)
+    record("frames_decoded", n_frames)
+    record("frames_kept", kept)
+    logger.info(f"Animation: kept {kept} of {n_frames} frames")
+
+    results.update(animations)
+    return results
+
+
+def encode_image(img: Rendition, fmt: str, profile: Optional[str] = None) -> bytes:
+    """Encode a rendition to bytes in the given format, with its encoder profile"""
+    profile = profile or default_profile(fmt)
+    buffer = BytesIO()
+
+    if isinstance(img, Animation):
+        frames, durations = img.frames, img.durations
+        params = {}
+        if profile in PALETTE_PROFILES:
+            frames = [_quantize(frame, fmt) for frame in frames]
+        if fmt == "gif":
+            durations = [max(MIN_FRAME_DURATION, round(d, -1)) for d in durations]
+            # Clear each frame first, or transparent areas show the previous one
+            params["disposal"] = 2
+        frames[0].save(
+            buffer, format=PIL_FORMATS[fmt], save_all=True, append_images=frames[1:],
+            duration=durations, loop=img.loop, **params, **ENCODERS[profile],
+        )
+        return buffer.getvalue()
+
+    if profile in PALETTE_PROFILES:
+        img = _quantize(img, fmt)
+    img.save(buffer, format=PIL_FORMATS[fmt], **ENCODERS[profile])
+    return buffer.getvalue()
+
+
+def _quantize(img: Image.Image, fmt: str) -> Image.Image:
+    """256 colours by fast octree, ~20x quicker than the median cut GIF saving uses.
+
+    GIF keeps one transparent index rather than per-colour alpha, so RGBA is
+    left to Pillow's GIF writer, which maps transparency itself.
+    """
+    if fmt == "gif" and img.mode == "RGBA":
+        return img
+    return img.quantize(256, method=Image.Quantize.FASTOCTREE)
@@ -0,0 +1,125 @@
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from app.api.client.storage import get_storage
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import profiling
+from app.core.validation import ImageInfo
+from app.worker.tasks import upload_renditions
+
+logger = get_logger("inline")
+
+Encoded = List[Tuple[Dict[str, Any], bytes]]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+# Renders submitted and not finished yet, including ones whose request gave up
+_slots = threading.BoundedSemaphore(max(settings.INLINE_WORKERS + settings.INLINE_MAX_PENDING, 1))
+
+
+def eligible(info: ImageInfo) -> bool:
+    """Whether an upload is small enough to be rendered inside the request"""
+    return (
+        settings.INLINE_WORKERS > 0
+        and info.pixels <= settings.INLINE_MAX_PIXELS
+        and info.size <= settings.INLINE_MAX_BYTES
+    )
+
+
+def _render(job_id: str, data: bytes, spec: Optional[str]) -> Tuple[Encoded, Dict[str, Any]]:
+    """Runs in a pool process: render_job() with its stage timings recorded"""
+    from app.worker.tasks import render_job
+
+    profile = {"queue_wait_ms": None, "inline": True}
+    with profiling(profile):
+        encoded = render_job(job_id, data, spec)
+    return encoded, profile
+
+
+def _warm() -> None:
+    """Runs in a pool process: import the imaging stack before the first request"""
+    import app.worker.tasks  # noqa: F401
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Process pool for inline renders, created on first use.
+
+    Processes are spawned, not forked, because the API process runs threads
+    (and an event loop) that a fork would copy in an arbitrary state.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=settings.INLINE_WORKERS, mp_context=get_context("spawn"))
+    return _pool
+
+
+def start() -> None:
+    """Start the pool processes now so the first inline request does not pay for it"""
+    if settings.INLINE_WORKERS <= 0:
+        return
+    pool = get_pool()
+    for future in [pool.submit(_warm) for _ in range(settings.INLINE_WORKERS)]:
+        future.result()
+    logger.info(f"Inline render pool ready with {settings.INLINE_WORKERS} process(es)")
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def render(job_id: str, data: bytes, spec: Optional[str]) -> Optional[Tuple[Encoded, Dict[str, Any]]]:
+    """Encoded renditions and their profile, or None to fall back to the queue.
+
+    Falls back when every slot is taken, when the render takes longer than
+    INLINE_TIMEOUT, or when it fails; the worker then handles the job (and
+    its retries) as usual. A slot is only freed once its render finishes, so
+    abandoned renders still count against the bound.
+    """
+    if not _slots.acquire(blocking=False):
+        logger.info(f"Inline pool busy, queueing job {job_id}")
+        return None
+
+    try:
+        future: Future = get_pool().submit(_render, job_id, data, spec)
+    except Exception as e:
+        _slots.release()
+        logger.error(f"Inline render of {job_id} could not start: {e}")
+        return None
+    future.add_done_callback(lambda _: _slots.release())
+
+    try:
+        return future.result(timeout=settings.INLINE_TIMEOUT)
+    except FutureTimeout:
+        logger.warning(f"Inline render of {job_id} took over {settings.INLINE_TIMEOUT}s, queueing it")
+    except Exception as e:
+        logger.warning(f"Inline render of {job_id} failed, queueing it: {e}")
+    return None
+
+
+def store(job_id: UUID, data: bytes, content_type: str, encoded: Encoded,
+          profile: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Write the original and renditions of an inline job, returning the renditions' metadata.
+
+    Runs before the job row exists and before the response goes out, so an
+    API process dying at any point leaves at most unreferenced objects,
+    never a job that no worker will pick up. None when storing fails; the
+    request then falls back to the queue.
+    """
+    try:
+        get_storage().save_file(settings.MINIO_ORIGINALS_BUCKET, str(job_id), data, content_type)
+        with profiling(profile):
+            return upload_renditions(encoded)
+    except Exception as e:
+        logger.error(f"Inline job {job_id} not stored, queueing it: {e}")
+        return None
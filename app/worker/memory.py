@@ -0,0 +1,64 @@
+import threading
+from contextlib import contextmanager
+
+from app.core.config import settings
+
+# How long a job that fits the budget, but not next to the work already
+# running in this process, waits before it is tried again
+DEFER_SECONDS = 5
+
+
+class MemoryBudgetExceeded(Exception):
+    """The image would not fit this process's budget even on its own"""
+
+    def __init__(self, estimate: int, budget: int):
+        super().__init__(f"Decoding needs ~{estimate >> 20} MiB, over the {budget >> 20} MiB worker budget")
+        self.estimate = estimate
+        self.budget = budget
+
+
+class MemoryBudgetBusy(Exception):
+    """The image fits the budget, but not alongside what is decoding now"""
+
+    def __init__(self, estimate: int, available: int):
+        super().__init__(f"Decoding needs ~{estimate >> 20} MiB, {available >> 20} MiB of budget free")
+        self.estimate = estimate
+        self.available = available
+
+
+class MemoryGovernor:
+    """Admits decodes only while their estimated bitmaps fit a byte budget.
+
+    One per worker process. Under prefork a process runs one task at a time,
+    so the budget is a ceiling per image; with a threaded pool, concurrent
+    decodes share it. Admission never waits: a refused job is handed back to
+    the queue so the process can take other work meanwhile.
+    """
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self._used = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def reserve(self, estimate: int):
+        """Hold ``estimate`` bytes of budget around a decode, or raise without decoding"""
+        if self.budget <= 0:
+            yield
+            return
+
+        if estimate > self.budget:
+            raise MemoryBudgetExceeded(estimate, self.budget)
+        with self._lock:
+            available = self.budget - self._used
+            if estimate > available:
+                raise MemoryBudgetBusy(estimate, available)
+            self._used += estimate
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._used -= estimate
+
+
+governor = MemoryGovernor(settings.WORKER_MEMORY_BUDGET)
@@ -0,0 +1,74 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterable, Tuple
+
+from app.core.logging import get_logger
+
+logger = get_logger("pipeline")
+
+_END = object()
+
+
+def run_pipeline(
+    keys: Iterable[Hashable],
+    fetch: Callable[[Any], Any],
+    process: Callable[[Any, Any], Any],
+    store: Callable[[Any, Any], Any],
+    prefetch_depth: int,
+    upload_depth: int,
+) -> Tuple[Dict[Any, Any], Dict[Any, Exception]]:
+    """Overlap downloads, CPU work and uploads for a sequence of items.
+
+    ``fetch`` and ``store`` run in a thread pool while ``process`` runs on
+    the calling thread, so the next originals are downloading and the
+    previous results uploading while the current one is being resized
+    (Pillow releases the GIL in its codecs and resampling). At most
+    ``prefetch_depth`` downloads and ``upload_depth`` uploads are in flight;
+    when the upload side falls behind, processing waits for the oldest
+    upload, which bounds memory to roughly that many originals and outputs.
+
+    Returns ``store`` results and per-key exceptions; a failure in any stage
+    only affects its own item.
+    """
+    prefetch_depth = max(prefetch_depth, 1)
+    upload_depth = max(upload_depth, 1)
+    results: Dict[Any, Any] = {}
+    errors: Dict[Any, Exception] = {}
+    pending = iter(keys)
+
+    with ThreadPoolExecutor(max_workers=prefetch_depth + upload_depth) as pool:
+        downloads = deque()
+        uploads = deque()
+
+        def prefetch():
+            while len(downloads) < prefetch_depth:
+                key = next(pending, _END)
+                if key is _END:
+                    return
+                downloads.append((key, pool.submit(fetch, key)))
+
+        def drain(limit: int):
+            while len(uploads) > limit:
+                key, future = uploads.popleft()
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    errors[key] = e
+
+        prefetch()
+        while downloads:
+            key, future = downloads.popleft()
+            prefetch()
+
+            try:
+                output = process(key, future.result())
+            except Exception as e:
+                errors[key] = e
+                continue
+
+            drain(upload_depth - 1)
+            uploads.append((key, pool.submit(store, key, output)))
+
+        drain(0)
+
+    return results, errors
@@ -1,117 +1,429 @@
 import logging
-from io import BytesIO
-from PIL import Image, ImageOps
-from typing import Optional
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+from uuid import UUID
 import time
 
-from app.api.client.minio import minio_client
+from sqlalchemy import and_, bindparam, func, or_, select, tuple_, update
+
+from app.api.client.storage import get_storage
 from app.core.config import settings
+from app.core.events import publish_job_event
+from app.core.hashing import content_hash
+from app.core.metrics import BYTES, JOBS_COMPLETED, MEMORY_BUDGET_REFUSALS, profiling, record, stage
+from app.core.renditions import RENDITION_FORMATS, parse_spec, rendition_key
 from app.db import models
-from app.db.session import SessionLocal
+from app.db.session import engine
 from app.worker.celery_app import celery_app
+from app.worker.imaging import Animation, create_renditions, encode_image, estimate_decode_bytes
+from app.worker.memory import DEFER_SECONDS, MemoryBudgetBusy, MemoryBudgetExceeded, governor
+from app.worker.pipeline import run_pipeline
 from app.core.logging import get_logger
 
 logger = get_logger("tasks")
 
-@celery_app.task(bind=True, max_retries=3, default_retry_delay=60)
-def create_thumbnail_task(self, job_id: str):
-    """Generate 100x100 thumbnail"""
-    logger.info(f"Processing job {job_id}")
-    start_time = time.time()
-    db = SessionLocal()
-    
-    try:
-        job = db.query(models.Job).filter(models.Job.id == job_id).first()
-        if not job:
-            logger.error(f"Job {job_id} not found")
-            return {"status": "failed", "error": "Job not found"}
-        
-        if job.status == "succeeded":
-            logger.info(f"Job {job_id} already done")
-            return {"status": "succeeded"}
-        
-        logger.info(f"Processing {job.original_filename}")
-        
-        # Set to processing
-        job.status = "processing"
-        db.commit()
-
-        # Get original
-        original_data = minio_client.get_file(
-            bucket_name=settings.MINIO_ORIGINALS_BUCKET,
-            file_name=job_id
+Job = models.Job
+
+# Statuses a worker may take a job from; "processing" only once its claim is stale
+CLAIMABLE_STATUSES = ("queued", "failed")
+
+
+def claim_jobs(job_ids: List[UUID]) -> Dict[UUID, Dict[str, Any]]:
+    """Atomically move jobs to processing, returning what the tasks need.
+
+    A single conditional UPDATE ... RETURNING both reads the jobs and takes
+    ownership of them, so a redelivered message cannot be worked on twice
+    while another worker's claim is still fresh. Jobs missing from the
+    result were not claimable. The returned attempt count identifies the
+    claim when completing the job.
+    """
+    stale_before = func.now() - timedelta(seconds=settings.JOB_CLAIM_TIMEOUT)
+    stmt = (
+        update(Job)
+        .where(
+            Job.id.in_(job_ids),
+            or_(
+                Job.status.in_(CLAIMABLE_STATUSES),
+                and_(Job.status == "processing", Job.updated_at < stale_before),
+            ),
         )
-        logger.debug(f"Got {len(original_data)} bytes")
-
-        # Process image
-        img = Image.open(BytesIO(original_data))
-        original_size = img.size
-        
-        # Convert to RGB if needed
-        if img.mode in ('RGBA', 'LA', 'P'):
-            bg = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            bg.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-            img = bg
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Create thumbnail
-        img = ImageOps.exif_transpose(img)
-        img.thumbnail((100, 100), Image.Resampling.LANCZOS)
-        
-        logger.info(f"Resized from {original_size} to {img.size}")
-        
-        # Save to buffer
-        buffer = BytesIO()
-        img.save(buffer, format="PNG", optimize=True)
-        buffer.seek(0)
-        thumbnail_data = buffer.getvalue()
-
-        # Upload thumbnail
+        .values(status="processing", attempts=Job.attempts + 1, updated_at=func.now())
+        .returning(Job.id, Job.original_filename, Job.rendition_spec, Job.batch_id, Job.queue, Job.attempts)
+    )
+    with engine.begin() as conn:
+        rows = conn.execute(stmt).all()
+    return {row.id: dict(row._mapping) for row in rows}
+
+
+def claim_job(job_id: UUID) -> Optional[Dict[str, Any]]:
+    """claim_jobs() for a single job, None if it was not claimable"""
+    return claim_jobs([job_id]).get(job_id)
+
+
+def profile_columns(profile: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Job columns recording a profile built by the task"""
+    if profile is None:
+        return {"profile": None, "processing_ms": None, "queue_wait_ms": None}
+    return {
+        "profile": profile,
+        "processing_ms": round(sum(profile.get("stages_ms", {}).values())),
+        "queue_wait_ms": profile.get("queue_wait_ms"),
+    }
+
+
+def complete_jobs(
+    results: Dict[UUID, List[Dict[str, Any]]],
+    attempts: Dict[UUID, int],
+    profiles: Optional[Dict[UUID, Dict[str, Any]]] = None,
+) -> Set[UUID]:
+    """Mark claimed jobs succeeded in one transaction, returning the ones that were still ours.
+
+    ``attempts`` is each job's count from claim_jobs(). A job whose claim
+    went stale and was taken by another worker has a higher count since,
+    and is left to that worker.
+    """
+    profiles = profiles or {}
+    stmt = (
+        update(Job)
+        .where(Job.id == bindparam("b_id"), Job.status == "processing", Job.attempts == bindparam("b_attempts"))
+        .values(
+            status="succeeded",
+            thumbnail_filename=bindparam("b_thumbnail_filename"),
+            renditions=bindparam("b_renditions"),
+            profile=bindparam("b_profile"),
+            processing_ms=bindparam("b_processing_ms"),
+            queue_wait_ms=bindparam("b_queue_wait_ms"),
+            updated_at=func.now(),
+        )
+    )
+    params = []
+    for job_id, produced in results.items():
+        columns = profile_columns(profiles.get(job_id))
+        params.append({
+            "b_id": job_id,
+            "b_attempts": attempts[job_id],
+            "b_thumbnail_filename": produced[0]["key"],
+            "b_renditions": produced,
+            **{f"b_{name}": value for name, value in columns.items()},
+        })
+    with engine.begin() as conn:
+        if conn.execute(stmt, params).rowcount == len(params):
+            return set(results)
+        # Some claims were no longer ours; the rows this transaction updated tell which
+        claims = [(job_id, attempts[job_id]) for job_id in results]
+        rows = conn.execute(
+            select(Job.id).where(tuple_(Job.id, Job.attempts).in_(claims), Job.status == "succeeded")
+        )
+        return set(rows.scalars())
+
+
+def complete_job(job_id: UUID, produced: List[Dict[str, Any]], attempts: int,
+                 profile: Optional[Dict[str, Any]] = None) -> bool:
+    """Mark a claimed job succeeded; False if it was no longer ours"""
+    return job_id in complete_jobs({job_id: produced}, {job_id: attempts}, {job_id: profile} if profile else None)
+
+
+def release_jobs(job_ids: List[UUID], status: str, profile: Optional[Dict[str, Any]] = None,
+                 queue: Optional[str] = None) -> None:
+    """Hand claimed jobs back as queued (to be retried) or failed, optionally moving them to another queue"""
+    values = {"status": status, "updated_at": func.now()}
+    if profile is not None:
+        values.update(profile_columns(profile))
+    if queue is not None:
+        values["queue"] = queue
+    stmt = (
+        update(Job)
+        .where(Job.id.in_(job_ids), Job.status == "processing")
+        .values(**values)
+    )
+    with engine.begin() as conn:
+        conn.execute(stmt)
+
+
+def release_job(job_id: UUID, status: str, profile: Optional[Dict[str, Any]] = None,
+                queue: Optional[str] = None) -> None:
+    release_jobs([job_id], status, profile, queue)
+
+
+def refuse_over_budget(job_id: UUID, job: Dict[str, Any], error: Exception, profile: Dict[str, Any]) -> str:
+    """Hand back a claimed job the memory governor would not decode; returns its new status.
+
+    A job that can never fit this worker moves to the large queue, or fails
+    if it is already there. One that only has to wait for running work is
+    sent again to its own queue after DEFER_SECONDS.
+    """
+    queue = job.get("queue") or settings.QUEUE_SMALL
+    profile = {**profile, "error": str(error)}
+
+    if isinstance(error, MemoryBudgetBusy):
+        action, status, countdown = "deferred", "queued", DEFER_SECONDS
+    elif queue != settings.QUEUE_LARGE:
+        action, status, countdown, queue = "rerouted", "queued", None, settings.QUEUE_LARGE
+    else:
+        action, status = "rejected", "failed"
+
+    logger.warning(f"Job {job_id} {action} ({queue}): {error}")
+    MEMORY_BUDGET_REFUSALS.labels(action).inc()
+    release_job(job_id, status, profile, queue)
+    if status == "failed":
+        JOBS_COMPLETED.labels("failed").inc()
+    else:
+        create_thumbnail_task.apply_async((str(job_id),), countdown=countdown, queue=queue)
+    publish_job_event(str(job_id), status, job.get("batch_id"))
+    return status
+
+
+def queue_wait_ms(request) -> Optional[float]:
+    """How long the task's message waited, None for delayed retries or eager calls"""
+    enqueued_at = getattr(request, "enqueued_at", None)
+    if not enqueued_at or request.eta:
+        return None
+    return round(max(time.time() - enqueued_at, 0) * 1000, 2)
+
+
+def job_status(job_id: UUID) -> Optional[str]:
+    with engine.connect() as conn:
+        return conn.execute(select(Job.status).where(Job.id == job_id)).scalar()
+
+
+def render_job(job_id: str, original_data: bytes, spec: Optional[str]) -> List[Tuple[Dict[str, Any], bytes]]:
+    """Build and encode every rendition of a job: the CPU-bound part.
+
+    Nothing is decoded unless the governor admits the estimated footprint;
+    raises MemoryBudgetExceeded or MemoryBudgetBusy otherwise.
+    """
+    renditions = parse_spec(spec or settings.DEFAULT_RENDITIONS)
+    estimate = estimate_decode_bytes(original_data, max(r["size"] for r in renditions))
+    record("decode_estimate_bytes", estimate)
+    with governor.reserve(estimate):
+        images = create_renditions(
+            original_data,
+            renditions,
+            keep_alpha=settings.THUMBNAIL_KEEP_ALPHA,
+        )
+
+    encoded = []
+    for rendition, img in images:
+        with stage("encode"):
+            data = encode_image(img, rendition["format"], rendition.get("profile"))
+        BYTES.labels("out").inc(len(data))
+        key = rendition_key(job_id, rendition["size"], rendition["format"])
+        logger.info(f"Rendition {rendition['size']}:{rendition['profile']} is {img.size} ({len(data)} bytes)")
+
+        record("output_bytes", len(data))
+        encoded.append(({
+            **rendition,
+            "key": key,
+            "width": img.width,
+            "height": img.height,
+            "bytes": len(data),
+            "etag": content_hash(data),
+            **({"frames": len(img.frames)} if isinstance(img, Animation) else {}),
+        }, data))
+
+    return encoded
+
+
+def upload_renditions(encoded: List[Tuple[Dict[str, Any], bytes]]) -> List[Dict[str, Any]]:
+    """Upload encoded renditions, returning their metadata"""
+    for rendition, data in encoded:
         try:
-            minio_client.save_file(
-                bucket_name=settings.MINIO_THUMBNAILS_BUCKET,
-                file_name=job_id,
-                data=thumbnail_data
-            )
+            with stage("upload"):
+                get_storage().save_file(
+                    bucket_name=settings.MINIO_THUMBNAILS_BUCKET,
+                    file_name=rendition["key"],
+                    data=data,
+                    content_type=RENDITION_FORMATS[rendition["format"]]
+                )
         except Exception as e:
             error_msg = f"Failed to upload thumbnail: {str(e)}"
             logger.error(error_msg)
             raise Exception(error_msg)
 
-        # Update job status
-        job.status = "succeeded"
-        job.thumbnail_filename = job_id
-        db.commit()
-        
+    return [rendition for rendition, _ in encoded]
+
+
+def render_and_upload(job_id: str, original_data: bytes, spec: Optional[str]) -> List[Dict[str, Any]]:
+    """Build, encode and upload every rendition of a job, returning their metadata"""
+    return upload_renditions(render_job(job_id, original_data, spec))
+
+
+def _fetch_original(job_id: UUID):
+    """Original bytes, or a read-only map of them on filesystem storage"""
+    with stage("download"):
+        data = get_storage().get_buffer(
+            bucket_name=settings.MINIO_ORIGINALS_BUCKET,
+            file_name=str(job_id)
+        )
+    BYTES.labels("in").inc(len(data))
+    return data
+
+
+@celery_app.task(bind=True, max_retries=3, default_retry_delay=60)
+def create_thumbnail_task(self, job_id: str):
+    """Generate all requested thumbnail renditions for a job"""
+    logger.info(f"Processing job {job_id}")
+    start_time = time.time()
+    job_uuid = UUID(job_id)
+    claimed = None
+    profile = {"queue_wait_ms": queue_wait_ms(self.request)}
+
+    try:
+        claimed = claim_job(job_uuid)
+        if not claimed:
+            status = job_status(job_uuid)
+            if status is None:
+                logger.error(f"Job {job_id} not found")
+                return {"status": "failed", "error": "Job not found"}
+            logger.info(f"Job {job_id} not claimable (status '{status}'), skipping")
+            return {"status": status}
+
+        publish_job_event(job_id, "processing", claimed["batch_id"])
+        logger.info(f"Processing {claimed['original_filename']}")
+
+        with profiling(profile):
+            original_data = _fetch_original(job_uuid)
+            logger.debug(f"Got {len(original_data)} bytes")
+
+            produced = render_and_upload(job_id, original_data, claimed["rendition_spec"])
+
+        if not complete_job(job_uuid, produced, claimed["attempts"], profile):
+            # Its outcome is whatever the worker that holds the claim now records
+            logger.warning(f"Job {job_id} was taken over by another worker")
+            return {"status": "superseded", "job_id": job_id}
+
+        JOBS_COMPLETED.labels("succeeded").inc()
+        publish_job_event(job_id, "succeeded", claimed["batch_id"])
+
         processing_time = round(time.time() - start_time, 2)
         logger.info(f"Completed in {processing_time}s")
-        
+
         return {
-            "status": "succeeded", 
-            "job_id": job_id, 
+            "status": "succeeded",
+            "job_id": job_id,
             "processing_time": processing_time
         }
 
+    except (MemoryBudgetExceeded, MemoryBudgetBusy) as e:
+        # Not a failure of the job: it is handed back without being decoded
+        return {"status": refuse_over_budget(job_uuid, claimed, e, profile), "job_id": job_id}
+
     except Exception as e:
         elapsed = round(time.time() - start_time, 2)
         logger.error(f"Failed after {elapsed}s: {e}")
-        
-        if 'job' in locals() and job:
+        retrying = self.request.retries < self.max_retries
+        countdown = 60 * (2 ** self.request.retries)
+
+        if claimed:
+            status = "queued" if retrying else "failed"
+            if not retrying:
+                JOBS_COMPLETED.labels("failed").inc()
             try:
-                job.status = "failed"
-                db.commit()
-            except Exception:
-                pass
-        
-        # Retry if we haven't hit max retries
-        if self.request.retries < self.max_retries:
-            logger.info(f"Retrying (attempt {self.request.retries + 1})")
-            raise self.retry(countdown=60 * (2 ** self.request.retries))
-        
+                release_job(job_uuid, status, {**profile, "error": str(e)})
+                publish_job_event(job_id, status, claimed["batch_id"])
+            except Exception as release_error:
+                # The job is still claimed by this attempt, so the retry can
+                # only claim it anew once that claim is stale
+                logger.error(f"Releasing job {job_id} failed: {release_error}")
+                countdown = max(countdown, settings.JOB_CLAIM_TIMEOUT)
+
+        # Retry if we haven't hit max retries; the retry goes back to the
+        # queue this message was delivered from
+        if retrying:
+            logger.info(f"Retrying (attempt {self.request.retries + 1}) in {countdown}s")
+            raise self.retry(countdown=countdown)
+
         return {"status": "failed", "error": str(e)}
-        
-    finally:
-        db.close()
\ No newline at end of file
+
+
+@celery_app.task(bind=True, max_retries=3, default_retry_delay=60)
+def create_thumbnails_batch(self, job_ids: List[str]):
+    """Generate thumbnails for many (typically small) jobs in one message.
+
+    Claims all jobs with one statement, runs them through a download /
+    resize / upload pipeline so transfers overlap with CPU work, and commits
+    every success in one transaction.
+    Jobs that fail are handed to create_thumbnail_task individually, which
+    owns the retry policy. If the database cannot take the claim or the
+    results, the message itself is retried.
+    """
+    logger.info(f"Processing batch of {len(job_ids)} job(s)")
+    start_time = time.time()
+
+    try:
+        claimed = claim_jobs([UUID(job_id) for job_id in job_ids])
+    except Exception as e:
+        # Nothing was claimed, so the jobs are still queued for this message
+        logger.error(f"Batch claim failed, retrying: {e}")
+        raise self.retry(exc=e)
+    if not claimed:
+        logger.info("No claimable jobs in batch")
+        return {"status": "succeeded", "succeeded": 0, "failed": 0}
+
+    for job_id, job in claimed.items():
+        publish_job_event(job_id, "processing", job["batch_id"])
+
+    # The message waited once for all of its jobs; each stage runs on some
+    # pool thread with that job's profile active
+    wait = queue_wait_ms(self.request)
+    profiles = {job_id: {"queue_wait_ms": wait} for job_id in claimed}
+
+    def profiled(fn):
+        def run(job_id, *args):
+            with profiling(profiles[job_id]):
+                return fn(job_id, *args)
+        return run
+
+    results, errors = run_pipeline(
+        claimed,
+        fetch=profiled(_fetch_original),
+        process=profiled(lambda job_id, data: render_job(str(job_id), data, claimed[job_id]["rendition_spec"])),
+        store=profiled(lambda job_id, encoded: upload_renditions(encoded)),
+        prefetch_depth=settings.WORKER_PREFETCH_DEPTH,
+        upload_depth=settings.WORKER_UPLOAD_DEPTH,
+    )
+
+    refused = {job_id: error for job_id, error in errors.items()
+               if isinstance(error, (MemoryBudgetExceeded, MemoryBudgetBusy))}
+    for job_id in refused:
+        del errors[job_id]
+
+    try:
+        completed = set()
+        if results:
+            completed = complete_jobs(results, {job_id: job["attempts"] for job_id, job in claimed.items()}, profiles)
+            JOBS_COMPLETED.labels("succeeded").inc(len(completed))
+            for job_id in results:
+                if job_id in completed:
+                    publish_job_event(job_id, "succeeded", claimed[job_id]["batch_id"])
+                else:
+                    logger.warning(f"Job {job_id} was taken over by another worker")
+
+        for job_id, error in refused.items():
+            refuse_over_budget(job_id, claimed[job_id], error, profiles[job_id])
+
+        if errors:
+            for job_id, error in errors.items():
+                logger.error(f"Job {job_id} failed in batch: {error}")
+            # Back to queued and retried on their own, on the queue they came from
+            release_jobs(list(errors), "queued")
+            for job_id in errors:
+                publish_job_event(job_id, "queued", claimed[job_id]["batch_id"])
+                create_thumbnail_task.apply_async((str(job_id),), countdown=60, queue=claimed[job_id]["queue"])
+    except Exception as e:
+        # Whatever was not recorded is still claimed by this message. Run it
+        # again once those claims are stale and its unfinished jobs can be
+        # claimed anew; finished ones are skipped as not claimable
+        logger.error(f"Recording batch results failed, retrying in {settings.JOB_CLAIM_TIMEOUT}s: {e}")
+        raise self.retry(exc=e, countdown=settings.JOB_CLAIM_TIMEOUT)
+
+    processing_time = round(time.time() - start_time, 2)
+    logger.info(f"Batch completed in {processing_time}s: {len(completed)} succeeded, {len(errors)} failed")
+
+    return {
+        "status": "succeeded" if not errors else "partial",
+        "succeeded": len(completed),
+        "failed": len(errors),
+        "refused": len(refused),
+        "processing_time": processing_time,
+    }
@@ -0,0 +1,280 @@
+"""Thumbnail pipeline benchmarks.
+
+    python -m benchmarks run --quick --output before.json
+    python -m benchmarks run --suites resize,task --formats JPEG,PNG --sizes 1024,4000
+    python -m benchmarks run --suites submit,submit-verify --sizes 256,1024,4000 --iterations 100
+    python -m benchmarks run --suites encode --profiles png-fast,png-archival --renditions 400
+    python -m benchmarks run --suites task,batch-serial,batch --storage-latency-ms 20 --formats JPEG --sizes 1024
+    python -m benchmarks compare before.json after.json
+    python -m benchmarks stress --processes 4 --memory-limit 512 --jobs 48
+    python -m benchmarks listing --rows 1000000 --output listing.json
+    python -m benchmarks storage --latency-ms 1 --output storage.json
+    python -m benchmarks load --concurrency 10,100,400 --output load.json
+    python -m benchmarks dispatch --batch-size 32 --latency-ms 0.5 --output dispatch.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import PIL
+
+from benchmarks import corpus, dispatch, listing, load, runner, s3, stress
+
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), "thumbnail-benchmark-corpus")
+DEFAULT_LISTING_DIR = os.path.join(tempfile.gettempdir(), "thumbnail-benchmark-listing")
+
+
+def _csv(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def _write_report(output, started, results, **meta):
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(started)),
+            "duration_s": round(time.time() - started, 1),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            **meta,
+        },
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+        _log(f"Wrote {output}")
+    else:
+        print(text)
+
+
+def run(args):
+    sizes = [int(size) for size in args.sizes] if args.sizes else (corpus.QUICK_SIZES if args.quick else corpus.SIZES)
+    cases = corpus.cases([fmt.upper() for fmt in args.formats] if args.formats else None, sizes, args.variants)
+    suites = args.suites or runner.SUITES
+    unknown = set(suites) - set(runner.SUITES)
+    if unknown:
+        sys.exit(f"Unknown suite(s): {', '.join(sorted(unknown))}")
+    unknown = set(args.profiles or []) - set(runner.PROFILES)
+    if unknown:
+        sys.exit(f"Unknown profile(s): {', '.join(sorted(unknown))}")
+
+    _log(f"{len(suites)} suite(s) x {len(cases)} case(s), corpus in {args.corpus_dir}")
+    started = time.time()
+    results = runner.run(suites, cases, args.corpus_dir, args.iterations, args.renditions, args.profiles,
+                         args.storage_latency_ms, log=_log)
+
+    _write_report(args.output, started, results, iterations=args.iterations, renditions=args.renditions,
+                  storage_latency_ms=args.storage_latency_ms)
+
+    if any("error" in result for result in results):
+        sys.exit(1)
+
+
+def compare(args):
+    """Print the change of a latency percentile and throughput per case"""
+    def key(r):
+        return r["suite"], r["case"], r.get("profile")
+
+    with open(args.baseline) as f:
+        baseline = {key(r): r for r in json.load(f)["results"] if "error" not in r}
+    with open(args.candidate) as f:
+        candidate = [r for r in json.load(f)["results"] if "error" not in r]
+
+    print(f"{'suite':<13} {'case':<36} {args.metric + ' ms':>12} {'change':>8} {'per s':>10} {'change':>8}")
+    for result in candidate:
+        before = baseline.get(key(result))
+        if not before:
+            continue
+        label = "/".join(filter(None, (result["case"], result.get("profile"))))
+        old, new = before["latency_ms"][args.metric], result["latency_ms"][args.metric]
+        old_rate, new_rate = before["throughput_per_s"], result["throughput_per_s"]
+        print(f"{result['suite']:<13} {label:<36} {new:>12.2f} {(new / old - 1) * 100 if old else 0:>+7.1f}%"
+              f" {new_rate:>10.2f} {(new_rate / old_rate - 1) * 100 if old_rate else 0:>+7.1f}%")
+
+
+def run_stress(args):
+    budget = args.budget if args.budget is not None else args.memory_limit // 2
+    _log(f"{args.processes} worker(s) x {args.memory_limit} MB, governor "
+         f"{f'budget {budget} MB' if budget else 'off'}, {args.jobs} job(s)")
+    result = stress.run(args.processes, args.jobs, args.corpus_dir, args.memory_limit, budget, args.renditions,
+                        args.seed, log=_log)
+    _log(f"{result['succeeded']} succeeded, {result['rerouted']} rerouted, {result['oom']} out of memory,"
+         f" {result['underestimates']} underestimate(s)")
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        _log(f"Wrote {args.output}")
+    else:
+        print(output)
+
+    if result["oom"]:
+        sys.exit(1)
+
+
+def run_listing(args):
+    os.makedirs(args.workdir, exist_ok=True)
+    _log(f"GET /jobs over {args.rows} job(s) in {args.database_url or args.workdir}")
+    started = time.time()
+    # A fresh process, so the app is imported against this database only
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        results = pool.submit(listing.measure, args.database_url, args.workdir, args.rows,
+                              [int(depth) for depth in args.depths], args.limit, args.iterations).result()
+    _write_report(args.output, started, results, rows=args.rows, limit=args.limit, iterations=args.iterations,
+                  database=args.database_url.split("://")[0] if args.database_url else "sqlite")
+
+
+def run_storage(args):
+    _log(f"MinioClient against the S3 stand-in, {args.latency_ms} ms per request")
+    started = time.time()
+    workdir = tempfile.mkdtemp(prefix="thumbnail-bench-")
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            results = pool.submit(s3.measure, workdir, args.latency_ms, args.iterations).result()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    _write_report(args.output, started, results, latency_ms=args.latency_ms, iterations=args.iterations,
+                  threads=s3.THREADS)
+
+
+def run_load(args):
+    modes, levels = args.modes.split(","), [int(level) for level in args.concurrency.split(",")]
+    _log(f"One API worker per mode ({', '.join(modes)}), {args.duration}s per level, "
+         f"{args.latency_ms} ms per storage request")
+    started = time.time()
+    workdir = tempfile.mkdtemp(prefix="thumbnail-bench-")
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            results = pool.submit(load.measure, workdir, modes, levels, args.duration, args.latency_ms, args.jobs,
+                                  args.database_url).result()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    _write_report(args.output, started, results, duration_s_per_level=args.duration, latency_ms=args.latency_ms,
+                  jobs=args.jobs, database=args.database_url.split("://")[0] if args.database_url else "sqlite")
+
+
+def run_dispatch(args):
+    modes, rates = _csv(args.modes), _csv(args.rates)
+    _log(f"{args.threads} submitting thread(s), {args.duration}s per rate, batches of {args.batch_size} within"
+         f" {args.window_ms} ms, {args.latency_ms} ms per message")
+    started = time.time()
+    workdir = tempfile.mkdtemp(prefix="thumbnail-bench-")
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            results = pool.submit(dispatch.measure, workdir, modes, rates, args.duration, args.latency_ms,
+                                  args.threads, args.batch_size, args.window_ms).result()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    _write_report(args.output, started, results, duration_s_per_rate=args.duration, latency_ms=args.latency_ms,
+                  threads=args.threads, batch_size=args.batch_size, window_ms=args.window_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run benchmarks and emit JSON results")
+    run_parser.add_argument("--suites", type=_csv, help=f"Comma separated, from {','.join(runner.SUITES)}")
+    run_parser.add_argument("--formats", type=_csv, help=f"Comma separated, from {','.join(corpus.FORMATS)}")
+    run_parser.add_argument("--sizes", type=_csv, help="Comma separated longest edges in px")
+    run_parser.add_argument("--variants", type=_csv, help=f"Comma separated, from {','.join(corpus.VARIANTS)}")
+    run_parser.add_argument("--quick", action="store_true", help=f"Only sizes {corpus.QUICK_SIZES}")
+    run_parser.add_argument("--iterations", type=int, default=20, help="Per case (fewer for very large images)")
+    run_parser.add_argument("--renditions", default="100:png", help='Rendition spec, e.g. "100:png,64:webp"')
+    run_parser.add_argument("--profiles", type=_csv, help=f"Encode suite only, from {','.join(runner.PROFILES)}")
+    run_parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR, help="Where generated images are cached")
+    run_parser.add_argument("--storage-latency-ms", type=float,
+                            help="Store through MinIO against the S3 stand-in, delaying each request this much")
+    run_parser.add_argument("--output", help="Write JSON here instead of stdout")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--metric", default="p50", choices=["min", "mean", "p50", "p95", "p99", "max"])
+    compare_parser.set_defaults(func=compare)
+
+    stress_parser = commands.add_parser("stress", help="Render a mixed-size corpus in parallel under memory limits")
+    stress_parser.add_argument("--processes", type=int, default=4, help="Worker processes running at once")
+    stress_parser.add_argument("--memory-limit", type=int, default=512, help="MB each process may map beyond its baseline")
+    stress_parser.add_argument("--budget", type=int, help="WORKER_MEMORY_BUDGET in MB (default half the limit, 0 = off)")
+    stress_parser.add_argument("--jobs", type=int, default=48, help="Images in the mixed corpus")
+    stress_parser.add_argument("--seed", type=int, default=0, help="Seed of the corpus draw")
+    stress_parser.add_argument("--renditions", default="100:png", help='Rendition spec, e.g. "100:png,64:webp"')
+    stress_parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR, help="Where generated images are cached")
+    stress_parser.add_argument("--output", help="Write JSON here instead of stdout")
+    stress_parser.set_defaults(func=run_stress)
+
+    listing_parser = commands.add_parser("listing", help="Compare skip and cursor pages of GET /jobs at depth")
+    listing_parser.add_argument("--rows", type=int, default=1_000_000, help="Jobs to seed (an existing table is reused)")
+    listing_parser.add_argument("--depths", type=_csv, default=[str(depth) for depth in listing.DEPTHS],
+                                help="Comma separated rows to page past")
+    listing_parser.add_argument("--limit", type=int, default=100, help="Page size")
+    listing_parser.add_argument("--iterations", type=int, default=10, help="Per filter, depth and mode")
+    listing_parser.add_argument("--database-url", help="Seed and query this database instead of SQLite")
+    listing_parser.add_argument("--workdir", default=DEFAULT_LISTING_DIR, help="Where the SQLite database is kept")
+    listing_parser.add_argument("--output", help="Write JSON here instead of stdout")
+    listing_parser.set_defaults(func=run_listing)
+
+    storage_parser = commands.add_parser("storage", help="Time MinioClient reads against a local S3 stand-in")
+    storage_parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay the stand-in adds per request")
+    storage_parser.add_argument("--iterations", type=int, default=200, help="Per read (fewer for the 4 MB object)")
+    storage_parser.add_argument("--output", help="Write JSON here instead of stdout")
+    storage_parser.set_defaults(func=run_storage)
+
+    load_parser = commands.add_parser("load", help="Concurrent status polls and thumbnail fetches, sync against async")
+    load_parser.add_argument("--modes", default=",".join(load.MODES), help="Comma-separated: sync, async")
+    load_parser.add_argument("--concurrency", default=",".join(map(str, load.LEVELS)),
+                             help="Comma-separated requests in flight")
+    load_parser.add_argument("--duration", type=float, default=5.0, help="Seconds per level")
+    load_parser.add_argument("--latency-ms", type=float, default=2.0, help="Delay the S3 stand-in adds per request")
+    load_parser.add_argument("--jobs", type=int, default=200, help="Jobs to seed")
+    load_parser.add_argument("--database-url", help="Seed and query this database instead of a fresh SQLite file")
+    load_parser.add_argument("--output", help="Write JSON here instead of stdout")
+    load_parser.set_defaults(func=run_load)
+
+    dispatch_parser = commands.add_parser("dispatch", help="Messages and latency of single against coalesced dispatch")
+    dispatch_parser.add_argument("--modes", default=",".join(dispatch.MODES), help="Comma-separated: single, coalesced")
+    dispatch_parser.add_argument("--rates", default=",".join(dispatch.RATES),
+                                 help='Comma-separated jobs/s offered, or "max" for unpaced')
+    dispatch_parser.add_argument("--duration", type=float, default=3.0, help="Seconds per rate")
+    dispatch_parser.add_argument("--threads", type=int, default=8, help="Threads submitting at once")
+    dispatch_parser.add_argument("--batch-size", type=int, default=32, help="WORKER_BATCH_SIZE when coalesced")
+    dispatch_parser.add_argument("--window-ms", type=int, default=50, help="WORKER_BATCH_WINDOW_MS when coalesced")
+    dispatch_parser.add_argument("--latency-ms", type=float, default=0.5, help="Delay added to each published message")
+    dispatch_parser.add_argument("--output", help="Write JSON here instead of stdout")
+    dispatch_parser.set_defaults(func=run_dispatch)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
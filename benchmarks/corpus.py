@@ -0,0 +1,164 @@
+"""Deterministic synthetic image corpus.
+
+Images are a smooth colour field with some grain, built at low resolution
+and upscaled, so encoders see photo-like content without the corpus taking
+minutes to generate. Files are cached on disk by name.
+"""
+import os
+import random
+from dataclasses import dataclass
+from io import BytesIO
+from typing import List, Optional
+
+from PIL import Image, ImageChops
+
+FORMATS = ["JPEG", "PNG", "GIF", "WEBP", "TIFF"]
+SIZES = [16, 256, 1024, 4000, 10000]
+QUICK_SIZES = [16, 256, 1024]
+VARIANTS = ["plain", "alpha", "exif", "animated"]
+
+EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp", "TIFF": "tiff"}
+CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "GIF": "image/gif", "WEBP": "image/webp", "TIFF": "image/tiff"}
+
+# Formats that cannot carry the variant
+NO_ALPHA = {"JPEG"}
+NO_EXIF = {"GIF"}
+ANIMATED_FORMATS = {"GIF", "WEBP"}
+
+# Animations are 120 frames at 25 fps; every frame is held while encoding
+# the file, so they are only generated up to this size
+ANIMATION_FRAMES = 120
+ANIMATION_FRAME_MS = 40
+MAX_ANIMATED_SIZE = 1024
+
+# EXIF orientation 6: stored sideways, displayed rotated 90 degrees clockwise
+EXIF_ORIENTATION_TAG = 0x0112
+EXIF_ROTATE_90 = 6
+
+# Resolution the content is drawn at before upscaling
+BASE_SIZE = 256
+
+
+@dataclass(frozen=True)
+class Case:
+    format: str
+    size: int
+    variant: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.format.lower()}-{self.size}-{self.variant}"
+
+    @property
+    def filename(self) -> str:
+        return f"{self.name}.{EXTENSIONS[self.format]}"
+
+    @property
+    def content_type(self) -> str:
+        return CONTENT_TYPES[self.format]
+
+    @property
+    def frames(self) -> int:
+        return ANIMATION_FRAMES if self.variant == "animated" else 1
+
+    @property
+    def dimensions(self):
+        """Longest edge is ``size``, 4:3 landscape"""
+        return self.size, max(self.size * 3 // 4, 1)
+
+
+def cases(formats: Optional[List[str]] = None, sizes: Optional[List[int]] = None,
+          variants: Optional[List[str]] = None) -> List[Case]:
+    result = []
+    for fmt in formats or FORMATS:
+        for size in sizes or SIZES:
+            for variant in variants or VARIANTS:
+                if variant == "alpha" and fmt in NO_ALPHA:
+                    continue
+                if variant == "exif" and fmt in NO_EXIF:
+                    continue
+                if variant == "animated" and (fmt not in ANIMATED_FORMATS or size > MAX_ANIMATED_SIZE):
+                    continue
+                result.append(Case(fmt, size, variant))
+    return result
+
+
+def _content(case: Case, frame: int = 0) -> Image.Image:
+    rng = random.Random(case.name)
+    width, height = case.dimensions
+    small = (min(width, BASE_SIZE), max(min(height, BASE_SIZE * 3 // 4), 1))
+
+    bands = []
+    for _ in range(3):
+        grain = Image.frombytes("L", small, rng.randbytes(small[0] * small[1]))
+        gradient = Image.linear_gradient("L").rotate(rng.randrange(360)).resize(small)
+        bands.append(Image.blend(gradient, grain, 0.25))
+    img = Image.merge("RGB", bands)
+
+    if case.variant == "alpha":
+        mask = Image.radial_gradient("L").resize(small)
+        img.putalpha(mask)
+    elif case.variant == "animated":
+        # Content pans sideways across the loop
+        img = ImageChops.offset(img, frame * small[0] // ANIMATION_FRAMES, 0)
+
+    if img.size != (width, height):
+        img = img.resize((width, height), Image.Resampling.BICUBIC)
+    return img
+
+
+def render(case: Case) -> bytes:
+    """Encode the case's image in its format"""
+    if case.variant == "animated":
+        frames = [_content(case, frame) for frame in range(ANIMATION_FRAMES)]
+        buffer = BytesIO()
+        frames[0].save(buffer, format=case.format, save_all=True, append_images=frames[1:],
+                       duration=ANIMATION_FRAME_MS, loop=0)
+        return buffer.getvalue()
+
+    img = _content(case)
+    params = {}
+
+    if case.format == "JPEG":
+        params = {"quality": 90}
+    elif case.format == "GIF":
+        if case.variant == "alpha":
+            alpha = img.getchannel("A")
+            img = img.convert("RGB").quantize(255)
+            # Palette index 255 is unused by quantize(255): make it transparent
+            img.paste(255, mask=alpha.point(lambda a: 255 if a < 128 else 0))
+            params = {"transparency": 255}
+        else:
+            img = img.quantize(256)
+    elif case.format == "TIFF":
+        params = {"compression": "tiff_lzw"}
+
+    if case.variant == "exif":
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION_TAG] = EXIF_ROTATE_90
+        params["exif"] = exif
+
+    buffer = BytesIO()
+    img.save(buffer, format=case.format, **params)
+    return buffer.getvalue()
+
+
+def ensure(case: Case, corpus_dir: str) -> None:
+    """Generate a case if it is not cached yet, without returning its bytes"""
+    load(case, corpus_dir)
+
+
+def load(case: Case, corpus_dir: str) -> bytes:
+    """Bytes of a case, generated on first use"""
+    path = os.path.join(corpus_dir, case.filename)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    data = render(case)
+    os.makedirs(corpus_dir, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return data
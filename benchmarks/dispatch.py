@@ -0,0 +1,141 @@
+"""Publishing jobs one message each against coalescing them into batches.
+
+Submitting threads stand in for API request handlers calling
+``JobDispatcher.submit``, paced to an offered rate or as fast as publishing
+lets them. ``single`` is the dispatcher with a batch size of 1, one
+create_thumbnail_task message per job, and ``coalesced`` groups jobs into
+create_thumbnails_batch messages of up to ``batch_size`` within the window.
+
+Celery publishes to its in-memory transport, which delays every message by
+``latency_ms`` to stand in for the round-trip to Redis. A job's latency runs
+from ``submit`` until the message carrying it has been published, so the
+time a coalesced job spends waiting for its batch to fill counts.
+"""
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.runner import summarize
+
+MODES = ["single", "coalesced"]
+# Jobs per second offered by all threads together; "max" submits unpaced
+RATES = ["100", "1000", "max"]
+
+
+def _log(message: str) -> None:
+    print(message, file=sys.stderr, flush=True)
+
+
+class Published:
+    """Submit times of jobs in flight, and what happened to them once published"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.submitted: Dict[str, float] = {}
+        self.latencies: List[float] = []
+        self.messages = 0
+
+    def submit(self, job_id: str) -> None:
+        with self.lock:
+            self.submitted[job_id] = time.perf_counter()
+
+    def on_publish(self, body=None, **kwargs) -> None:
+        now = time.perf_counter()
+        args = body[0] if isinstance(body, (list, tuple)) else body["args"]
+        job_ids = args[0] if isinstance(args[0], list) else args[:1]
+        with self.lock:
+            self.messages += 1
+            for job_id in job_ids:
+                self.latencies.append(now - self.submitted.pop(job_id))
+
+    def take(self):
+        with self.lock:
+            latencies, messages = self.latencies, self.messages
+            self.latencies, self.messages = [], 0
+        return latencies, messages
+
+
+def install(latency_ms: float) -> None:
+    """Publish to Celery's in-memory transport, delaying each message by ``latency_ms``"""
+    from kombu.transport import memory
+
+    from app.worker.celery_app import celery_app
+
+    celery_app.conf.broker_url = "memory://"
+    celery_app.conf.result_backend = None
+    put = memory.Channel._put
+
+    def delayed_put(self, queue, message, **kwargs):
+        time.sleep(latency_ms / 1000)
+        return put(self, queue, message, **kwargs)
+
+    memory.Channel._put = delayed_put
+
+
+def _submit(dispatcher, published: Published, rate: Optional[float], threads: int, duration: float) -> float:
+    """Submit from ``threads`` threads for ``duration`` seconds, returning the time until all were published"""
+    import uuid
+
+    interval = threads / rate if rate else 0
+    started = time.perf_counter()
+    deadline = started + duration
+
+    def submitter(n: int):
+        # Staggered, so paced jobs arrive evenly rather than in bursts of ``threads``
+        due = started + n * interval / threads
+        time.sleep(max(0.0, due - time.perf_counter()))
+        while due < deadline:
+            job_id = str(uuid.uuid4())
+            published.submit(job_id)
+            dispatcher.submit(job_id)
+            if interval:
+                due += interval
+                time.sleep(max(0.0, due - time.perf_counter()))
+            else:
+                due = time.perf_counter()
+
+    workers = [threading.Thread(target=submitter, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    dispatcher.flush()
+    return time.perf_counter() - started
+
+
+def measure(workdir: str, modes: List[str], rates: List[str], duration: float, latency_ms: float, threads: int,
+            batch_size: int, window_ms: int) -> List[Dict[str, Any]]:
+    """Submit at every rate through each mode's dispatcher; runs inside a fresh process"""
+    import os
+
+    from benchmarks import standins
+
+    standins.install(workdir)
+    os.environ["WORKER_BATCH_SIZE"] = str(batch_size)
+    install(latency_ms)
+
+    from celery.signals import after_task_publish
+
+    from app.worker.dispatch import JobDispatcher
+
+    published = Published()
+    after_task_publish.connect(published.on_publish, weak=False)
+
+    results = []
+    for mode in modes:
+        dispatcher = JobDispatcher(batch_size if mode == "coalesced" else 1, window_ms)
+        # Warm up the producer pool and imports
+        _submit(dispatcher, published, None, threads, 0.2)
+        published.take()
+        for rate in rates:
+            elapsed = _submit(dispatcher, published, None if rate == "max" else float(rate), threads, duration)
+            latencies, messages = published.take()
+            entry = {"suite": "dispatch", "case": f"{rate}/s" if rate != "max" else "max", "profile": mode,
+                     "messages": messages, "messages_per_s": round(messages / elapsed, 3)}
+            entry.update(summarize(latencies, len(latencies), elapsed))
+            results.append(entry)
+            _log(f"dispatch  {mode:<10} {entry['case']:>8}  {entry['throughput_per_s']:>9.1f} jobs/s"
+                 f"  {entry['messages_per_s']:>8.1f} messages/s  p50 {entry['latency_ms']['p50']:>7.2f} ms"
+                 f"  p99 {entry['latency_ms']['p99']:>7.2f} ms")
+    return results
@@ -0,0 +1,152 @@
+"""GET /jobs page latency at increasing depth: skip (OFFSET) against cursor (keyset).
+
+A jobs table of ``rows`` rows is seeded once and kept, in SQLite next to
+the corpus unless a database URL is given (a throwaway Postgres is the
+realistic choice). Each page is then requested through the real route,
+filtered or not, once by ``skip`` and once by the cursor of the row just
+before it. OFFSET has to walk every skipped row; the cursor seeks
+straight to its position, so its latency should not grow with depth.
+"""
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.runner import _timed, summarize
+
+DEPTHS = [0, 1_000, 10_000, 100_000, 500_000]
+
+# Status mix of a long-running deployment
+STATUS_WEIGHTS = {"succeeded": 0.9, "failed": 0.05, "queued": 0.03, "processing": 0.02}
+
+# Jobs are spread over this many days, oldest first
+SEED_DAYS = 365
+SEED_START = datetime(2025, 1, 1)
+SEED_CHUNK = 20_000
+
+
+def _log(message: str) -> None:
+    print(message, file=sys.stderr, flush=True)
+
+
+def filters() -> Dict[str, Dict[str, str]]:
+    """Query parameters per filter: none, the rare "failed" status, the middle half of the time range"""
+    after = (SEED_START + timedelta(days=SEED_DAYS // 4)).isoformat()
+    before = (SEED_START + timedelta(days=SEED_DAYS * 3 // 4)).isoformat()
+    return {
+        "all": {},
+        "status": {"status": "failed"},
+        "window": {"created_after": after, "created_before": before},
+        "status+window": {"status": "failed", "created_after": after, "created_before": before},
+    }
+
+
+def seed(engine, rows: int, log: Callable[[str], None] = _log) -> None:
+    """Fill the jobs table up to ``rows`` rows; an already seeded table is reused"""
+    from sqlalchemy import func, select
+
+    from app.db.models.job import Job
+
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count()).select_from(Job)).scalar()
+    if existing >= rows:
+        log(f"Reusing {existing} seeded job(s)")
+        return
+
+    rng = random.Random(existing)
+    statuses, weights = list(STATUS_WEIGHTS), list(STATUS_WEIGHTS.values())
+    step = timedelta(days=SEED_DAYS) / rows
+    started = time.perf_counter()
+    for offset in range(existing, rows, SEED_CHUNK):
+        chunk = []
+        for n in range(offset, min(offset + SEED_CHUNK, rows)):
+            job_id = uuid.uuid4()
+            # Bursts of uploads share a timestamp, so the id has to break ties
+            created_at = SEED_START + step * (n - n % 8)
+            chunk.append({
+                "id": job_id,
+                "status": rng.choices(statuses, weights)[0],
+                "original_filename": f"{n}.jpg",
+                "rendition_spec": "100:png",
+                "storage_job_id": job_id,
+                "attempts": 1,
+                "created_at": created_at,
+                "updated_at": created_at,
+            })
+        with engine.begin() as conn:
+            conn.execute(Job.__table__.insert(), chunk)
+        if (offset // SEED_CHUNK) % 10 == 9:
+            log(f"Seeded {offset + len(chunk)} of {rows} job(s)")
+    log(f"Seeded {rows - existing} job(s) in {time.perf_counter() - started:.0f}s")
+
+
+def _cursor_at(db, params: Dict[str, str], depth: int) -> Optional[str]:
+    """Cursor that continues right where ``skip=depth`` starts, None at the start or past the end"""
+    from app.core.pagination import encode_cursor
+    from app.db.models.job import Job
+
+    if depth == 0:
+        return None
+    query = db.query(Job.created_at, Job.id)
+    if "status" in params:
+        query = query.filter(Job.status == params["status"])
+    if "created_after" in params:
+        query = query.filter(Job.created_at >= datetime.fromisoformat(params["created_after"]))
+    if "created_before" in params:
+        query = query.filter(Job.created_at < datetime.fromisoformat(params["created_before"]))
+    row = query.order_by(Job.created_at.desc(), Job.id.desc()).offset(depth - 1).limit(1).first()
+    return encode_cursor(*row) if row else None
+
+
+def measure(database_url: Optional[str], workdir: str, rows: int, depths: List[int], limit: int,
+            iterations: int) -> List[Dict[str, Any]]:
+    """Seed, then time every filter x depth x mode; runs inside a fresh process"""
+    from benchmarks import standins
+
+    standins.install(workdir)
+    if database_url:
+        os.environ["DATABASE_URL"] = database_url
+    else:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, f'jobs-{rows}.db')}"
+
+    from fastapi.testclient import TestClient
+
+    from app.api.main import app
+    from app.db.session import SessionLocal, engine, init_db
+
+    init_db()
+    seed(engine, rows)
+    # No lifespan: the app starts no pools and opens no Redis connection
+    client = TestClient(app)
+
+    results = []
+    for name, params in filters().items():
+        for depth in depths:
+            db = SessionLocal()
+            try:
+                cursor = _cursor_at(db, params, depth)
+            finally:
+                db.close()
+            if depth and cursor is None:
+                continue
+            modes = {"skip": {**params, "skip": depth}, "cursor": {**params, **({"cursor": cursor} if cursor else {})}}
+            for mode, query in modes.items():
+                query = {**query, "limit": limit}
+
+                def once():
+                    response = client.get("/jobs", params=query)
+                    response.raise_for_status()
+                    return response
+
+                first = once()
+                latencies = _timed(once, iterations)
+                entry = {"suite": "listing", "case": f"{name}@{depth}", "profile": mode,
+                         "filter": name, "depth": depth, "page_rows": len(first.json())}
+                entry.update(summarize(latencies, iterations, sum(latencies)))
+                _log(f"listing   {name:<14} depth {depth:>8} {mode:<6} p50 {entry['latency_ms']['p50']:>10.2f} ms"
+                     f"  p99 {entry['latency_ms']['p99']:>10.2f} ms")
+                results.append(entry)
+    return results
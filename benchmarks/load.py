@@ -0,0 +1,197 @@
+"""Concurrent status polls and thumbnail fetches against one API worker.
+
+One uvicorn worker serves the app, once with the sync read paths and once
+with ASYNC_API, against SQLite and the S3 stand-in of ``benchmarks.s3``,
+which delays every request to stand in for the round-trip to MinIO. Clients
+keep a fixed number of requests in flight for a few seconds per level,
+alternating ``GET /jobs/{id}`` and ``GET /thumbnails/{id}`` over the seeded
+jobs. The thumbnail cache is off, so every fetch reaches storage.
+
+Load comes from aiohttp, which the async MinIO client already pulls in:
+httpx's connection pool tops out below 100 requests/s with a hundred
+connections in flight, which would measure the client instead.
+"""
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks import s3
+from benchmarks.runner import summarize
+
+MODES = ["sync", "async"]
+LEVELS = [10, 50, 100, 200, 400]
+KINDS = ("status", "thumbnail")
+
+# Seconds the worker gets to answer /healthz after starting
+STARTUP_TIMEOUT = 30
+# A request slower than this counts as an error
+REQUEST_TIMEOUT = 30
+
+
+def _log(message: str) -> None:
+    print(message, file=sys.stderr, flush=True)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def seed(jobs: int) -> List[str]:
+    """Succeeded jobs with a stored 100px PNG rendition each, returning their ids"""
+    from PIL import Image
+
+    from app.api.client.storage import get_storage
+    from app.db.models.job import Job
+    from app.db.session import SessionLocal, init_db
+    from app.worker.tasks import render_job, upload_renditions
+
+    init_db()
+    get_storage()
+    upload = BytesIO()
+    Image.effect_noise((640, 480), 64).convert("RGB").save(upload, "JPEG")
+
+    job_ids = []
+    db = SessionLocal()
+    try:
+        for _ in range(jobs):
+            job_id = uuid.uuid4()
+            renditions = upload_renditions(render_job(str(job_id), upload.getvalue(), "100:png"))
+            db.add(Job(id=job_id, status="succeeded", original_filename="load.jpg", rendition_spec="100:png",
+                       storage_job_id=job_id, attempts=1, thumbnail_filename=renditions[0]["key"],
+                       renditions=renditions))
+            job_ids.append(str(job_id))
+        db.commit()
+    finally:
+        db.close()
+    return job_ids
+
+
+def start_api(mode: str, workdir: str) -> Tuple[subprocess.Popen, str]:
+    """One uvicorn worker with the read paths in ``mode``: (process, base URL)"""
+    port = _free_port()
+    env = {**os.environ, "ASYNC_API": str(mode == "async").lower()}
+    log = open(os.path.join(workdir, f"api-{mode}.log"), "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.api.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", "1", "--no-access-log", "--log-level", "warning"],
+        env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    log.close()
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            with urllib.request.urlopen(f"{base}/healthz", timeout=1):
+                return process, base
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.2)
+    stop_api(process)
+    raise RuntimeError(f"API ({mode}) did not start, see {log.name}")
+
+
+def stop_api(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def _load(base: str, job_ids: List[str], concurrency: int,
+                duration: float) -> Tuple[Dict[str, List[float]], Dict[str, int], float]:
+    """Keep ``concurrency`` requests in flight for ``duration`` seconds"""
+    import aiohttp
+
+    latencies = {kind: [] for kind in KINDS}
+    errors = {kind: 0 for kind in KINDS}
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+
+    async with aiohttp.ClientSession(base, connector=connector, timeout=timeout) as client:
+        deadline = time.perf_counter() + duration
+
+        async def user(n: int):
+            rng = random.Random(n)
+            while time.perf_counter() < deadline:
+                kind = KINDS[n % len(KINDS)]
+                n += 1
+                job_id = rng.choice(job_ids)
+                start = time.perf_counter()
+                try:
+                    async with client.get(f"/jobs/{job_id}" if kind == "status" else f"/thumbnails/{job_id}") as response:
+                        await response.read()
+                        ok = response.status == 200
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    ok = False
+                if ok:
+                    latencies[kind].append(time.perf_counter() - start)
+                else:
+                    errors[kind] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(n) for n in range(concurrency)))
+        return latencies, errors, time.perf_counter() - started
+
+
+def measure(workdir: str, modes: List[str], levels: List[int], duration: float, latency_ms: float, jobs: int,
+            database_url: Optional[str]) -> List[Dict[str, Any]]:
+    """Seed, then load each mode's worker at every level; runs inside a fresh process"""
+    server, endpoint, counters = s3.start(latency_ms)
+    try:
+        s3.install(workdir, endpoint)
+        if database_url:
+            os.environ["DATABASE_URL"] = database_url
+        else:
+            # Needs aiosqlite for the async mode
+            os.environ["ASYNC_DATABASE_URL"] = os.environ["DATABASE_URL"].replace("sqlite://", "sqlite+aiosqlite://", 1)
+        os.environ["THUMBNAIL_CACHE_MAX_BYTES"] = "0"
+        os.environ["INLINE_WORKERS"] = "0"
+
+        job_ids = seed(jobs)
+        _log(f"Seeded {len(job_ids)} job(s)")
+
+        results = []
+        for mode in modes:
+            api, base = start_api(mode, workdir)
+            try:
+                # Warm up connections and imports before the first level
+                asyncio.run(_load(base, job_ids, min(levels), 1.0))
+                for level in levels:
+                    counters.take()
+                    latencies, errors, elapsed = asyncio.run(_load(base, job_ids, level, duration))
+                    storage_requests = counters.take()["requests"]
+                    p99 = {}
+                    for kind in KINDS:
+                        entry = {"suite": "load", "case": f"{kind}@{level}", "profile": mode,
+                                 "concurrency": level, "errors": errors[kind]}
+                        if latencies[kind]:
+                            entry.update(summarize(latencies[kind], len(latencies[kind]), elapsed))
+                            p99[kind] = entry["latency_ms"]["p99"]
+                        if kind == "thumbnail":
+                            entry["storage_requests"] = storage_requests
+                        results.append(entry)
+                    done = sum(len(values) for values in latencies.values())
+                    _log(f"load      {mode:<6} {level:>5} in flight  {done / elapsed:>8.1f}/s"
+                         f"  p99 status {p99.get('status', float('nan')):>9.1f} ms"
+                         f"  p99 thumbnail {p99.get('thumbnail', float('nan')):>9.1f} ms"
+                         f"  {sum(errors.values()):>5} errors")
+            finally:
+                stop_api(api)
+        return results
+    finally:
+        server.terminate()
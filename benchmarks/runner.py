@@ -0,0 +1,332 @@
+"""Runs one benchmark case per fresh process and collects its numbers.
+
+A spawned child per case gives every case a clean peak RSS and its own
+SQLite database and storage directory.
+"""
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, List
+
+from benchmarks import corpus
+
+SUITES = ["validate", "submit", "submit-verify", "resize", "resize-full", "resize-flatten-first", "encode", "task", "batch", "batch-serial"]
+
+# Mirrors app.core.renditions.ENCODER_PROFILES; this process never imports app
+PROFILES = ["png-fast", "png-palette", "png-archival", "webp-lossy", "webp-lossless", "jpeg", "gif"]
+
+# Cases above this many pixels get fewer iterations
+LARGE_PIXELS = 4_000_000
+LARGE_ITERATIONS = 3
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linear interpolation between closest ranks"""
+    values = sorted(values)
+    pos = (len(values) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+def peak_rss() -> int:
+    """Peak resident set size of this process in bytes.
+
+    Linux keeps ru_maxrss across fork and exec, so a spawned child would
+    report its parent's peak; VmHWM belongs to the child's own address space.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def summarize(latencies: List[float], items: int, elapsed: float) -> Dict[str, Any]:
+    ms = [latency * 1000 for latency in latencies]
+    return {
+        "iterations": len(latencies),
+        "items": items,
+        "throughput_per_s": round(items / elapsed, 3) if elapsed else None,
+        "latency_ms": {
+            "min": round(min(ms), 3),
+            "mean": round(statistics.fmean(ms), 3),
+            "p50": round(percentile(ms, 0.5), 3),
+            "p95": round(percentile(ms, 0.95), 3),
+            "p99": round(percentile(ms, 0.99), 3),
+            "max": round(max(ms), 3),
+        },
+    }
+
+
+def _timed(fn: Callable[[], Any], iterations: int) -> List[float]:
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _create_job(tasks, data: bytes, case: corpus.Case, spec: str) -> str:
+    """Insert a queued job and store its original, like POST /jobs does"""
+    from app.core.config import settings
+    from app.db.session import SessionLocal
+
+    job_id = uuid.uuid4()
+    db = SessionLocal()
+    try:
+        db.add(tasks.Job(id=job_id, status="queued", original_filename=case.filename,
+                         rendition_spec=spec, storage_job_id=job_id))
+        db.commit()
+    finally:
+        db.close()
+    tasks.get_storage().save_file(settings.MINIO_ORIGINALS_BUCKET, str(job_id), data, case.content_type)
+    return str(job_id)
+
+
+def _with_full_verify(validate: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """validate_image_file preceded by the check it replaced: read it all, verify(), open it again"""
+    from PIL import Image
+
+    def validate_image_file(file):
+        content = file.file.read()
+        file.file.seek(0)
+        Image.open(BytesIO(content)).verify()
+        Image.open(BytesIO(content))
+        return validate(file)
+
+    return validate_image_file
+
+
+def _full_decode(data, target=None):
+    """decode_reduced without its shortcuts: no JPEG draft, no reduce, every pixel at full resolution"""
+    from PIL import Image
+
+    from app.worker.imaging import normalize_mode, open_image
+
+    img = data if isinstance(data, Image.Image) else open_image(data)
+    img.load()
+    return normalize_mode(img)
+
+
+def _flatten_first(decode):
+    """decode_reduced followed by EXIF rotation and alpha flattening, before any downscale"""
+    from PIL import ImageOps
+
+    from app.worker.imaging import finalize_mode
+
+    def decode_then_flatten(data, target=None):
+        img = decode(data, target)
+        return finalize_mode(ImageOps.exif_transpose(img), "PNG", keep_alpha=False)
+
+    return decode_then_flatten
+
+
+def _serial_pipeline(keys, fetch, process, store, prefetch_depth, upload_depth):
+    """run_pipeline's contract with every stage of every item run one after another"""
+    results, errors = {}, {}
+    for key in keys:
+        try:
+            results[key] = store(key, process(key, fetch(key)))
+        except Exception as e:
+            errors[key] = e
+    return results, errors
+
+
+def _check_succeeded(tasks, job_ids: List[str]) -> None:
+    for job_id in job_ids:
+        status = tasks.job_status(uuid.UUID(job_id))
+        if status != "succeeded":
+            raise RuntimeError(f"Job {job_id} ended as {status}")
+
+
+def run_case(suite: str, case: corpus.Case, corpus_dir: str, iterations: int, renditions: str,
+             profile: str = None, storage_latency_ms: float = None) -> Dict[str, Any]:
+    """Benchmark one case; runs inside a fresh process.
+
+    With ``storage_latency_ms``, storage is MinIO through the S3 stand-in,
+    which delays every request by that much.
+    """
+    workdir = tempfile.mkdtemp(prefix="thumbnail-bench-")
+    server = None
+    try:
+        from benchmarks import s3, standins
+
+        if storage_latency_ms is None:
+            standins.install(workdir)
+        else:
+            server, endpoint, _ = s3.start(storage_latency_ms)
+            s3.install(workdir, endpoint)
+        data = corpus.load(case, corpus_dir)
+        tasks = standins.load_app()
+
+        import psutil
+        baseline_rss = psutil.Process().memory_info().rss
+
+        if suite == "validate":
+            from app.core.validation import validate_image_file
+
+            def once():
+                validate_image_file(standins.upload_file(data, case.filename, case.content_type))
+
+            once()
+            latencies = _timed(once, iterations)
+            items, elapsed = iterations, sum(latencies)
+
+        elif suite in ("submit", "submit-verify"):
+            # POST /jobs in the API: validation, hashing, the row and the
+            # original; nothing is queued and no upload counts as a duplicate
+            from fastapi.testclient import TestClient
+
+            from app.api.main import app
+            from app.api.routes import jobs
+
+            jobs.dispatcher.submit = lambda job_id, queue=None: None
+            jobs._find_duplicate = lambda db, digest, spec: None
+            if suite == "submit-verify":
+                jobs.validate_image_file = _with_full_verify(jobs.validate_image_file)
+            client = TestClient(app)
+
+            def once():
+                response = client.post("/jobs", files={"image": (case.filename, data, case.content_type)},
+                                       data={"renditions": renditions})
+                if response.status_code != 202:
+                    raise RuntimeError(f"POST /jobs answered {response.status_code}: {response.text}")
+
+            once()
+            latencies = _timed(once, iterations)
+            items, elapsed = iterations, sum(latencies)
+
+        elif suite in ("resize", "resize-full", "resize-flatten-first"):
+            from app.worker import imaging
+
+            if suite == "resize-full":
+                imaging.decode_reduced = _full_decode
+            elif suite == "resize-flatten-first":
+                imaging.decode_reduced = _flatten_first(imaging.decode_reduced)
+
+            def once():
+                tasks.render_job(str(uuid.uuid4()), data, renditions)
+
+            once()
+            latencies = _timed(once, iterations)
+            items, elapsed = iterations, sum(latencies)
+
+        elif suite == "encode":
+            # Only the encoder: the first rendition is resized once, then re-encoded
+            from app.core.config import settings
+            from app.core.renditions import ENCODER_PROFILES, parse_spec
+            from app.worker.imaging import create_renditions, encode_image
+
+            rendition = parse_spec(renditions)[0]
+            fmt = ENCODER_PROFILES[profile]
+            rendition = {**rendition, "format": fmt, "profile": profile}
+            (_, img), = create_renditions(data, [rendition], keep_alpha=settings.THUMBNAIL_KEEP_ALPHA)
+            output_bytes = len(encode_image(img, fmt, profile))
+            latencies = _timed(lambda: encode_image(img, fmt, profile), iterations)
+            items, elapsed = iterations, sum(latencies)
+
+        elif suite == "task":
+            job_ids = [_create_job(tasks, data, case, renditions) for _ in range(iterations + 1)]
+            tasks.create_thumbnail_task.apply(args=[job_ids[0]])
+            pending = iter(job_ids[1:])
+            cpu = time.process_time()
+            latencies = _timed(lambda: tasks.create_thumbnail_task.apply(args=[next(pending)]), iterations)
+            cpu = time.process_time() - cpu
+            _check_succeeded(tasks, job_ids)
+            items, elapsed = iterations, sum(latencies)
+
+        elif suite in ("batch", "batch-serial"):
+            # One message carrying every job; latency is that of the whole batch.
+            # batch-serial runs its stages back to back instead of overlapping them
+            if suite == "batch-serial":
+                tasks.run_pipeline = _serial_pipeline
+            warmup = _create_job(tasks, data, case, renditions)
+            tasks.create_thumbnails_batch.apply(args=[[warmup]])
+            job_ids = [_create_job(tasks, data, case, renditions) for _ in range(iterations)]
+            cpu = time.process_time()
+            latencies = _timed(lambda: tasks.create_thumbnails_batch.apply(args=[job_ids]), 1)
+            cpu = time.process_time() - cpu
+            _check_succeeded(tasks, job_ids)
+            items, elapsed = iterations, latencies[0]
+
+        else:
+            raise ValueError(f"Unknown suite: {suite}")
+
+        result = summarize(latencies, items, elapsed)
+        if suite == "encode":
+            result["output_bytes"] = output_bytes
+        if suite in ("task", "batch", "batch-serial"):
+            # CPU of every thread in the worker process, so throughput per core
+            # is items / cpu_s when the core is the limit
+            result["cpu_ms_per_item"] = round(cpu * 1000 / items, 3)
+        if case.frames > 1:
+            result["frames"] = case.frames
+            result["per_frame_ms"] = round(result["latency_ms"]["p50"] / case.frames, 3)
+        result.update(
+            input_bytes=len(data),
+            peak_rss_mb=round(peak_rss() / 2**20, 1),
+            baseline_rss_mb=round(baseline_rss / 2**20, 1),
+        )
+        return result
+    finally:
+        if server is not None:
+            server.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def iterations_for(case: corpus.Case, iterations: int) -> int:
+    width, height = case.dimensions
+    return min(iterations, LARGE_ITERATIONS) if width * height > LARGE_PIXELS else iterations
+
+
+def run(suites: List[str], cases: List[corpus.Case], corpus_dir: str, iterations: int,
+        renditions: str, profiles: List[str] = None, storage_latency_ms: float = None,
+        log=print) -> List[Dict[str, Any]]:
+    """Run every suite over every case, each in its own spawned process.
+
+    The encode suite runs once per encoder profile.
+    """
+    results = []
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn"), max_tasks_per_child=1) as pool:
+        for suite in suites:
+            for case in cases:
+                for profile in (profiles or PROFILES) if suite == "encode" else [None]:
+                    n = iterations_for(case, iterations)
+                    entry = {
+                        "suite": suite,
+                        "case": case.name,
+                        "format": case.format,
+                        "size": case.size,
+                        "variant": case.variant,
+                    }
+                    label = case.name
+                    if profile:
+                        entry["profile"] = profile
+                        label = f"{case.name}/{profile}"
+                    try:
+                        # Generating an uncached image would count towards the case's peak RSS
+                        pool.submit(corpus.ensure, case, corpus_dir).result()
+                        entry.update(pool.submit(run_case, suite, case, corpus_dir, n, renditions, profile,
+                                                 storage_latency_ms).result())
+                        extra = f"  {entry['output_bytes']:>9} B" if "output_bytes" in entry else ""
+                        log(f"{suite:<13} {label:<36} p50 {entry['latency_ms']['p50']:>10.2f} ms"
+                            f"  {entry['throughput_per_s']:>9.2f}/s  peak {entry['peak_rss_mb']:>7.1f} MB{extra}")
+                    except Exception as e:
+                        entry["error"] = str(e)
+                        log(f"{suite:<13} {label:<36} error: {e}")
+                    results.append(entry)
+    return results
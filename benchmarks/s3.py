@@ -0,0 +1,266 @@
+"""MinioClient against a local S3 stand-in.
+
+The stand-in is a small HTTP/1.1 server in its own process, holding objects
+in memory and answering the handful of S3 calls the client makes. Each
+request can be delayed to stand in for a network round-trip. It counts
+requests and TCP connections, so the cost of an extra round-trip or a
+discarded pooled connection shows up next to the latency.
+
+Each read is measured the way MinioClient does it and the way it used to:
+one GET against stat_object then GET, a streamed iter_file against reading
+the object whole, and bursts of threads sharing the sized connection pool
+against the minio default of 10 connections.
+"""
+import hashlib
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+from benchmarks.runner import _timed, summarize
+
+# Object sizes: a thumbnail, a typical upload, a large original (below
+# MINIO_PART_SIZE, so every PUT is a single request)
+SIZES = {"10k": 10 * 1024, "1m": 1024 * 1024, "4m": 4 * 1024 * 1024}
+
+# Threads reading thumbnails at once in the pool comparison, more than the
+# minio default pool keeps. They read in bursts, like a page of thumbnails
+# loading: urllib3 opens a connection per thread either way, but a pool of
+# 10 closes the rest as each burst ends and reconnects on the next.
+THREADS = 32
+
+NO_SUCH_KEY = (
+    '<?xml version="1.0" encoding="UTF-8"?><Error><Code>NoSuchKey</Code>'
+    "<Message>The specified key does not exist.</Message><Resource>{path}</Resource>"
+    "<RequestId>standin</RequestId><HostId>standin</HostId></Error>"
+)
+LOCATION = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<LocationConstraint xmlns="http://s3.amazonaws.com/doc/2006-03-01/"></LocationConstraint>'
+)
+
+
+def _log(message: str) -> None:
+    print(message, file=sys.stderr, flush=True)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out as separate writes; without this, delayed
+        # ACKs would add 40 ms to every small response
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.connections.get_lock():
+            self.server.connections.value += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes = b"", headers: Dict[str, str] = None, send_body: bool = True):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _handle(self, send_body: bool = True):
+        with self.server.requests.get_lock():
+            self.server.requests.value += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        url = urlsplit(self.path)
+        bucket, _, key = url.path.lstrip("/").partition("/")
+
+        if self.command == "PUT":
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if key:
+                etag = hashlib.md5(body).hexdigest()
+                self.server.objects[url.path] = (body, self.headers.get("Content-Type", "binary/octet-stream"), etag)
+                self._reply(200, headers={"ETag": f'"{etag}"'})
+            else:
+                self._reply(200)
+            return
+        if not key:
+            # Bucket calls: location lookup, existence, list
+            self._reply(200, LOCATION.encode() if "location" in url.query else b"",
+                        {"Content-Type": "application/xml"}, send_body)
+            return
+        if self.command == "DELETE":
+            self.server.objects.pop(url.path, None)
+            self._reply(204)
+            return
+
+        stored = self.server.objects.get(url.path)
+        if stored is None:
+            self._reply(404, NO_SUCH_KEY.format(path=url.path).encode(), {"Content-Type": "application/xml"},
+                        send_body)
+            return
+        body, content_type, etag = stored
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", f'"{etag}"')
+        self.send_header("Last-Modified", formatdate(usegmt=True))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._handle()
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def do_PUT(self):
+        self._handle()
+
+    def do_DELETE(self):
+        self._handle()
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # A burst of new connections overflows the default backlog of 5, which
+    # costs a 1s SYN retransmit per dropped connection
+    request_queue_size = 128
+
+
+def serve(port, ready, requests, connections, latency_ms: float) -> None:
+    """Runs in its own process until terminated"""
+    server = Server(("127.0.0.1", 0), Handler)
+    server.objects = {}
+    server.requests, server.connections = requests, connections
+    server.latency = latency_ms / 1000
+    port.value = server.server_address[1]
+    ready.set()
+    server.serve_forever()
+
+
+class Counters:
+    """Requests and connections seen by the stand-in since the last take()"""
+
+    def __init__(self, context):
+        self.requests = context.Value("l", 0)
+        self.connections = context.Value("l", 0)
+
+    def take(self) -> Dict[str, int]:
+        taken = {}
+        for name in ("requests", "connections"):
+            value = getattr(self, name)
+            with value.get_lock():
+                taken[name], value.value = value.value, 0
+        return taken
+
+
+def start(latency_ms: float) -> Tuple[Any, str, Counters]:
+    """Start the stand-in in its own process: (process, endpoint, counters)"""
+    context = get_context("spawn")
+    counters = Counters(context)
+    port, ready = context.Value("i", 0), context.Event()
+    server = context.Process(target=serve, args=(port, ready, counters.requests, counters.connections, latency_ms),
+                             daemon=True)
+    server.start()
+    if not ready.wait(10):
+        server.terminate()
+        raise RuntimeError("S3 stand-in did not start")
+    return server, f"127.0.0.1:{port.value}", counters
+
+
+def install(workdir: str, endpoint: str) -> None:
+    """standins.install(), with MinIO storage pointed at the stand-in"""
+    from benchmarks import standins
+
+    standins.install(workdir)
+    os.environ["STORAGE_BACKEND"] = "minio"
+    os.environ["MINIO_ENDPOINT"] = endpoint
+
+
+def measure(workdir: str, latency_ms: float, iterations: int) -> List[Dict[str, Any]]:
+    """Start the stand-in, then time every read against its predecessor; runs inside a fresh process"""
+    server, endpoint, counters = start(latency_ms)
+    try:
+        install(workdir, endpoint)
+
+        from minio import Minio
+
+        from app.api.client.minio import MinioClient
+        from app.core.config import settings
+
+        storage = MinioClient()
+        bucket = settings.MINIO_THUMBNAILS_BUCKET
+        # The previous client: minio's own pool of 10 connections
+        default_pool = Minio(settings.MINIO_ENDPOINT, settings.MINIO_ACCESS_KEY, settings.MINIO_SECRET_KEY,
+                             secure=False)
+
+        def stat_then_get(key):
+            storage.client.stat_object(bucket, key)
+            return storage.get_file(bucket, key)
+
+        def stream(key):
+            for _ in storage.iter_file(bucket, key):
+                pass
+
+        results = []
+
+        def record(case: str, profile: str, latencies: List[float], items: int, elapsed: float):
+            entry = {"suite": "storage", "case": case, "profile": profile}
+            entry.update(summarize(latencies, items, elapsed))
+            entry.update(counters.take())
+            _log(f"storage   {case:<10} {profile:<14} p50 {entry['latency_ms']['p50']:>9.2f} ms"
+                 f"  {entry['throughput_per_s']:>9.1f}/s  {entry['requests']:>6} requests"
+                 f"  {entry['connections']:>5} connections")
+            results.append(entry)
+
+        for name, size in SIZES.items():
+            key = f"bench/{name}"
+            storage.save_file(bucket, key, os.urandom(size), "application/octet-stream")
+            n = max(3, iterations // 4) if size >= 4 * 1024 * 1024 else iterations
+            for profile, read in (("get", lambda: storage.get_file(bucket, key)),
+                                  ("stat+get", lambda: stat_then_get(key)),
+                                  ("iter_file", lambda: stream(key))):
+                read()
+                counters.take()
+                latencies = _timed(read, n)
+                record(name, profile, latencies, n, sum(latencies))
+
+        # Bursts of threads reading thumbnails at once through one client
+        key = "bench/10k"
+        bursts = max(1, iterations // 4)
+        for profile, client in (("pool", storage.client), ("default-pool", default_pool)):
+            burst = threading.Barrier(THREADS)
+
+            def read_many():
+                latencies = []
+                for _ in range(bursts):
+                    burst.wait()
+                    start = time.perf_counter()
+                    response = client.get_object(bucket, key)
+                    try:
+                        response.read()
+                    finally:
+                        response.close()
+                        response.release_conn()
+                    latencies.append(time.perf_counter() - start)
+                return latencies
+
+            client.get_object(bucket, key).release_conn()
+            counters.take()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(THREADS) as pool:
+                latencies = [latency for run in pool.map(lambda _: read_many(), range(THREADS)) for latency in run]
+            record(f"10k-x{THREADS}", profile, latencies, len(latencies), time.perf_counter() - started)
+
+        return results
+    finally:
+        server.terminate()
@@ -0,0 +1,51 @@
+"""Local stand-ins for MinIO, Postgres and Redis.
+
+Storage is the app's own filesystem backend. Settings are read from the
+environment at import time, so ``install()`` has to run before anything
+under ``app`` is imported.
+"""
+import os
+from io import BytesIO
+
+# Settings the app refuses to start without; the values are never used
+REQUIRED_ENV = {
+    "POSTGRES_USER": "bench",
+    "POSTGRES_PASSWORD": "bench",
+    "POSTGRES_SERVER": "localhost",
+    "POSTGRES_DB": "bench",
+    "REDIS_HOST": "localhost",
+    "MINIO_ENDPOINT": "localhost:9000",
+    "MINIO_ACCESS_KEY": "bench",
+    "MINIO_SECRET_KEY": "bench",
+}
+
+
+def install(workdir: str) -> None:
+    """Point the app at SQLite and filesystem storage inside ``workdir``"""
+    for key, value in REQUIRED_ENV.items():
+        os.environ.setdefault(key, value)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["ASYNC_API"] = "false"
+    os.environ["WORKER_METRICS_PORT"] = "0"
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    os.environ["STORAGE_BACKEND"] = "filesystem"
+    os.environ["STORAGE_ROOT"] = os.path.join(workdir, "storage")
+
+
+def load_app():
+    """Import the app against the stand-ins and return the modules benchmarks drive"""
+    from app.db.session import init_db
+    from app.worker import tasks
+
+    init_db()
+    # No Redis: status notifications are dropped rather than timing out
+    tasks.publish_job_event = lambda *args, **kwargs: None
+    return tasks
+
+
+def upload_file(data: bytes, filename: str, content_type: str):
+    """An UploadFile like the one FastAPI hands to the routes"""
+    from fastapi import UploadFile
+    from starlette.datastructures import Headers
+
+    return UploadFile(file=BytesIO(data), filename=filename, headers=Headers({"content-type": content_type}))
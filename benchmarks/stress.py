@@ -0,0 +1,163 @@
+"""Mixed-size stress run of the worker memory governor.
+
+Several worker processes render a shuffled corpus of small and very large
+images at the same time, each under a hard address-space limit standing in
+for its share of a pod's memory. A decode that would not fit fails to
+allocate, where in a pod the OOM killer would have taken the whole worker
+down. With the governor on, such images are refused before decoding and
+counted as rerouted to the large queue instead.
+
+The address-space limit is stricter than a pod's memory limit: decoders
+map buffers they never fill (libtiff, GIF), which count here but not
+towards RSS. The default budget of half the limit leaves room for that.
+
+Every job also reports its actual peak bitmap memory next to the governor's
+estimate, so underestimates show up.
+"""
+import os
+import random
+import resource
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List
+
+from benchmarks import corpus
+
+SIZES = [256, 1024, 4000, 10000]
+VARIANTS = ["plain", "alpha", "animated"]
+
+# Allocator noise: a job peaking this much over its estimate is not reported
+SLACK_MB = 4
+
+
+def mixed_corpus(jobs: int, seed: int = 0) -> List[corpus.Case]:
+    """``jobs`` cases drawn from every format and size, mostly small ones like real traffic"""
+    cases = corpus.cases(sizes=SIZES, variants=VARIANTS)
+    small = [case for case in cases if case.size <= 1024]
+    large = [case for case in cases if case.size > 1024]
+    rng = random.Random(seed)
+    return [rng.choice(large if rng.random() < 0.3 else small) for _ in range(jobs)]
+
+
+def _status(key: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(key):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def _reset_peak() -> bool:
+    """Restart VmHWM from the current RSS (Linux 4.0+)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def work(worker: int, cases: List[corpus.Case], corpus_dir: str, memory_limit: int, budget: int,
+         renditions: str) -> Dict[str, Any]:
+    """One worker process: render every case under an address-space limit"""
+    workdir = tempfile.mkdtemp(prefix="thumbnail-stress-")
+    try:
+        from benchmarks import standins
+
+        standins.install(workdir)
+        os.environ["WORKER_MEMORY_BUDGET"] = str(budget)
+        tasks = standins.load_app()
+        from app.worker.memory import MemoryBudgetBusy, MemoryBudgetExceeded
+
+        # Warm up, then cap everything mapped from here on at the limit
+        tasks.render_job("warmup", corpus.load(corpus.Case("PNG", 16, "plain"), corpus_dir), renditions)
+        resource.setrlimit(resource.RLIMIT_AS, (_status("VmSize:") + memory_limit, resource.RLIM_INFINITY))
+
+        counts = {"succeeded": 0, "rerouted": 0, "oom": 0}
+        jobs = []
+        for case in cases:
+            data = corpus.load(case, corpus_dir)
+            profile = {}
+            measured = _reset_peak()
+            baseline = _status("VmRSS:")
+            error = None
+            try:
+                with tasks.profiling(profile):
+                    tasks.render_job("stress", data, renditions)
+                outcome = "succeeded"
+            except (MemoryBudgetExceeded, MemoryBudgetBusy):
+                outcome = "rerouted"
+            except MemoryError:
+                outcome = "oom"
+            except Exception as e:
+                # The corpus decodes fine without a limit, so this is an
+                # allocation that did not fit (libwebp reports those as OSError)
+                outcome = "oom"
+                error = str(e)
+            counts[outcome] += 1
+            peak = _status("VmHWM:") - baseline if measured else None
+            jobs.append({
+                "case": case.name,
+                "outcome": outcome,
+                "estimate_mb": round(profile.get("decode_estimate_bytes", 0) / 2**20, 1),
+                "peak_mb": round(peak / 2**20, 1) if peak is not None else None,
+                **({"error": error} if error else {}),
+            })
+            del data
+        return {"worker": worker, **counts, "peak_rss_mb": round(_status("VmHWM:") / 2**20, 1), "jobs": jobs}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(processes: int, jobs: int, corpus_dir: str, memory_limit_mb: int, budget_mb: int, renditions: str,
+        seed: int = 0, log=print) -> Dict[str, Any]:
+    """Run ``processes`` workers over ``jobs`` mixed cases at once; budget_mb 0 turns the governor off"""
+    cases = mixed_corpus(jobs, seed)
+    # Generated in a throwaway process, so the 10000px encodes do not count anywhere
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        for case in sorted(set(cases), key=lambda c: c.name):
+            pool.submit(corpus.ensure, case, corpus_dir).result()
+
+    shares = [cases[i::processes] for i in range(processes)]
+    with ProcessPoolExecutor(max_workers=processes, mp_context=get_context("spawn")) as pool:
+        futures = [
+            pool.submit(work, i, share, corpus_dir, memory_limit_mb * 2**20, budget_mb * 2**20, renditions)
+            for i, share in enumerate(shares)
+        ]
+        workers = []
+        for i, future in enumerate(futures):
+            try:
+                workers.append(future.result())
+            except Exception as e:
+                # The process itself died: as bad as an OOM kill
+                workers.append({"worker": i, "crashed": str(e), "oom": len(shares[i]), "jobs": []})
+
+    for result in workers:
+        if "crashed" in result:
+            log(f"worker {result['worker']}: crashed: {result['crashed']}")
+            continue
+        log(f"worker {result['worker']}: {result['succeeded']} succeeded, {result['rerouted']} rerouted,"
+            f" {result['oom']} out of memory, peak {result['peak_rss_mb']:.1f} MB")
+        for job in result["jobs"]:
+            if job["outcome"] == "oom":
+                log(f"out of memory: {job['case']} estimated {job['estimate_mb']} MB: {job.get('error', 'MemoryError')}")
+
+    admitted = [job for result in workers for job in result["jobs"]
+                if job["outcome"] == "succeeded" and job["peak_mb"] is not None]
+    under = [job for job in admitted if job["peak_mb"] > job["estimate_mb"] + SLACK_MB]
+    for job in sorted(under, key=lambda job: job["peak_mb"] - job["estimate_mb"], reverse=True)[:5]:
+        log(f"underestimate: {job['case']} estimated {job['estimate_mb']} MB, peaked at {job['peak_mb']} MB")
+
+    return {
+        "processes": processes,
+        "memory_limit_mb": memory_limit_mb,
+        "budget_mb": budget_mb,
+        "jobs": len(cases),
+        "succeeded": sum(result.get("succeeded", 0) for result in workers),
+        "rerouted": sum(result.get("rerouted", 0) for result in workers),
+        "oom": sum(result.get("oom", 0) for result in workers),
+        "underestimates": len(under),
+        "workers": workers,
+    }
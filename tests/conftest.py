@@ -0,0 +1,16 @@
+import os
+
+# Settings the app refuses to start without; tests never reach these services
+for key, value in {
+    "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test",
+    "POSTGRES_SERVER": "localhost",
+    "POSTGRES_DB": "test",
+    "REDIS_HOST": "localhost",
+    "MINIO_ENDPOINT": "localhost:9000",
+    "MINIO_ACCESS_KEY": "test",
+    "MINIO_SECRET_KEY": "test",
+}.items():
+    os.environ.setdefault(key, value)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("INLINE_WORKERS", "0")
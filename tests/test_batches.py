@@ -0,0 +1,46 @@
+"""POST /jobs/batch when no file in the batch is a valid image"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app.api.client import storage
+from app.api.client.storage import FilesystemStorage
+from app.api.main import app
+from app.db.base import Base
+from app.db.models.job import Job
+from app.db.session import get_db
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(engine)
+    sessions = sessionmaker(bind=engine)
+
+    def override():
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setattr(storage, "_storage", FilesystemStorage(str(tmp_path / "storage")))
+    app.dependency_overrides[get_db] = override
+    yield engine
+    app.dependency_overrides.pop(get_db, None)
+
+
+def test_batch_of_only_rejected_files_is_unprocessable(engine):
+    files = [("images", ("a.png", b"not an image", "image/png")), ("images", ("b.txt", b"text", "text/plain"))]
+
+    with TestClient(app) as client:
+        response = client.post("/jobs/batch", files=files)
+
+    assert response.status_code == 422
+    detail = response.json()["detail"]
+    assert "batch_id" not in response.json()
+    assert [file["filename"] for file in detail["rejected"]] == ["a.png", "b.txt"]
+    assert all(file["error"] for file in detail["rejected"])
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(Job)).scalar() == 0
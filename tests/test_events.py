@@ -0,0 +1,118 @@
+"""Fanning one Redis subscription out to many long-polls and SSE streams"""
+import asyncio
+import uuid
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.api.main import app
+from app.api.routes import jobs
+from app.core import events
+from app.core.config import settings
+from app.core.events import JobEventHub
+from app.db.base import Base
+from app.db.models.job import Job
+from app.db.session import get_db
+
+POLLS = 1500
+STREAMS = 500
+
+
+class FakePubSub:
+    def __init__(self, broker):
+        self.broker = broker
+        self.messages = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.broker.subscriptions.append((self, channel))
+
+    async def listen(self):
+        while True:
+            yield await self.messages.get()
+
+    async def aclose(self):
+        pass
+
+
+class FakeBroker:
+    """Stands in for both the async subscriber and the sync publisher"""
+
+    def __init__(self):
+        self.connections = 0
+        self.subscriptions = []
+
+    def from_url(self, url, **kwargs):
+        self.connections += 1
+        return self
+
+    def pubsub(self, **kwargs):
+        return FakePubSub(self)
+
+    def publish(self, channel, data):
+        for pubsub, subscribed in self.subscriptions:
+            if subscribed == channel:
+                pubsub.messages.put_nowait({"type": "message", "data": data})
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    broker = FakeBroker()
+    monkeypatch.setattr(events.aioredis.Redis, "from_url", broker.from_url)
+    monkeypatch.setattr(events, "_publisher", broker)
+    monkeypatch.setattr(jobs, "job_events", JobEventHub("redis://fake:6379/0", settings.JOB_EVENTS_CHANNEL))
+    return broker
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", poolclass=NullPool)
+    Base.metadata.create_all(engine)
+    sessions = sessionmaker(bind=engine)
+
+    def override():
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override
+    yield engine
+    app.dependency_overrides.pop(get_db, None)
+
+
+@pytest.mark.asyncio
+async def test_one_transition_wakes_every_waiter_through_one_subscription(broker, engine):
+    job_id = uuid.uuid4()
+    with engine.begin() as conn:
+        conn.execute(Job.__table__.insert(), [{"id": job_id, "status": "processing", "attempts": 1}])
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+        polls = [asyncio.create_task(client.get(f"/jobs/{job_id}?wait=30")) for _ in range(POLLS)]
+        streams = [asyncio.create_task(client.get(f"/jobs/{job_id}/events")) for _ in range(STREAMS)]
+
+        hub = jobs.job_events
+        while hub.waiters() < POLLS + STREAMS:
+            await asyncio.sleep(0.05)
+
+        with engine.begin() as conn:
+            conn.execute(update(Job).where(Job.id == job_id).values(status="succeeded"))
+        events.publish_job_event(job_id, "succeeded")
+
+        responses = await asyncio.wait_for(asyncio.gather(*polls, *streams), 60)
+
+    await hub.close()
+
+    assert [r.json()["status"] for r in responses[:POLLS]] == ["succeeded"] * POLLS
+    for r in responses[POLLS:]:
+        assert r.text.rstrip().endswith('"status": "succeeded"}')
+    assert broker.connections == 1
+    assert len(broker.subscriptions) == 1
+    assert hub.waiters() == 0
@@ -0,0 +1,104 @@
+"""Decode shortcuts: reduced-resolution decoding against the full decode, memory-mapped
+originals, and the animation budget"""
+import math
+import mmap
+from io import BytesIO
+
+import pytest
+from PIL import Image, ImageChops, ImageFilter, ImageStat
+
+from app.api.client.storage import FilesystemStorage
+from app.core.config import settings
+from app.worker.imaging import Animation, create_renditions, decode_reduced, open_image
+
+SIZE = (2400, 1800)
+
+# Lowest PSNR (dB) a thumbnail may have against the full-decode one
+MIN_PSNR = 35
+
+
+def photo(size=SIZE, alpha=False) -> Image.Image:
+    """Smooth colour field with some grain, like a downscaled photo"""
+    base = Image.merge("RGB", [
+        Image.linear_gradient("L").resize((64, 48)),
+        Image.radial_gradient("L").resize((64, 48)),
+        Image.linear_gradient("L").rotate(90).resize((64, 48)),
+    ]).resize(size, Image.Resampling.BICUBIC)
+    grain = Image.effect_noise(size, 24).filter(ImageFilter.GaussianBlur(1))
+    img = ImageChops.add(base, Image.merge("RGB", [grain] * 3), scale=1.0, offset=-64)
+    if alpha:
+        img.putalpha(Image.linear_gradient("L").resize(size))
+    return img
+
+
+def encode(img: Image.Image, fmt: str) -> bytes:
+    out = BytesIO()
+    img.save(out, fmt, **({"quality": 90} if fmt in ("JPEG", "WEBP") else {}))
+    return out.getvalue()
+
+
+def full_decode_thumbnail(data: bytes, size: int) -> Image.Image:
+    """What the worker did before: decode at native resolution, then LANCZOS"""
+    img = Image.open(BytesIO(data))
+    img.load()
+    img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+    img.thumbnail((size, size), Image.Resampling.LANCZOS)
+    return img
+
+
+def psnr(a: Image.Image, b: Image.Image) -> float:
+    stat = ImageStat.Stat(ImageChops.difference(a, b))
+    mse = sum(stat.sum2) / (len(stat.sum2) * a.width * a.height)
+    return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG", "WEBP"])
+def test_reduced_decode_is_smaller(fmt):
+    img = decode_reduced(encode(photo(), fmt), (100, 100))
+    assert 200 <= min(img.size) < min(SIZE) // 2
+
+
+@pytest.mark.parametrize("fmt,alpha", [("JPEG", False), ("PNG", False), ("PNG", True), ("WEBP", False), ("WEBP", True)])
+@pytest.mark.parametrize("size", [100, 400])
+def test_reduced_decode_matches_full_decode(fmt, alpha, size):
+    data = encode(photo(alpha=alpha), fmt)
+    rendition = {"size": size, "format": "png", "profile": "png-fast"}
+
+    (_, reduced), = create_renditions(data, [rendition], keep_alpha=True)
+    expected = full_decode_thumbnail(data, size)
+
+    assert reduced.size == expected.size
+    assert reduced.mode == expected.mode
+    assert psnr(reduced, expected) >= MIN_PSNR
+
+
+def animation(frames: int, size=(320, 240)) -> bytes:
+    images = [Image.new("RGB", size, (i * 5 % 256, 80, 160)) for i in range(frames)]
+    out = BytesIO()
+    images[0].save(out, "GIF", save_all=True, append_images=images[1:], duration=40)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("fmt", ["WEBP", "PNG", "JPEG", "GIF"])
+def test_tiny_original_decodes_from_a_memory_map(tmp_path, fmt):
+    """Originals smaller than Pillow's format probes still open through get_buffer"""
+    out = BytesIO()
+    photo((16, 16)).save(out, fmt)
+    storage = FilesystemStorage(str(tmp_path))
+    storage.save_file(settings.MINIO_ORIGINALS_BUCKET, "tiny", out.getvalue())
+
+    data = storage.get_buffer(settings.MINIO_ORIGINALS_BUCKET, "tiny")
+    assert isinstance(data, mmap.mmap) and len(data) < 2048
+    assert open_image(data).format == fmt
+    assert decode_reduced(data).size == (16, 16)
+
+
+@pytest.mark.parametrize("frames,animated", [(20, True), (60, False)])
+def test_animation_over_the_decode_budget_keeps_the_first_frame(monkeypatch, frames, animated):
+    monkeypatch.setattr(settings, "MAX_ANIMATION_PIXELS", 320 * 240 * 40)
+    renditions = [{"size": 100, "format": "gif"}, {"size": 100, "format": "png"}]
+
+    results = dict((r["format"], img) for r, img in create_renditions(animation(frames), renditions))
+
+    assert isinstance(results["gif"], Animation) is animated
+    assert not isinstance(results["png"], Animation)
@@ -0,0 +1,83 @@
+"""POST /jobs?wait=true: a job is stored before its rendition is answered"""
+import uuid
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.api.client import storage
+from app.api.client.storage import FilesystemStorage
+from app.api.main import app
+from app.api.routes import jobs
+from app.core.config import settings
+from app.db.base import Base
+from app.db.models.job import Job
+from app.db.session import get_db
+from app.worker import inline
+from app.worker.tasks import render_job
+
+
+def png() -> bytes:
+    out = BytesIO()
+    Image.new("RGB", (80, 60), (200, 40, 40)).save(out, "PNG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", poolclass=NullPool)
+    Base.metadata.create_all(engine)
+    sessions = sessionmaker(bind=engine)
+
+    def override():
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setattr(storage, "_storage", FilesystemStorage(str(tmp_path / "storage")))
+    # Render in this process instead of the pool
+    monkeypatch.setattr(inline, "eligible", lambda info: True)
+    monkeypatch.setattr(inline, "render", lambda job_id, data, spec: (render_job(job_id, data, spec), {}))
+    app.dependency_overrides[get_db] = override
+    yield engine
+    app.dependency_overrides.pop(get_db, None)
+
+
+def job(engine, job_id):
+    with engine.connect() as conn:
+        return conn.execute(select(Job.status, Job.renditions).where(Job.id == uuid.UUID(job_id))).one()
+
+
+def test_inline_job_is_stored_before_answering(engine):
+    with TestClient(app) as client:
+        response = client.post("/jobs?wait=true", files={"image": ("a.png", png(), "image/png")})
+
+    assert response.status_code == 200
+    job_id = response.headers["X-Job-Id"]
+    status, renditions = job(engine, job_id)
+    assert status == "succeeded"
+    assert storage.get_storage().get_file(settings.MINIO_ORIGINALS_BUCKET, job_id) == png()
+    assert storage.get_storage().get_file(settings.MINIO_THUMBNAILS_BUCKET, renditions[0]["key"]) == response.content
+
+
+def test_inline_job_that_cannot_be_stored_is_queued(engine, monkeypatch):
+    queued = []
+
+    def upload_renditions(encoded):
+        raise RuntimeError("storage unavailable")
+
+    monkeypatch.setattr(inline, "upload_renditions", upload_renditions)
+    monkeypatch.setattr(jobs.dispatcher, "submit", lambda job_id, queue=None: queued.append(job_id))
+    with TestClient(app) as client:
+        response = client.post("/jobs?wait=true", files={"image": ("a.png", png(), "image/png")})
+
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    assert queued == [job_id]
+    assert job(engine, job_id).status == "queued"
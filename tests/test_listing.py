@@ -0,0 +1,55 @@
+"""GET /jobs: keyset pages with filters"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.api.main import app
+from app.core.pagination import encode_cursor
+from app.db.base import Base
+from app.db.models.job import Job
+from app.db.session import get_db
+
+START = datetime(2025, 1, 1)
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", poolclass=NullPool)
+    Base.metadata.create_all(engine)
+    sessions = sessionmaker(bind=engine)
+    rows = [{"id": uuid.uuid4(), "status": "succeeded", "created_at": START + timedelta(hours=n)} for n in range(10)]
+    with engine.begin() as conn:
+        conn.execute(Job.__table__.insert(), rows)
+
+    def override():
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override
+    yield sorted(rows, key=lambda row: row["created_at"], reverse=True)
+    app.dependency_overrides.pop(get_db, None)
+
+
+def listed(**params):
+    response = TestClient(app).get("/jobs", params=params)
+    assert response.status_code == 200
+    return [uuid.UUID(job["id"]) for job in response.json()]
+
+
+@pytest.mark.parametrize("position", [2, 6])
+def test_cursor_and_created_before_keep_the_tighter_bound(jobs, position):
+    # created_before keeps the jobs older than the 5th newest; the cursor lies either side of it
+    cursor = encode_cursor(jobs[position]["created_at"], jobs[position]["id"])
+    before = jobs[4]["created_at"]
+
+    ids = listed(cursor=cursor, created_before=before.isoformat())
+
+    assert ids == [row["id"] for row in jobs[max(position + 1, 5):]]
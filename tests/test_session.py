@@ -0,0 +1,55 @@
+"""init_db() on a database created by an earlier version of the models"""
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+from sqlalchemy.orm import Session
+
+from app.db import session
+from app.db.models.job import Job
+
+
+@pytest.fixture
+def old_engine(tmp_path, monkeypatch):
+    """A jobs table as the first release created it, with one job in it"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE jobs (id CHAR(32) PRIMARY KEY, status VARCHAR NOT NULL,"
+            " original_filename VARCHAR, thumbnail_filename VARCHAR,"
+            " created_at DATETIME DEFAULT CURRENT_TIMESTAMP, updated_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
+        ))
+        conn.execute(text("CREATE INDEX ix_jobs_status ON jobs (status)"))
+        conn.execute(text("INSERT INTO jobs (id, status, thumbnail_filename) VALUES (:id, 'succeeded', 'x.png')"),
+                     {"id": uuid.UUID(int=1).hex})
+    monkeypatch.setattr(session, "engine", engine)
+    return engine
+
+
+def test_init_db_adds_missing_columns_and_indexes(old_engine):
+    session.init_db()
+
+    inspector = inspect(old_engine)
+    assert {c["name"] for c in inspector.get_columns("jobs")} == set(Job.__table__.columns.keys())
+    assert {i.name for i in Job.__table__.indexes} <= {i["name"] for i in inspector.get_indexes("jobs")}
+
+    with Session(old_engine) as db:
+        job = db.execute(select(Job)).scalar_one()
+    assert job.id == uuid.UUID(int=1)
+    assert job.attempts == 0 and job.dedup_hits == 0
+    assert job.available_renditions[0]["key"] == "x.png"
+
+
+def test_init_db_is_idempotent(old_engine):
+    session.init_db()
+    session.init_db()
+    assert len(inspect(old_engine).get_columns("jobs")) == len(Job.__table__.columns)
+
+
+def test_postgres_builds_indexes_concurrently():
+    from sqlalchemy.dialects import postgresql
+
+    statements = [session.concurrent_index_ddl(index, postgresql.dialect()) for index in Job.__table__.indexes]
+    assert statements and all(ddl.startswith(("CREATE INDEX CONCURRENTLY IF NOT EXISTS ",
+                                              "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "))
+                              for ddl in statements)
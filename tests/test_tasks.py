@@ -0,0 +1,146 @@
+"""Claiming and completing jobs, and batch tasks when the database fails"""
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, select, update
+
+from app.core.config import settings
+from app.db.base import Base
+from app.db.models.job import Job
+from app.worker import tasks
+
+PRODUCED = [{"size": 100, "format": "png", "key": "x/100.png"}]
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(tasks, "engine", engine)
+    monkeypatch.setattr(tasks, "publish_job_event", lambda *args, **kwargs: None)
+    return engine
+
+
+def add_jobs(engine, count):
+    ids = [uuid.uuid4() for _ in range(count)]
+    with engine.begin() as conn:
+        conn.execute(Job.__table__.insert(), [{"id": job_id, "status": "queued", "attempts": 0} for job_id in ids])
+    return ids
+
+
+def statuses(engine, ids):
+    with engine.connect() as conn:
+        return dict(conn.execute(select(Job.id, Job.status).where(Job.id.in_(ids))).all())
+
+
+def test_complete_jobs_skips_jobs_claimed_by_another_worker(engine):
+    ours, taken = add_jobs(engine, 2)
+    claimed = tasks.claim_jobs([ours, taken])
+    # Our claim on one job went stale and another worker claimed it
+    with engine.begin() as conn:
+        conn.execute(update(Job).where(Job.id == taken).values(attempts=Job.attempts + 1))
+
+    attempts = {job_id: job["attempts"] for job_id, job in claimed.items()}
+    completed = tasks.complete_jobs({ours: PRODUCED, taken: PRODUCED}, attempts)
+
+    assert completed == {ours}
+    assert statuses(engine, [ours, taken]) == {ours: "succeeded", taken: "processing"}
+
+
+def test_batch_retries_when_the_claim_fails(engine, monkeypatch):
+    ids = add_jobs(engine, 2)
+    retries = []
+
+    def claim_jobs(job_ids):
+        raise RuntimeError("database unavailable")
+
+    def retry(exc=None, countdown=None, **kwargs):
+        retries.append(countdown)
+        raise exc
+
+    monkeypatch.setattr(tasks, "claim_jobs", claim_jobs)
+    monkeypatch.setattr(tasks.create_thumbnails_batch, "retry", retry)
+    with pytest.raises(RuntimeError):
+        tasks.create_thumbnails_batch.run([str(job_id) for job_id in ids])
+
+    # The default delay: nothing is claimed, so there is nothing to wait out
+    assert retries == [None]
+    assert set(statuses(engine, ids).values()) == {"queued"}
+
+
+def test_batch_retries_after_the_claims_expire_when_completion_fails(engine, monkeypatch):
+    ids = add_jobs(engine, 2)
+    retries = []
+
+    def complete_jobs(*args):
+        raise RuntimeError("database unavailable")
+
+    def retry(exc=None, countdown=None, **kwargs):
+        retries.append(countdown)
+        raise exc
+
+    monkeypatch.setattr(tasks, "run_pipeline", lambda claimed, **kwargs: ({job_id: PRODUCED for job_id in claimed}, {}))
+    monkeypatch.setattr(tasks, "complete_jobs", complete_jobs)
+    monkeypatch.setattr(tasks.create_thumbnails_batch, "retry", retry)
+    with pytest.raises(RuntimeError):
+        tasks.create_thumbnails_batch.run([str(job_id) for job_id in ids])
+
+    assert retries == [settings.JOB_CLAIM_TIMEOUT]
+    assert set(statuses(engine, ids).values()) == {"processing"}
+
+
+def test_batch_counts_only_jobs_it_completed(engine, monkeypatch):
+    ours, taken = add_jobs(engine, 2)
+    published = []
+
+    def run_pipeline(claimed, **kwargs):
+        with engine.begin() as conn:
+            conn.execute(update(Job).where(Job.id == taken).values(attempts=Job.attempts + 1))
+        return {job_id: PRODUCED for job_id in claimed}, {}
+
+    monkeypatch.setattr(tasks, "run_pipeline", run_pipeline)
+    monkeypatch.setattr(tasks, "publish_job_event", lambda job_id, status, *args: published.append((job_id, status)))
+    result = tasks.create_thumbnails_batch.run([str(ours), str(taken)])
+
+    assert result["succeeded"] == 1
+    assert [job for job in published if job[1] == "succeeded"] == [(ours, "succeeded")]
+
+
+def test_task_reports_a_job_taken_over_as_superseded(engine, monkeypatch):
+    job_id, = add_jobs(engine, 1)
+
+    def render_and_upload(*args):
+        with engine.begin() as conn:
+            conn.execute(update(Job).where(Job.id == job_id).values(attempts=Job.attempts + 1))
+        return PRODUCED
+
+    monkeypatch.setattr(tasks, "_fetch_original", lambda job_uuid: b"")
+    monkeypatch.setattr(tasks, "render_and_upload", render_and_upload)
+    result = tasks.create_thumbnail_task.run(str(job_id))
+
+    assert result == {"status": "superseded", "job_id": str(job_id)}
+    assert statuses(engine, [job_id]) == {job_id: "processing"}
+
+
+def test_task_retries_after_its_claim_expires_when_release_fails(engine, monkeypatch):
+    job_id, = add_jobs(engine, 1)
+    retries = []
+
+    def fetch(job_uuid):
+        raise RuntimeError("storage unavailable")
+
+    def release_job(*args):
+        raise RuntimeError("database unavailable")
+
+    def retry(exc=None, countdown=None, **kwargs):
+        retries.append(countdown)
+        return RuntimeError("retry")
+
+    monkeypatch.setattr(tasks, "_fetch_original", fetch)
+    monkeypatch.setattr(tasks, "release_job", release_job)
+    monkeypatch.setattr(tasks.create_thumbnail_task, "retry", retry)
+    with pytest.raises(RuntimeError, match="retry"):
+        tasks.create_thumbnail_task.run(str(job_id))
+
+    assert retries == [settings.JOB_CLAIM_TIMEOUT]
+    assert statuses(engine, [job_id]) == {job_id: "processing"}
@@ -0,0 +1,93 @@
+"""GET /thumbnails/{id}: the database connection is released before storage is read,
+and cached thumbnails are served only while their job exists"""
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api.client import storage
+from app.api.client.storage import FilesystemStorage
+from app.api.main import app
+from app.core.config import settings
+from app.db.base import Base
+from app.db.models.job import Job
+from app.db.session import get_db
+
+
+class RecordingStorage(FilesystemStorage):
+    """Notes how many pooled connections are checked out at each read"""
+
+    def __init__(self, root, engine):
+        super().__init__(root)
+        self.engine = engine
+        self.checked_out = []
+
+    def get_file(self, bucket_name, file_name):
+        self.checked_out.append(self.engine.pool.checkedout())
+        return super().get_file(bucket_name, file_name)
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(engine)
+    sessions = sessionmaker(bind=engine)
+
+    def override():
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setattr(storage, "_storage", RecordingStorage(str(tmp_path / "storage"), engine))
+    app.dependency_overrides[get_db] = override
+    yield engine
+    app.dependency_overrides.pop(get_db, None)
+
+
+def add_job(engine):
+    job_id = uuid.uuid4()
+    rendition = {"size": 100, "format": "png", "profile": "png-fast", "key": f"{job_id}_100.png"}
+    with sessionmaker(bind=engine)() as db:
+        db.add(Job(id=job_id, status="succeeded", original_filename="a.png", storage_job_id=job_id,
+                   thumbnail_filename=rendition["key"], renditions=[rendition]))
+        db.commit()
+    storage.get_storage().save_file(settings.MINIO_THUMBNAILS_BUCKET, rendition["key"], b"png", "image/png")
+    return job_id
+
+
+def cache_requests(result):
+    return REGISTRY.get_sample_value("thumbnail_cache_requests_total", {"cache": "thumbnails", "result": result}) or 0
+
+
+def test_thumbnail_read_holds_no_connection(engine):
+    job_id = add_job(engine)
+
+    with TestClient(app) as client:
+        response = client.get(f"/thumbnails/{job_id}")
+
+    assert response.status_code == 200
+    assert response.content == b"png"
+    assert storage.get_storage().checked_out == [0]
+
+
+def test_cached_thumbnail_is_not_served_once_the_job_is_gone(engine):
+    job_id = add_job(engine)
+    hits = cache_requests("hit")
+
+    with TestClient(app) as client:
+        assert client.get(f"/thumbnails/{job_id}").status_code == 200
+        assert client.get(f"/thumbnails/{job_id}").content == b"png"
+        # Deleted through another API process, whose invalidation never reaches this one's cache
+        with sessionmaker(bind=engine)() as db:
+            db.query(Job).filter(Job.id == job_id).delete()
+            db.commit()
+        response = client.get(f"/thumbnails/{job_id}")
+
+    assert response.status_code == 404
+    assert len(storage.get_storage().checked_out) == 1
+    assert cache_requests("hit") == hits + 1
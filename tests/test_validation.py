@@ -0,0 +1,84 @@
+"""Header-only validation of animated uploads"""
+from io import BytesIO
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+from starlette.datastructures import Headers
+
+from app.core.config import settings
+from app.core.validation import count_gif_frames, validate_image_file
+
+
+def gif(frames: int, size=(600, 600)) -> bytes:
+    """Noise frames, which compress badly, so the file runs far past the header prefix"""
+    images = [Image.effect_noise(size, 80).convert("P") for _ in range(frames)]
+    out = BytesIO()
+    images[0].save(out, "GIF", save_all=True, append_images=images[1:], duration=40)
+    return out.getvalue()
+
+
+def webp(frames: int, size=(600, 600)) -> bytes:
+    images = [Image.effect_noise(size, 80).convert("RGB") for _ in range(frames)]
+    out = BytesIO()
+    images[0].save(out, "WEBP", save_all=True, append_images=images[1:], duration=40, lossless=True)
+    return out.getvalue()
+
+
+class CountingFile(BytesIO):
+    """Records the largest single read"""
+    largest_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.largest_read = max(self.largest_read, len(data))
+        return data
+
+
+def upload(data: bytes, filename="a.gif", content_type="image/gif") -> UploadFile:
+    return UploadFile(file=BytesIO(data), filename=filename, headers=Headers({"content-type": content_type}))
+
+
+@pytest.fixture(scope="module")
+def long_gif() -> bytes:
+    data = gif(40)
+    assert len(data) > 4 * settings.VALIDATION_PEEK_BYTES
+    return data
+
+
+def test_counts_every_frame_of_a_long_gif(long_gif):
+    info = validate_image_file(upload(long_gif))
+    assert info.frames == 40
+    assert info.pixels == 600 * 600 * 40
+
+
+def test_rejects_a_long_gif_over_the_pixel_ceiling(long_gif, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_IMAGE_PIXELS", 600 * 600 * 39)
+    with pytest.raises(HTTPException) as e:
+        validate_image_file(upload(long_gif))
+    assert e.value.status_code == 400
+
+
+def test_truncated_gif_counts_the_frames_present(long_gif):
+    assert 1 <= count_gif_frames(BytesIO(long_gif[: len(long_gif) // 2])) < 40
+
+
+def test_still_gif_is_one_frame():
+    assert count_gif_frames(BytesIO(gif(1, (32, 32)))) == 1
+
+
+def test_counts_every_frame_of_a_long_webp_from_chunk_headers():
+    data = webp(40)
+    assert len(data) > 4 * settings.VALIDATION_PEEK_BYTES
+    file = CountingFile(data)
+    info = validate_image_file(UploadFile(file=file, filename="a.webp", headers=Headers({"content-type": "image/webp"})))
+    assert (info.format, info.width, info.height, info.frames) == ("WEBP", 600, 600, 40)
+    assert file.largest_read <= 30
+
+
+@pytest.mark.parametrize("lossless", [True, False])
+def test_still_webp_is_one_frame(lossless):
+    out = BytesIO()
+    Image.effect_noise((320, 240), 80).convert("RGB").save(out, "WEBP", lossless=lossless)
+    info = validate_image_file(upload(out.getvalue(), "a.webp", "image/webp"))
+    assert (info.width, info.height, info.frames) == (320, 240, 1)